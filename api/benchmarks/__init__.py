@@ -0,0 +1,6 @@
+"""
+Benchmarks reprodutíveis da API, executados sem acesso à rede: arquivos sintéticos no formato
+da ONS, um servidor local no lugar do portal da ONS e um BigQuery/GCS falsos.
+
+Uso (a partir de `api/`): `python -m benchmarks --saida resultados.json`.
+"""
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import List, Dict, Any, Optional
+
+DIRETORIO_API = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Os módulos da API são importados pelo nome, como nos testes (que rodam a partir de src/).
+sys.path.insert(0, os.path.join(DIRETORIO_API, "src"))
+
+from benchmarks import cenarios  # noqa: E402
+
+VERSAO_FORMATO = 1
+PACOTES_REPORTADOS = ("fastapi", "starlette", "pydantic", "pyarrow", "pandas", "numpy", "httpx")
+
+
+def _ambiente() -> Dict[str, Any]:
+  """Onde os números foram medidos, para que comparações entre máquinas diferentes fiquem evidentes."""
+  try:
+    commit = subprocess.run(
+      ["git", "rev-parse", "--short", "HEAD"], cwd=DIRETORIO_API, capture_output=True, text=True, check=True
+    ).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+  versoes = {}
+  for pacote in PACOTES_REPORTADOS:
+    try:
+      versoes[pacote] = metadata.version(pacote)
+    except metadata.PackageNotFoundError:
+      versoes[pacote] = None
+  return {
+    "commit": commit,
+    "python": platform.python_version(),
+    "plataforma": platform.platform(),
+    "processadores": os.cpu_count(),
+    "pacotes": versoes,
+  }
+
+
+def _executar_em_processo(cenario: Dict[str, Any], verboso: bool) -> Dict[str, Any]:
+  """Roda o cenário em um processo novo, com diretório temporário próprio, e lê o resultado."""
+  with tempfile.TemporaryDirectory(prefix="benchmark_") as diretorio:
+    arquivo_resultado = os.path.join(diretorio, "resultado.json")
+    processo = subprocess.run(
+      [sys.executable, "-m", "benchmarks", "--interno", json.dumps(cenario),
+       "--diretorio", diretorio, "--saida", arquivo_resultado],
+      cwd=DIRETORIO_API,
+      stdout=None if verboso else subprocess.DEVNULL,
+      stderr=None if verboso else subprocess.PIPE,
+      text=True,
+    )
+    if processo.returncode != 0:
+      detalhe = (processo.stderr or "").strip().splitlines()[-1:] or [f"código de saída {processo.returncode}"]
+      return {**cenario, "falha": detalhe[0]}
+    with open(arquivo_resultado, encoding="utf-8") as arquivo:
+      return json.load(arquivo)
+
+
+def _resumo(resultado: Dict[str, Any]) -> str:
+  if "falha" in resultado:
+    return f"{resultado['nome']:<40} FALHOU: {resultado['falha']}"
+  latencia = resultado["latencia_ms"]
+  if resultado["endpoint"] == "inicializacao":
+    pronta = f"  pronta p50 {resultado['pronta_ms']['p50']:>9.1f} ms" if "pronta_ms" in resultado else ""
+    return f"{resultado['nome']:<40} p50 {latencia['p50']:>9.1f} ms  p99 {latencia['p99']:>9.1f} ms{pronta}"
+  return (
+    f"{resultado['nome']:<40} p50 {latencia['p50']:>9.1f} ms  p99 {latencia['p99']:>9.1f} ms  "
+    f"{resultado['vazao_rps'] or 0:>8.1f} req/s  pico {resultado['rss_pico_mb']:>7.1f} MB"
+  )
+
+
+def _variacao(anterior: Optional[float], atual: Optional[float]) -> str:
+  if not anterior or atual is None:
+    return "   n/d"
+  return f"{(atual - anterior) / anterior * 100:+6.1f}%"
+
+
+def comparar(anterior: Dict[str, Any], atual: Dict[str, Any]) -> List[str]:
+  """Linhas com a variação de p50, p99, vazão e pico de memória dos cenários presentes nos dois arquivos."""
+  por_nome = {resultado["nome"]: resultado for resultado in anterior.get("cenarios", []) if "falha" not in resultado}
+  linhas = [f"{'cenário':<40} {'p50':>7} {'p99':>7} {'vazão':>7} {'memória':>7}"]
+  for resultado in atual["cenarios"]:
+    base = por_nome.get(resultado["nome"])
+    if base is None or "falha" in resultado:
+      continue
+    linhas.append(
+      f"{resultado['nome']:<40} "
+      f"{_variacao(base['latencia_ms']['p50'], resultado['latencia_ms']['p50'])} "
+      f"{_variacao(base['latencia_ms']['p99'], resultado['latencia_ms']['p99'])} "
+      f"{_variacao(base['vazao_rps'], resultado['vazao_rps'])} "
+      f"{_variacao(base['rss_pico_mb'], resultado['rss_pico_mb'])}"
+    )
+  return linhas
+
+
+def main(argumentos: Optional[List[str]] = None) -> int:
+  parser = argparse.ArgumentParser(
+    prog="python -m benchmarks",
+    description="Mede /consultar e /processar contra uma ONS local e um BigQuery/GCS falsos, sem rede.",
+  )
+  parser.add_argument("--saida", help="arquivo JSON com os resultados (padrão: a saída padrão)")
+  parser.add_argument("--cenario", action="append", default=[], help="roda só os cenários cujo nome contém o texto")
+  parser.add_argument("--rapido", action="store_true", help="poucos dados e requisições, para uma verificação rápida")
+  parser.add_argument("--requisicoes", type=int, help="requisições por cenário")
+  parser.add_argument("--concorrencia", type=int, help="clientes simultâneos por cenário")
+  parser.add_argument("--reservatorios", type=int, help="reservatórios nos dados sintéticos")
+  parser.add_argument("--latencia-bigquery", type=float, default=0.0, help="segundos somados a cada consulta")
+  parser.add_argument("--latencia-ons", type=float, default=0.0, help="segundos somados a cada resposta da ONS")
+  parser.add_argument("--semente", type=int, default=0)
+  parser.add_argument("--comparar", help="resultado anterior, para mostrar a variação de cada cenário")
+  parser.add_argument("--listar", action="store_true", help="só lista os cenários")
+  parser.add_argument("--verboso", action="store_true", help="mostra os logs da API")
+  parser.add_argument("--interno", help=argparse.SUPPRESS)
+  parser.add_argument("--diretorio", help=argparse.SUPPRESS)
+  args = parser.parse_args(argumentos)
+
+  if args.interno:
+    resultado = cenarios.executar_cenario(json.loads(args.interno), args.diretorio)
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+      json.dump(resultado, arquivo)
+    return 0
+
+  selecionados = [
+    cenario
+    for cenario in cenarios.listar_cenarios(
+      args.rapido, args.requisicoes, args.concorrencia, args.reservatorios,
+      args.latencia_bigquery, args.latencia_ons, args.semente,
+    )
+    if not args.cenario or any(filtro in cenario["nome"] for filtro in args.cenario)
+  ]
+  if args.listar:
+    for cenario in selecionados:
+      print(cenario["nome"])
+    return 0
+
+  resultados = []
+  for cenario in selecionados:
+    resultado = _executar_em_processo(cenario, args.verboso)
+    print(_resumo(resultado), file=sys.stderr)
+    resultados.append(resultado)
+
+  relatorio = {
+    "versao_formato": VERSAO_FORMATO,
+    "gerado_em": datetime.now(timezone.utc).isoformat(),
+    "ambiente": _ambiente(),
+    "cenarios": resultados,
+  }
+  if args.saida:
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+      json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+  else:
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+  if args.comparar:
+    with open(args.comparar, encoding="utf-8") as arquivo:
+      print("\n".join(comparar(json.load(arquivo), relatorio)), file=sys.stderr)
+  return 1 if any("falha" in resultado for resultado in resultados) else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,257 @@
+import asyncio
+import os
+import random
+import resource
+import sys
+import time
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from benchmarks import dados
+from benchmarks.inicializacao import executar_cenario_inicializacao, listar_cenarios_inicializacao
+from benchmarks.servidor_ons import ServidorONS
+
+ANOS_PADRAO = (2020, 2021, 2022, 2023, 2024)
+
+# Matriz padrão: intervalos (em dias) e tamanhos de página de cada endpoint.
+BACKENDS_CONSULTA = ("bigquery", "parquet")
+INTERVALOS_CONSULTA = (7, 30, 365, 1825)
+TAMANHOS_PAGINA_CONSULTA = (20, 1000)
+FORMATOS_PROCESSAR = ("CSV", "PARQUET")
+INTERVALOS_PROCESSAR = (30, 365, 1095)
+TAMANHO_PAGINA_PROCESSAR = 50
+
+
+def listar_cenarios(
+    rapido: bool = False,
+    requisicoes: Optional[int] = None,
+    concorrencia: Optional[int] = None,
+    reservatorios: Optional[int] = None,
+    latencia_bigquery: float = 0.0,
+    latencia_ons: float = 0.0,
+    semente: int = 0,
+) -> List[Dict[str, Any]]:
+  """
+  Cenários da matriz padrão. `rapido` reduz os dados e as requisições para uma verificação
+  de poucos segundos; os demais parâmetros sobrescrevem os valores de todos os cenários.
+  """
+  comum = {
+    "anos": list(ANOS_PADRAO[-2:] if rapido else ANOS_PADRAO),
+    "reservatorios": reservatorios or (20 if rapido else dados.RESERVATORIOS_PADRAO),
+    "semente": semente,
+    "latencia_bigquery": latencia_bigquery,
+    "latencia_ons": latencia_ons,
+  }
+  cenarios = []
+  for backend in BACKENDS_CONSULTA:
+    for intervalo in INTERVALOS_CONSULTA:
+      for tamanho in TAMANHOS_PAGINA_CONSULTA:
+        cenarios.append({
+          **comum,
+          "nome": f"consultar/{backend}/{intervalo}d/tamanho={tamanho}",
+          "endpoint": "consultar",
+          "backend": backend,
+          "intervalo_dias": intervalo,
+          "tamanho": tamanho,
+          "requisicoes": requisicoes or (10 if rapido else 100),
+          "concorrencia": concorrencia or 4,
+        })
+  for formato in FORMATOS_PROCESSAR:
+    for intervalo in INTERVALOS_PROCESSAR:
+      cenarios.append({
+        **comum,
+        "nome": f"processar/{formato.lower()}/{intervalo}d",
+        "endpoint": "processar",
+        "formato": formato,
+        "intervalo_dias": intervalo,
+        "tamanho": TAMANHO_PAGINA_PROCESSAR,
+        "requisicoes": requisicoes or (2 if rapido else 5),
+        "concorrencia": concorrencia or 1,
+      })
+  return cenarios + listar_cenarios_inicializacao(rapido, requisicoes)
+
+
+def preparar_ambiente(cenario: Dict[str, Any], diretorio: str) -> None:
+  """
+  Configura, pelas variáveis de ambiente, a instância da API que o cenário vai medir. Precisa
+  rodar antes de importar os módulos da API, que leem as configurações na importação.
+  """
+  os.environ.update({
+    "ONS_CACHE_DIR": os.path.join(diretorio, "cache_ons"),
+    "CONSULTA_BACKEND": cenario.get("backend", "bigquery"),
+    "CONSULTA_PARQUET_URI": os.path.join(diretorio, "silver"),
+    "JOBS_ARMAZENAMENTO": "memoria",
+    "PERFIL_HABILITADO": "false",
+    "METRICAS_LIMIAR_LOG_MS": "inf",
+  })
+
+
+def rss_pico_mb() -> float:
+  """Pico de memória residente do processo (o `ru_maxrss` é em KB no Linux e em bytes no macOS)."""
+  pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _intervalo(cenario: Dict[str, Any], inicio_dados: date, fim_dados: date, aleatorio: random.Random):
+  """Um intervalo de `intervalo_dias` dentro dos dados; sorteado quando há mais de uma posição."""
+  duracao = timedelta(days=cenario["intervalo_dias"] - 1)
+  folga = max((fim_dados - inicio_dados - duracao).days, 0)
+  inicio = inicio_dados + timedelta(days=aleatorio.randint(0, folga)) if aleatorio else fim_dados - duracao
+  return max(inicio, inicio_dados), min(inicio + duracao, fim_dados)
+
+
+def montar_requisicoes(cenario: Dict[str, Any]) -> List[Dict[str, Any]]:
+  """
+  As requisições do cenário. No /consultar, o início de cada intervalo é sorteado (com a
+  semente do cenário) dentro dos dados; o /processar repete o intervalo que termina no último dia.
+  """
+  inicio_dados, fim_dados = dados.periodo_dos_dados(cenario["anos"])
+  requisicoes = []
+  if cenario["endpoint"] == "consultar":
+    aleatorio = random.Random(cenario["semente"])
+    for _ in range(cenario["requisicoes"]):
+      inicio, fim = _intervalo(cenario, inicio_dados, fim_dados, aleatorio)
+      requisicoes.append({
+        "metodo": "GET",
+        "url": "/consultar",
+        "params": {"data_inicio": inicio.isoformat(), "data_fim": fim.isoformat(), "tamanho": cenario["tamanho"]},
+      })
+  else:
+    inicio, fim = _intervalo(cenario, inicio_dados, fim_dados, None)
+    for _ in range(cenario["requisicoes"]):
+      requisicoes.append({
+        "metodo": "POST",
+        "url": "/processar",
+        "params": {"tamanho": cenario["tamanho"]},
+        "json": {"data_inicio": inicio.isoformat(), "data_fim": fim.isoformat()},
+      })
+  return requisicoes
+
+
+def resumir_latencias(latencias_ms: List[float]) -> Dict[str, float]:
+  """Percentis, média e máxima de uma amostra de latências em milissegundos."""
+  latencias = np.array(latencias_ms)
+  p50, p90, p99 = np.percentile(latencias, [50, 90, 99])
+  return {
+    "p50": round(float(p50), 2),
+    "p90": round(float(p90), 2),
+    "p99": round(float(p99), 2),
+    "media": round(float(latencias.mean()), 2),
+    "maxima": round(float(latencias.max()), 2),
+  }
+
+
+async def medir(cliente, requisicoes: List[Dict[str, Any]], concorrencia: int) -> Dict[str, Any]:
+  """
+  Envia as requisições com `concorrencia` clientes simultâneos e mede a latência de cada uma.
+  A primeira é enviada sozinha e reportada à parte (cache frio); as demais formam a amostra.
+  """
+  async def enviar(requisicao: Dict[str, Any]) -> Dict[str, Any]:
+    inicio = time.perf_counter()
+    resposta = await cliente.request(
+      requisicao["metodo"], requisicao["url"], params=requisicao.get("params"), json=requisicao.get("json")
+    )
+    latencia = time.perf_counter() - inicio
+    corpo = resposta.json() if resposta.status_code == 200 else {}
+    return {
+      "latencia": latencia,
+      "erro": resposta.status_code != 200,
+      "bytes": len(resposta.content),
+      "registros": len(corpo.get("dados", [])),
+      "total_registros": corpo.get("total_registros", 0),
+    }
+
+  primeira = await enviar(requisicoes[0])
+  medicoes: List[Dict[str, Any]] = []
+  pendentes = iter(requisicoes[1:])
+
+  async def cliente_simultaneo():
+    for requisicao in pendentes:
+      medicoes.append(await enviar(requisicao))
+
+  inicio = time.perf_counter()
+  await asyncio.gather(*[cliente_simultaneo() for _ in range(max(1, concorrencia))])
+  duracao = time.perf_counter() - inicio
+
+  amostra = medicoes or [primeira]
+  return {
+    "primeira_ms": round(primeira["latencia"] * 1000, 2),
+    "latencia_ms": resumir_latencias([medicao["latencia"] * 1000 for medicao in amostra]),
+    "duracao_s": round(duracao, 3),
+    "vazao_rps": round(len(medicoes) / duracao, 2) if medicoes and duracao else None,
+    "erros": primeira["erro"] + sum(medicao["erro"] for medicao in medicoes),
+    "bytes_resposta_media": round(float(np.mean([medicao["bytes"] for medicao in amostra]))),
+    "registros_pagina_media": round(float(np.mean([medicao["registros"] for medicao in amostra])), 1),
+    "total_registros_media": round(float(np.mean([medicao["total_registros"] for medicao in amostra])), 1),
+  }
+
+
+def executar_cenario(cenario: Dict[str, Any], diretorio: str) -> Dict[str, Any]:
+  """
+  Prepara os dados e as dependências falsas do cenário, mede-o contra a aplicação em processo
+  (via ASGI, sem a pilha de rede) e retorna o resultado. Deve rodar em um processo próprio, para
+  que o pico de memória e os caches sejam só deste cenário.
+  """
+  preparar_ambiente(cenario, diretorio)
+  if cenario["endpoint"] == "inicializacao":
+    # Mede interpretadores novos; a API não é importada neste processo.
+    return executar_cenario_inicializacao(cenario)
+  # Importados só agora: as configurações da API são lidas na importação.
+  import httpx
+  import service
+  from benchmarks.nuvem_falsa import BigQueryFalso, registrar_gcs_local
+  from consultas import gravar_dataset_parquet
+  from main import app
+
+  servidor: Optional[ServidorONS] = None
+  dependencias: Dict[str, Any] = {}
+  if cenario["endpoint"] == "consultar":
+    tabela = dados.tabela_normalizada(cenario["anos"], cenario["reservatorios"], cenario["semente"])
+    if cenario["backend"] == "parquet":
+      gravar_dataset_parquet(tabela, os.environ["CONSULTA_PARQUET_URI"])
+    else:
+      cliente_bigquery = BigQueryFalso(tabela, cenario["latencia_bigquery"])
+      service.definir_cliente_bigquery(cliente_bigquery)
+      dependencias["bigquery"] = cliente_bigquery
+    del tabela
+  else:
+    inicio, fim = _intervalo(cenario, *dados.periodo_dos_dados(cenario["anos"]), None)
+    recursos = dados.gerar_arquivos(
+      os.path.join(diretorio, "ons"), range(inicio.year, fim.year + 1), (cenario["formato"],),
+      cenario["reservatorios"], cenario["semente"],
+    )
+    servidor = ServidorONS(recursos, cenario["latencia_ons"]).iniciar()
+    service.URL_PACOTE_ONS = servidor.url_pacote
+    service.URL_DOWNLOAD_RECURSO_ONS = servidor.url_download_recurso
+    service.NOME_BUCKET = "benchmark"
+    registrar_gcs_local(os.path.join(diretorio, "gcs"))
+
+  async def executar():
+    from cliente_ons import cliente_ons
+    from motor import motor_processamento
+    transporte = httpx.ASGITransport(app=app)
+    try:
+      async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark", timeout=None) as cliente:
+        return await medir(cliente, montar_requisicoes(cenario), cenario["concorrencia"])
+    finally:
+      await cliente_ons.fechar()
+      motor_processamento.encerrar()
+
+  rss_base = rss_pico_mb()
+  try:
+    resultado = asyncio.run(executar())
+  finally:
+    if servidor is not None:
+      servidor.parar()
+
+  resultado.update({"rss_base_mb": rss_base, "rss_pico_mb": rss_pico_mb()})
+  if servidor is not None:
+    resultado["ons"] = servidor.estatisticas()
+  if "bigquery" in dependencias:
+    resultado["bigquery"] = {
+      "consultas": dependencias["bigquery"].consultas,
+      "bytes_processados": dependencias["bigquery"].bytes_processados,
+    }
+  return {**cenario, **resultado}
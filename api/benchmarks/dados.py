@@ -0,0 +1,138 @@
+import os
+import uuid
+from datetime import date
+from typing import List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from esquema import COLUNAS_ENA, COLUNA_DATA_ONS
+from leitura import concatenar_tabelas
+from normalizacao import normalizar_tabela
+
+# Da ordem de grandeza dos arquivos anuais de EAR diário por reservatório da ONS.
+RESERVATORIOS_PADRAO = 150
+
+SUBSISTEMAS = ("SE", "S", "NE", "N")
+BACIAS = ("PARANÁ", "GRANDE", "PARANAÍBA", "SÃO FRANCISCO", "TOCANTINS", "IGUAÇU", "URUGUAI", "JACUÍ")
+REES = ("SUDESTE", "PARANÁ", "ITAIPU", "SUL", "IGUAÇU", "NORDESTE", "NORTE", "MADEIRA")
+TIPOS_RESERVATORIO = ("Reservatório com usina", "Reservatório sem usina")
+
+# Os CSVs da ONS trazem uma linha antes do cabeçalho (lido com header=1).
+PREAMBULO_CSV = "EAR diário por reservatório"
+
+NAMESPACE_RECURSOS = uuid.UUID("148e56a4-5a21-4bf2-9cd7-7f89bc4ed71c")
+
+
+def nome_recurso(ano: int) -> str:
+  return f"EAR_DIARIO_RESERVATORIOS_{ano}"
+
+
+def id_recurso(ano: int, formato: str) -> str:
+  """Id estável do recurso, para que o cache em disco reconheça o mesmo arquivo entre execuções."""
+  return str(uuid.uuid5(NAMESPACE_RECURSOS, f"{nome_recurso(ano)}.{formato.lower()}"))
+
+
+def gerar_tabela_ano(ano: int, reservatorios: int = RESERVATORIOS_PADRAO, semente: int = 0) -> pa.Table:
+  """
+  Um ano de leituras diárias de `reservatorios` reservatórios, com as colunas e a ordenação
+  (data, reservatório) dos arquivos da ONS. Os atributos de cada reservatório dependem só da
+  `semente`, então são os mesmos em todos os anos; as leituras variam com o ano.
+  """
+  aleatorio_reservatorios = np.random.default_rng(semente)
+  aleatorio = np.random.default_rng([semente, ano])
+
+  dias = np.arange(np.datetime64(f"{ano}-01-01"), np.datetime64(f"{ano + 1}-01-01"), dtype="datetime64[D]")
+  codigos = np.arange(1, reservatorios + 1)
+  total = len(dias) * reservatorios
+  indice_reservatorio = np.tile(np.arange(reservatorios), len(dias))
+
+  maxima = aleatorio_reservatorios.uniform(50, 20_000, reservatorios)
+  fase = aleatorio_reservatorios.uniform(0, 2 * np.pi, reservatorios)
+  fatores = {coluna: aleatorio_reservatorios.uniform(0.001, 1, reservatorios) for coluna in COLUNAS_ENA}
+
+  dia_do_ano = np.repeat(np.arange(len(dias)), reservatorios)
+  percentual = 55 + 30 * np.sin(2 * np.pi * dia_do_ano / 365 + fase[indice_reservatorio])
+  percentual = np.clip(percentual + aleatorio.normal(0, 3, total), 0, 100).round(2)
+  ear_total = (percentual / 100 * maxima[indice_reservatorio]).round(2)
+
+  colunas: Dict[str, Any] = {
+    COLUNA_DATA_ONS: pa.array(np.repeat(dias, reservatorios)),
+    "cod_resplanejamento": pa.array(codigos[indice_reservatorio]),
+    "nom_reservatorio": pa.array([f"RESERVATÓRIO {codigo:03d}" for codigo in codigos]).take(indice_reservatorio),
+    "ear_total_mwmes": pa.array(ear_total),
+    "ear_maxima_total_mwmes": pa.array(maxima.round(2)[indice_reservatorio]),
+    "ear_reservatorio_percentual": pa.array(percentual),
+    "nom_bacia": pa.array([BACIAS[i % len(BACIAS)] for i in range(reservatorios)]).take(indice_reservatorio),
+    "nom_subsistema": pa.array([SUBSISTEMAS[i % len(SUBSISTEMAS)] for i in range(reservatorios)]).take(indice_reservatorio),
+    "nom_ree": pa.array([REES[i % len(REES)] for i in range(reservatorios)]).take(indice_reservatorio),
+    "tip_reservatorio": pa.array(
+      [TIPOS_RESERVATORIO[i % len(TIPOS_RESERVATORIO)] for i in range(reservatorios)]
+    ).take(indice_reservatorio),
+  }
+  for coluna in COLUNAS_ENA:
+    if coluna not in colunas:
+      # Contribuições e energias por subsistema: proporcionais à EAR do reservatório.
+      colunas[coluna] = pa.array((ear_total * fatores[coluna][indice_reservatorio]).round(4))
+  return pa.table({coluna: colunas[coluna] for coluna in COLUNAS_ENA})
+
+
+def gravar_csv_ons(tabela: pa.Table, caminho: str) -> None:
+  """Grava no formato dos CSVs da ONS: latin-1, ';' e cabeçalho na segunda linha."""
+  with open(caminho, "w", encoding="latin-1", newline="") as arquivo:
+    arquivo.write(PREAMBULO_CSV + "\n")
+    tabela.to_pandas().to_csv(arquivo, sep=";", index=False, lineterminator="\n")
+
+
+def gravar_parquet_ons(tabela: pa.Table, caminho: str) -> None:
+  pq.write_table(tabela, caminho)
+
+
+def gerar_arquivos(
+    diretorio: str,
+    anos: Iterable[int],
+    formatos: Iterable[str] = ("CSV", "PARQUET"),
+    reservatorios: int = RESERVATORIOS_PADRAO,
+    semente: int = 0,
+) -> List[Dict[str, Any]]:
+  """
+  Grava um arquivo por ano e formato em `diretorio` e retorna os recursos correspondentes
+  (id, name, format, ano e o caminho do arquivo), prontos para o `ServidorONS` publicar.
+  """
+  os.makedirs(diretorio, exist_ok=True)
+  recursos = []
+  for ano in anos:
+    tabela = gerar_tabela_ano(ano, reservatorios, semente)
+    for formato in formatos:
+      formato = formato.upper()
+      caminho = os.path.join(diretorio, f"{nome_recurso(ano)}.{formato.lower()}")
+      if formato == "CSV":
+        gravar_csv_ons(tabela, caminho)
+      elif formato == "PARQUET":
+        gravar_parquet_ons(tabela, caminho)
+      else:
+        raise ValueError(f"Formato não suportado: {formato}")
+      recursos.append({
+        "id": id_recurso(ano, formato),
+        "name": nome_recurso(ano),
+        "format": formato,
+        "ano": ano,
+        "arquivo": caminho,
+      })
+  return recursos
+
+
+def tabela_normalizada(anos: Iterable[int], reservatorios: int = RESERVATORIOS_PADRAO, semente: int = 0) -> pa.Table:
+  """Os mesmos dados de `gerar_arquivos`, já no schema da `ena_consolidado` (a tabela carregada)."""
+  tabelas = []
+  for ano in anos:
+    tabela, _ = normalizar_tabela(gerar_tabela_ano(ano, reservatorios, semente), f"{nome_recurso(ano)}.parquet")
+    tabelas.append(tabela)
+  return concatenar_tabelas(tabelas)
+
+
+def periodo_dos_dados(anos: Iterable[int]) -> Tuple[date, date]:
+  """Primeiro e último dia dos dados gerados para `anos`."""
+  anos = sorted(anos)
+  return date(anos[0], 1, 1), date(anos[-1], 12, 31)
@@ -0,0 +1,134 @@
+import os
+import re
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Dict, Any, Optional
+
+import httpx
+
+DIRETORIO_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Módulos pesados que não devem ser importados na subida da API, só no primeiro uso.
+MODULOS_ADIADOS = ("pandas", "pyarrow.dataset", "google.cloud.bigquery", "google.cloud.storage", "gcsfs", "polars")
+
+LINHA_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def resumir_importtime(saida: str, modulo: str = "main", maximo_pacotes: int = 15) -> Dict[str, Any]:
+  """
+  Resume a saída de `python -X importtime`: o tempo total de importação de `modulo` e o tempo
+  próprio somado por pacote (o primeiro nome do módulo), do mais caro para o mais barato. Os
+  módulos da API (arquivos de src/) aparecem cada um com o próprio nome.
+  """
+  por_pacote: Dict[str, int] = {}
+  total_us = None
+  for linha in saida.splitlines():
+    encontrada = LINHA_IMPORTTIME.match(linha)
+    if not encontrada:
+      continue
+    proprio_us, acumulado_us, recuo, nome = encontrada.groups()
+    pacote = nome.split(".")[0]
+    por_pacote[pacote] = por_pacote.get(pacote, 0) + int(proprio_us)
+    if nome == modulo and not recuo:
+      total_us = int(acumulado_us)
+  mais_caros = sorted(por_pacote.items(), key=lambda item: item[1], reverse=True)[:maximo_pacotes]
+  return {
+    "total_ms": round(total_us / 1000, 1) if total_us is not None else None,
+    "por_pacote_ms": {pacote: round(duracao / 1000, 1) for pacote, duracao in mais_caros},
+  }
+
+
+def medir_importacao(modulo: str = "main") -> Dict[str, Any]:
+  """Importa `modulo` em um interpretador novo com `-X importtime` e resume a saída."""
+  verificacao = f"import sys; print(','.join(m for m in {MODULOS_ADIADOS!r} if m in sys.modules))"
+  processo = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", f"import {modulo}; {verificacao}"],
+    cwd=DIRETORIO_SRC, capture_output=True, text=True, check=True,
+  )
+  resumo = resumir_importtime(processo.stderr, modulo)
+  resumo["modulos_pesados_importados"] = [nome for nome in processo.stdout.strip().split(",") if nome]
+  return resumo
+
+
+def _porta_livre() -> int:
+  with socket.socket() as conexao:
+    conexao.bind(("127.0.0.1", 0))
+    return conexao.getsockname()[1]
+
+
+def medir_subida(aplicacao: str = "inicio:app", prazo: float = 60.0) -> Dict[str, float]:
+  """
+  Sobe o uvicorn com `aplicacao` e mede, a partir do início do processo, quando o /health
+  responde e quando a API fica pronta (o /metrics só responde depois de a API carregar).
+  """
+  porta = _porta_livre()
+  inicio = time.perf_counter()
+  processo = subprocess.Popen(
+    [sys.executable, "-m", "uvicorn", aplicacao, "--port", str(porta), "--log-level", "warning"],
+    cwd=DIRETORIO_SRC, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+  )
+  try:
+    saude_ms = None
+    with httpx.Client(base_url=f"http://127.0.0.1:{porta}", timeout=prazo) as cliente:
+      while saude_ms is None:
+        if time.perf_counter() - inicio > prazo or processo.poll() is not None:
+          raise RuntimeError(f"o servidor não respondeu ao /health em {prazo:.0f}s")
+        try:
+          cliente.get("/health").raise_for_status()
+          saude_ms = (time.perf_counter() - inicio) * 1000
+        except httpx.TransportError:
+          time.sleep(0.005)
+      cliente.get("/metrics").raise_for_status()
+      pronta_ms = (time.perf_counter() - inicio) * 1000
+  finally:
+    processo.terminate()
+    processo.wait(timeout=30)
+  return {"health_ms": saude_ms, "pronta_ms": pronta_ms}
+
+
+def rss_pico_subprocessos_mb() -> float:
+  """Maior pico de memória residente entre os subprocessos já encerrados."""
+  pico = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+  return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def executar_cenario_inicializacao(cenario: Dict[str, Any]) -> Dict[str, Any]:
+  """
+  Repete a medição de inicialização do cenário (`importacao` ou `servidor`). A latência
+  reportada é o tempo de importação da API ou o tempo até a primeira resposta do /health.
+  """
+  from benchmarks.cenarios import resumir_latencias
+
+  resultado: Dict[str, Any] = {}
+  if cenario["medicao"] == "importacao":
+    medicoes = [medir_importacao() for _ in range(cenario["requisicoes"])]
+    # A repetição mais rápida é a que menos sofre com o cache de disco e a carga da máquina.
+    melhor = min(medicoes, key=lambda medicao: medicao["total_ms"])
+    latencias = [medicao["total_ms"] for medicao in medicoes]
+    resultado.update(melhor)
+  else:
+    subidas = [medir_subida(cenario["aplicacao"]) for _ in range(cenario["requisicoes"])]
+    latencias = [subida["health_ms"] for subida in subidas]
+    resultado["pronta_ms"] = resumir_latencias([subida["pronta_ms"] for subida in subidas])
+  resultado.update({
+    "primeira_ms": round(latencias[0], 2),
+    "latencia_ms": resumir_latencias(latencias),
+    "vazao_rps": None,
+    "erros": 0,
+    "rss_pico_mb": rss_pico_subprocessos_mb(),
+  })
+  return {**cenario, **resultado}
+
+
+def listar_cenarios_inicializacao(rapido: bool = False, repeticoes: Optional[int] = None) -> List[Dict[str, Any]]:
+  """Cenários de inicialização: importação da API e subida do servidor, cada um repetido `repeticoes` vezes."""
+  repeticoes = repeticoes or (2 if rapido else 5)
+  return [
+    {"nome": "inicializacao/importacao", "endpoint": "inicializacao", "medicao": "importacao",
+     "requisicoes": repeticoes},
+    {"nome": "inicializacao/servidor", "endpoint": "inicializacao", "medicao": "servidor",
+     "aplicacao": "inicio:app", "requisicoes": repeticoes},
+  ]
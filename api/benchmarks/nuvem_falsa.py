@@ -0,0 +1,148 @@
+import os
+import re
+import time
+from typing import List, Dict, Any, Iterator, Optional
+
+import fsspec
+import pyarrow as pa
+import pyarrow.compute as pc
+from fsspec.implementations.local import LocalFileSystem
+
+from consultas import COLUNA_DATA_CONSULTA
+from esquema import COLUNA_DATA_ONS
+
+_LIMITE_DESLOCAMENTO = re.compile(r"LIMIT\s+(\d+)\s+OFFSET\s+(\d+)")
+
+
+class ResultadoFalso:
+  """O que `QueryJob.result()` devolve: iterável de linhas, com `.pages` e `.to_arrow()`."""
+
+  def __init__(self, tabela: pa.Table, tamanho_pagina: Optional[int] = None):
+    self._tabela = tabela
+    self._tamanho_pagina = tamanho_pagina or max(tabela.num_rows, 1)
+    self.total_rows = tabela.num_rows
+
+  def __iter__(self) -> Iterator[Dict[str, Any]]:
+    return iter(self._tabela.to_pylist())
+
+  @property
+  def pages(self) -> Iterator[List[Dict[str, Any]]]:
+    for inicio in range(0, self._tabela.num_rows, self._tamanho_pagina):
+      yield self._tabela.slice(inicio, self._tamanho_pagina).to_pylist()
+
+  def to_arrow(self) -> pa.Table:
+    return self._tabela
+
+
+class JobFalso:
+
+  def __init__(self, tabela: pa.Table, total_bytes_processed: int):
+    self._tabela = tabela
+    self.total_bytes_processed = total_bytes_processed
+
+  def result(self, page_size: Optional[int] = None) -> ResultadoFalso:
+    return ResultadoFalso(self._tabela, page_size)
+
+
+class BigQueryFalso:
+  """
+  Cliente falso do BigQuery que responde às consultas do `BackendBigQuery` a partir de uma
+  tabela Arrow em memória, sem interpretar SQL: usa os parâmetros da consulta (intervalo,
+  filtros e cursor), o `COUNT(*)` e o `LIMIT/OFFSET` do texto. Os bytes processados são os das
+  linhas lidas, e `latencia` (em segundos) simula o tempo de um job. `intervalos` guarda o
+  (data_inicio, data_fim) de cada consulta recebida.
+  """
+
+  def __init__(self, tabela: pa.Table, latencia: float = 0.0):
+    if COLUNA_DATA_ONS in tabela.column_names:
+      tabela = tabela.rename_columns(
+        [COLUNA_DATA_CONSULTA if nome == COLUNA_DATA_ONS else nome for nome in tabela.column_names]
+      )
+    # O BigQuery devolve textos, e não dicionários.
+    colunas = [
+      coluna.cast(coluna.type.value_type) if pa.types.is_dictionary(coluna.type) else coluna
+      for coluna in tabela.columns
+    ]
+    tabela = pa.Table.from_arrays(colunas, names=tabela.column_names)
+    self.tabela = tabela.sort_by([(COLUNA_DATA_CONSULTA, "descending"), ("cod_resplanejamento", "descending")])
+    self.latencia = latencia
+    self.consultas = 0
+    self.intervalos = []
+    self.bytes_processados = 0
+
+  def query(self, query: str, job_config=None) -> JobFalso:
+    if self.latencia:
+      time.sleep(self.latencia)
+    parametros = {p.name: p.value for p in job_config.query_parameters}
+    datas = self.tabela.column(COLUNA_DATA_CONSULTA)
+    mascara = pc.and_(
+      pc.greater_equal(datas, pa.scalar(parametros["data_inicio"], datas.type)),
+      pc.less_equal(datas, pa.scalar(parametros["data_fim"], datas.type)),
+    )
+    for coluna in ("cod_resplanejamento", "nom_subsistema"):
+      if coluna in parametros:
+        mascara = pc.and_(mascara, pc.equal(self.tabela.column(coluna), parametros[coluna]))
+    if "cursor_data" in parametros:
+      cursor_data = pa.scalar(parametros["cursor_data"], datas.type)
+      mascara = pc.and_(mascara, pc.or_(
+        pc.less(datas, cursor_data),
+        pc.and_(
+          pc.equal(datas, cursor_data),
+          pc.less(self.tabela.column("cod_resplanejamento"), parametros["cursor_cod"]),
+        ),
+      ))
+    # A tabela já está na ordenação das consultas; o filtro a preserva.
+    selecionadas = self.tabela.filter(mascara)
+
+    self.consultas += 1
+    self.intervalos.append((parametros["data_inicio"], parametros["data_fim"]))
+    if "COUNT(*)" in query:
+      bytes_lidos = selecionadas.column(COLUNA_DATA_CONSULTA).nbytes
+      resultado = pa.table({"total": [selecionadas.num_rows]})
+    else:
+      bytes_lidos = selecionadas.nbytes
+      limite = _LIMITE_DESLOCAMENTO.search(query)
+      resultado = selecionadas
+      if limite:
+        resultado = selecionadas.slice(int(limite.group(2)), int(limite.group(1)))
+    self.bytes_processados += bytes_lidos
+    return JobFalso(resultado, bytes_lidos)
+
+
+class GCSLocal(LocalFileSystem):
+  """
+  Sistema de arquivos do fsspec que grava os caminhos `gs://bucket/...` em um diretório local
+  (`raiz`), no lugar do gcsfs. Use `registrar_gcs_local` para que `fsspec.open("gs://...")` e o
+  backend Parquet o usem.
+  """
+
+  protocol = ("gs", "gcs")
+  raiz = ""
+
+  def __init__(self, *args, **kwargs):
+    kwargs["auto_mkdir"] = True
+    super().__init__(*args, **kwargs)
+
+  @classmethod
+  def _strip_protocol(cls, path):
+    path = str(path)
+    for prefixo in ("gs://", "gcs://"):
+      if path.startswith(prefixo):
+        return os.path.join(cls.raiz, path[len(prefixo):])
+    if path.startswith(cls.raiz):
+      return path
+    return os.path.join(cls.raiz, path.lstrip("/"))
+
+
+def gcs_local(diretorio: str) -> type:
+  """Uma classe `GCSLocal` com raiz em `diretorio` (uma por raiz, pois o fsspec guarda instâncias)."""
+  os.makedirs(diretorio, exist_ok=True)
+  return type("GCSLocal", (GCSLocal,), {"raiz": os.path.abspath(diretorio)})
+
+
+def registrar_gcs_local(diretorio: str) -> type:
+  """Faz o protocolo `gs://` gravar em `diretorio` neste processo. Retorna a classe registrada."""
+  classe = gcs_local(diretorio)
+  for protocolo in GCSLocal.protocol:
+    fsspec.register_implementation(protocolo, classe, clobber=True)
+  return classe
@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlsplit
+
+ID_PACOTE = "148e56a4-5a21-4bf2-9cd7-7f89bc4ed71c"
+TAMANHO_BLOCO_ENVIO = 256 * 1024
+
+
+class ServidorONS:
+  """
+  Servidor HTTP local no lugar do portal de dados da ONS, para os benchmarks rodarem sem rede.
+
+  Responde ao `package_show` com os `recursos` informados (gerados por `dados.gerar_arquivos`) e
+  entrega cada arquivo em `/dataset/{pacote}/resource/{id}/download`, com ETag e Last-Modified
+  e respostas 304 como o portal. `latencia` (em segundos) é somada a cada resposta, para simular
+  a distância até a ONS. Conta as requisições e os bytes enviados.
+  """
+
+  def __init__(self, recursos: List[Dict[str, Any]], latencia: float = 0.0, host: str = "127.0.0.1"):
+    self.latencia = latencia
+    self._recursos = {recurso["id"]: recurso for recurso in recursos}
+    self._servidor = ThreadingHTTPServer((host, 0), self._criar_manipulador())
+    self._servidor.daemon_threads = True
+    self._thread: Optional[threading.Thread] = None
+    self._trava = threading.Lock()
+    self.requisicoes_catalogo = 0
+    self.downloads = 0
+    self.respostas_304 = 0
+    self.bytes_enviados = 0
+
+  @property
+  def url_base(self) -> str:
+    host, porta = self._servidor.server_address[:2]
+    return f"http://{host}:{porta}"
+
+  @property
+  def url_pacote(self) -> str:
+    return f"{self.url_base}/api/3/action/package_show?id={ID_PACOTE}"
+
+  @property
+  def url_download_recurso(self) -> str:
+    """Equivalente ao `service.URL_DOWNLOAD_RECURSO_ONS`: o id do recurso e `/download` vêm depois."""
+    return f"{self.url_base}/dataset/{ID_PACOTE}/resource/"
+
+  def iniciar(self) -> "ServidorONS":
+    self._thread = threading.Thread(target=self._servidor.serve_forever, name="servidor-ons", daemon=True)
+    self._thread.start()
+    return self
+
+  def parar(self) -> None:
+    self._servidor.shutdown()
+    self._servidor.server_close()
+    if self._thread is not None:
+      self._thread.join()
+
+  def __enter__(self) -> "ServidorONS":
+    return self.iniciar()
+
+  def __exit__(self, *_) -> None:
+    self.parar()
+
+  def estatisticas(self) -> Dict[str, int]:
+    with self._trava:
+      return {
+        "requisicoes_catalogo": self.requisicoes_catalogo,
+        "downloads": self.downloads,
+        "respostas_304": self.respostas_304,
+        "bytes_enviados": self.bytes_enviados,
+      }
+
+  def pacote(self) -> Dict[str, Any]:
+    """Corpo do `package_show`, com os campos dos recursos que a API usa."""
+    recursos = []
+    for recurso in self._recursos.values():
+      extensao = recurso["format"].lower()
+      recursos.append({
+        "id": recurso["id"],
+        "name": recurso["name"],
+        "format": recurso["format"],
+        "url": f"{self.url_base}/arquivos/{recurso['name']}.{extensao}",
+        "last_modified": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(os.path.getmtime(recurso["arquivo"]))),
+        "size": os.path.getsize(recurso["arquivo"]),
+      })
+    return {"success": True, "result": {"id": ID_PACOTE, "resources": recursos}}
+
+  def _contar(self, **incrementos: int) -> None:
+    with self._trava:
+      for nome, valor in incrementos.items():
+        setattr(self, nome, getattr(self, nome) + valor)
+
+  def _recurso_do_caminho(self, caminho: str) -> Optional[Dict[str, Any]]:
+    partes = caminho.strip("/").split("/")
+    if len(partes) == 5 and partes[0] == "dataset" and partes[2] == "resource" and partes[4] == "download":
+      return self._recursos.get(partes[3])
+    if len(partes) == 2 and partes[0] == "arquivos":
+      for recurso in self._recursos.values():
+        if os.path.basename(recurso["arquivo"]) == partes[1]:
+          return recurso
+    return None
+
+  def _criar_manipulador(self):
+    servidor = self
+
+    class Manipulador(BaseHTTPRequestHandler):
+      protocol_version = "HTTP/1.1"
+
+      def log_message(self, *_):
+        pass
+
+      def do_GET(self):
+        if servidor.latencia:
+          time.sleep(servidor.latencia)
+        caminho = urlsplit(self.path).path
+        if caminho == "/api/3/action/package_show":
+          servidor._contar(requisicoes_catalogo=1)
+          self._responder_json(servidor.pacote())
+          return
+        recurso = servidor._recurso_do_caminho(caminho)
+        if recurso is None:
+          self._responder_json({"success": False, "error": "Não encontrado"}, 404)
+          return
+        self._enviar_arquivo(recurso["arquivo"])
+
+      def _responder_json(self, corpo: Dict[str, Any], status: int = 200):
+        conteudo = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+      def _enviar_arquivo(self, caminho: str):
+        estado = os.stat(caminho)
+        etag = f'"{estado.st_size:x}-{int(estado.st_mtime):x}"'
+        if self.headers.get("If-None-Match") == etag:
+          servidor._contar(respostas_304=1)
+          self.send_response(304)
+          self.send_header("ETag", etag)
+          self.send_header("Content-Length", "0")
+          self.end_headers()
+          return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(estado.st_size))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(estado.st_mtime, usegmt=True))
+        self.end_headers()
+        with open(caminho, "rb") as arquivo:
+          while bloco := arquivo.read(TAMANHO_BLOCO_ENVIO):
+            self.wfile.write(bloco)
+        servidor._contar(downloads=1, bytes_enviados=estado.st_size)
+
+    return Manipulador
@@ -0,0 +1,205 @@
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from consultas import COLUNA_DATA_CONSULTA
+from series import indice_series, padronizar_tabela
+
+# Agregados da camada gold: períodos, dimensões e medidas calculados.
+NIVEIS = ("diario", "semanal", "mensal")
+DIMENSOES = ("nom_subsistema", "nom_bacia", "nom_ree")
+COLUNAS_AGREGADAS = ("ear_total_mwmes", "ear_maxima_total_mwmes", "ear_reservatorio_percentual")
+
+COLUNA_PERIODO = "periodo"
+COLUNA_CHAVE = "chave"
+
+
+def inicio_periodo(datas: np.ndarray, nivel: str) -> np.ndarray:
+  """Primeiro dia do período de cada data: o próprio dia, a segunda-feira da semana ou o dia 1 do mês."""
+  datas = datas.astype("datetime64[D]")
+  if nivel == "semanal":
+    # 1970-01-01 foi uma quinta-feira; +3 desloca o início da semana para segunda.
+    return datas - ((datas.astype("int64") + 3) % 7).astype("timedelta64[D]")
+  if nivel == "mensal":
+    return datas.astype("datetime64[M]").astype("datetime64[D]")
+  return datas
+
+
+def _fim_periodo(inicio: np.datetime64, nivel: str) -> np.datetime64:
+  if nivel == "semanal":
+    return inicio + np.timedelta64(6, "D")
+  if nivel == "mensal":
+    return (inicio.astype("datetime64[M]") + 1).astype("datetime64[D]") - np.timedelta64(1, "D")
+  return inicio
+
+
+def _chaves_dimensao(coluna: pa.ChunkedArray) -> pa.ChunkedArray:
+  if pa.types.is_dictionary(coluna.type):
+    coluna = coluna.cast(coluna.type.value_type)
+  return pc.utf8_upper(pc.utf8_trim_whitespace(coluna.cast(pa.string())))
+
+
+def _somar_por_dia(tabela: pa.Table, dimensao: str) -> pa.Table:
+  """Soma e contagem de cada medida por (dia, valor da dimensão): a base dos demais níveis."""
+  colunas = {
+    COLUNA_DATA_CONSULTA: tabela.column(COLUNA_DATA_CONSULTA).cast(pa.date32()),
+    COLUNA_CHAVE: _chaves_dimensao(tabela.column(dimensao)),
+  }
+  for coluna in COLUNAS_AGREGADAS:
+    if coluna in tabela.column_names:
+      colunas[coluna] = tabela.column(coluna).cast(pa.float64())
+    else:
+      colunas[coluna] = pa.nulls(tabela.num_rows, pa.float64())
+  linhas = pa.table(colunas)
+  linhas = linhas.filter(pc.is_valid(linhas.column(COLUNA_CHAVE)))
+
+  agregacoes = [(coluna, funcao) for coluna in COLUNAS_AGREGADAS for funcao in ("sum", "count")]
+  diario = linhas.group_by([COLUNA_DATA_CONSULTA, COLUNA_CHAVE], use_threads=False).aggregate(agregacoes)
+  nomes = [
+    nome.replace("_sum", "_soma").replace("_count", "_contagem") for nome in diario.column_names
+  ]
+  return diario.rename_columns(nomes)
+
+
+def _agregar_periodos(diario: pa.Table, nivel: str, periodos: pa.Array) -> pa.Table:
+  """Agrega as linhas diárias dos `periodos` informados, calculando as médias a partir das somas."""
+  inicios = pa.array(inicio_periodo(diario.column(COLUNA_DATA_CONSULTA).to_numpy(), nivel))
+  linhas = diario.append_column(COLUNA_PERIODO, inicios)
+  linhas = linhas.filter(pc.is_in(linhas.column(COLUNA_PERIODO), value_set=periodos))
+
+  agregacoes = [([], "count_all")]
+  for coluna in COLUNAS_AGREGADAS:
+    agregacoes += [(f"{coluna}_soma", "sum"), (f"{coluna}_contagem", "sum")]
+  agrupado = linhas.group_by([COLUNA_PERIODO, COLUNA_CHAVE], use_threads=False).aggregate(agregacoes)
+
+  colunas = {
+    COLUNA_PERIODO: agrupado.column(COLUNA_PERIODO),
+    COLUNA_CHAVE: agrupado.column(COLUNA_CHAVE),
+    "dias": agrupado.column("count_all"),
+  }
+  for coluna in COLUNAS_AGREGADAS:
+    soma = agrupado.column(f"{coluna}_soma_sum")
+    contagem = agrupado.column(f"{coluna}_contagem_sum")
+    colunas[f"{coluna}_soma"] = soma
+    colunas[f"{coluna}_contagem"] = contagem
+    colunas[f"{coluna}_media"] = pc.if_else(
+      pc.greater(contagem, 0), pc.divide(soma, pc.cast(contagem, pa.float64())), None
+    )
+  return pa.table(colunas)
+
+
+def _substituir(atual: Optional[pa.Table], novas: pa.Table, coluna: str, valores: pa.Array, ordem: List[str]) -> pa.Table:
+  """Troca em `atual` as linhas cujo valor de `coluna` está em `valores` pelas `novas`, mantendo a ordenação."""
+  if atual is not None and atual.num_rows:
+    atual = atual.filter(pc.invert(pc.is_in(atual.column(coluna), value_set=valores)))
+    novas = pa.concat_tables([atual, novas.select(atual.column_names)])
+  return novas.sort_by([(nome, "ascending") for nome in ordem])
+
+
+class AgregadosEna:
+  """
+  Agregados diários, semanais e mensais de `COLUNAS_AGREGADAS` por subsistema, bacia e REE,
+  mantidos em memória para o `/agregados`.
+
+  A base são as somas e contagens por (dia, valor da dimensão). Quando chegam linhas novas, os
+  dias delas são substituídos na base e apenas os períodos que contêm esses dias são
+  recalculados; as médias vêm de soma/contagem, então nenhum período é recalculado a partir das
+  linhas originais. Cada tabela fica ordenada por (periodo, chave) e as consultas recortam o
+  intervalo por busca binária, sem varrer os dados.
+
+  Os agregados só cobrem os dias já aplicados (de `primeira_data` a `ultima_data`): períodos que
+  começam antes de `primeira_data` somam apenas parte dos dias e saem marcados com `parcial`.
+  """
+
+  def __init__(self):
+    self._diario: Dict[str, pa.Table] = {}
+    self._tabelas: Dict[Tuple[str, str], pa.Table] = {}
+    self._inicios: Dict[Tuple[str, str], np.ndarray] = {}
+    self.primeira_data: Optional[date] = None
+    self.ultima_data: Optional[date] = None
+    self.atualizado_em: Optional[float] = None
+    self._trava = threading.Lock()
+
+  def atualizar(self, tabela: pa.Table) -> None:
+    """Aplica as linhas novas, recalculando só os períodos afetados por elas."""
+    tabela = padronizar_tabela(tabela)
+    if not tabela.num_rows:
+      return
+    dias_novos = pc.unique(tabela.column(COLUNA_DATA_CONSULTA).cast(pa.date32()))
+    dias_numpy = np.sort(dias_novos.to_numpy(zero_copy_only=False).astype("datetime64[D]"))
+
+    with self._trava:
+      for dimensao in DIMENSOES:
+        if dimensao not in tabela.column_names:
+          continue
+        diario = _substituir(
+          self._diario.get(dimensao), _somar_por_dia(tabela, dimensao), COLUNA_DATA_CONSULTA, dias_novos,
+          [COLUNA_DATA_CONSULTA, COLUNA_CHAVE],
+        )
+        self._diario[dimensao] = diario
+        datas_diario = diario.column(COLUNA_DATA_CONSULTA).to_numpy()
+        for nivel in NIVEIS:
+          periodos = np.unique(inicio_periodo(dias_numpy, nivel))
+          # Só as linhas diárias dentro dos períodos afetados entram no recálculo.
+          inicio = np.searchsorted(datas_diario, periodos[0], side="left")
+          fim = np.searchsorted(datas_diario, _fim_periodo(periodos[-1], nivel), side="right")
+          recalculado = _agregar_periodos(diario.slice(inicio, fim - inicio), nivel, pa.array(periodos))
+          chave = (nivel, dimensao)
+          self._tabelas[chave] = _substituir(
+            self._tabelas.get(chave), recalculado, COLUNA_PERIODO, pa.array(periodos),
+            [COLUNA_PERIODO, COLUNA_CHAVE],
+          )
+          self._inicios[chave] = self._tabelas[chave].column(COLUNA_PERIODO).to_numpy()
+      primeiro_dia, ultimo_dia = dias_numpy[[0, -1]].astype(object)
+      self.primeira_data = min(filter(None, [self.primeira_data, primeiro_dia]))
+      self.ultima_data = max(filter(None, [self.ultima_data, ultimo_dia]))
+      self.atualizado_em = time.time()
+
+  def consultar(
+      self, nivel: str, dimensao: str, data_inicio: date, data_fim: date, chave: Optional[str] = None
+  ) -> List[Dict[str, Any]]:
+    """
+    Períodos que se sobrepõem a [data_inicio, data_fim], opcionalmente de um único valor da
+    dimensão. Cada linha traz `parcial`: se o período começa antes do primeiro dia coberto.
+    """
+    with self._trava:
+      tabela = self._tabelas.get((nivel, dimensao))
+      inicios = self._inicios.get((nivel, dimensao))
+      primeira_data = self.primeira_data
+    if tabela is None:
+      return []
+    primeiro = inicio_periodo(np.array([data_inicio], dtype="datetime64[D]"), nivel)[0]
+    inicio = np.searchsorted(inicios, primeiro, side="left")
+    fim = np.searchsorted(inicios, np.datetime64(data_fim, "D"), side="right")
+    recorte = tabela.slice(inicio, fim - inicio)
+    if chave is not None:
+      recorte = recorte.filter(pc.equal(recorte.column(COLUNA_CHAVE), chave.strip().upper()))
+    recorte = recorte.drop_columns([f"{coluna}_contagem" for coluna in COLUNAS_AGREGADAS])
+    recorte = recorte.append_column(
+      "parcial", pc.less(recorte.column(COLUNA_PERIODO), pa.scalar(primeira_data, pa.date32()))
+    )
+    return recorte.rename_columns(
+      [dimensao if nome == COLUNA_CHAVE else nome for nome in recorte.column_names]
+    ).to_pylist()
+
+  def estado(self) -> Dict[str, Any]:
+    atualizado_em = None
+    if self.atualizado_em is not None:
+      atualizado_em = datetime.fromtimestamp(self.atualizado_em, tz=timezone.utc).isoformat()
+    return {
+      "atualizado_em": atualizado_em,
+      "primeira_data": self.primeira_data,
+      "ultima_data": self.ultima_data,
+      "linhas": {f"{nivel}/{dimensao}": tabela.num_rows for (nivel, dimensao), tabela in self._tabelas.items()},
+    }
+
+
+agregados_ena = AgregadosEna()
+# Os agregados acompanham o índice de séries: cada tabela aplicada a ele (carga inicial,
+# sincronizações e ingestão incremental) também atualiza os períodos afetados.
+indice_series.assinar(agregados_ena.atualizar)
@@ -0,0 +1,283 @@
+import io
+import os
+import threading
+import time
+import warnings
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from consultas import COLUNA_DATA_CONSULTA, gravar_dataset_parquet
+from series import indice_series, padronizar_tabela
+
+# Configurações do pipeline de atributos para os modelos de previsão
+DEFASAGENS_ATRIBUTOS = tuple(int(v) for v in os.getenv("ATRIBUTOS_DEFASAGENS", "1,7,30").split(","))
+JANELAS_ATRIBUTOS = tuple(int(v) for v in os.getenv("ATRIBUTOS_JANELAS", "7,30,90").split(","))
+# Dataset Parquet (year=/month=) onde os atributos são gravados a cada atualização; opcional.
+URI_ATRIBUTOS_PARQUET = os.getenv("ATRIBUTOS_PARQUET_URI")
+
+COLUNAS_ATRIBUTOS = ("ear_total_mwmes", "ear_reservatorio_percentual")
+DIAS_VARIACAO_ANUAL = 365
+
+
+def _defasar(matriz: np.ndarray, dias: int) -> np.ndarray:
+  """Desloca a matriz reservatório × data `dias` colunas para a direita, preenchendo com NaN."""
+  resultado = np.full_like(matriz, np.nan)
+  if dias < matriz.shape[1]:
+    resultado[:, dias:] = matriz[:, :matriz.shape[1] - dias]
+  return resultado
+
+
+def _janela_movel(matriz: np.ndarray, janela: int) -> Tuple[np.ndarray, np.ndarray]:
+  """
+  Média e desvio padrão amostral de `janela` dias para todos os reservatórios de uma vez, por
+  somas acumuladas ao longo das datas. Janelas com algum dia sem dado ficam NaN.
+  """
+  media = np.full_like(matriz, np.nan)
+  desvio = np.full_like(matriz, np.nan)
+  if janela > matriz.shape[1]:
+    return media, desvio
+
+  validos = ~np.isnan(matriz)
+  # Centralizar cada reservatório na própria média evita perda de precisão nas somas de quadrados.
+  with warnings.catch_warnings():
+    # Reservatórios sem nenhuma leitura no recorte: a média é NaN e o aviso é esperado.
+    warnings.simplefilter("ignore", RuntimeWarning)
+    centro = np.nanmean(matriz, axis=1, keepdims=True)
+  centrada = np.where(validos, matriz - np.nan_to_num(centro), 0.0)
+
+  def _somas(valores: np.ndarray) -> np.ndarray:
+    acumulado = np.concatenate([np.zeros((valores.shape[0], 1)), np.cumsum(valores, axis=1)], axis=1)
+    return acumulado[:, janela:] - acumulado[:, :-janela]
+
+  contagem = _somas(validos.astype("float64"))
+  soma = _somas(centrada)
+  soma_quadrados = _somas(centrada * centrada)
+  completas = contagem == janela
+
+  media[:, janela - 1:] = np.where(completas, soma / janela + np.nan_to_num(centro), np.nan)
+  if janela > 1:
+    variancia = np.maximum(soma_quadrados - soma * soma / janela, 0.0) / (janela - 1)
+    desvio[:, janela - 1:] = np.where(completas, np.sqrt(variancia), np.nan)
+  return media, desvio
+
+
+def _anular_sem_historico(atributo: np.ndarray, historico: np.ndarray, dias: int) -> np.ndarray:
+  """Anula as datas com menos de `dias` de histórico na matriz, cujo cálculo olharia antes do início."""
+  return np.where(historico < dias, np.nan, atributo)
+
+
+def atributos_calendario(datas: np.ndarray) -> Dict[str, np.ndarray]:
+  """Ano, mês, dia do ano e dia da semana (0 = segunda-feira) de um array datetime64[D]."""
+  anos = datas.astype("datetime64[Y]")
+  return {
+    "ano": anos.astype("int64") + 1970,
+    "mes": datas.astype("datetime64[M]").astype("int64") % 12 + 1,
+    "dia_ano": (datas - anos.astype("datetime64[D]")).astype("int64") + 1,
+    # 1970-01-01 foi uma quinta-feira.
+    "dia_semana": (datas.astype("int64") + 3) % 7,
+  }
+
+
+class MatrizReservatorios:
+  """
+  Valores diários de `COLUNAS_ATRIBUTOS` em matrizes densas reservatório × data (uma linha por
+  `cod_resplanejamento` ordenado, uma coluna por dia a partir de `data_base`), com NaN onde não
+  há leitura.
+  """
+
+  def __init__(self):
+    self.codigos = np.array([], dtype="int64")
+    self.data_base: Optional[np.datetime64] = None
+    self.valores: Dict[str, np.ndarray] = {coluna: np.empty((0, 0)) for coluna in COLUNAS_ATRIBUTOS}
+
+  @property
+  def num_dias(self) -> int:
+    return next(iter(self.valores.values())).shape[1]
+
+  def datas(self) -> np.ndarray:
+    if self.data_base is None:
+      return np.array([], dtype="datetime64[D]")
+    return self.data_base + np.arange(self.num_dias)
+
+  def _expandir(self, codigos: np.ndarray, primeira: np.datetime64, ultima: np.datetime64) -> None:
+    """Acrescenta linhas para reservatórios novos e colunas para dias fora do intervalo atual."""
+    todos = np.union1d(self.codigos, codigos)
+    inicio = primeira if self.data_base is None else min(self.data_base, primeira)
+    fim = ultima if self.data_base is None else max(self.data_base + self.num_dias - 1, ultima)
+    if len(todos) == len(self.codigos) and self.data_base == inicio and self.num_dias == (fim - inicio).astype(int) + 1:
+      return
+
+    linhas = np.searchsorted(todos, self.codigos)
+    deslocamento = 0 if self.data_base is None else int((self.data_base - inicio).astype(int))
+    for coluna, antiga in self.valores.items():
+      nova = np.full((len(todos), int((fim - inicio).astype(int)) + 1), np.nan)
+      nova[linhas, deslocamento:deslocamento + antiga.shape[1]] = antiga
+      self.valores[coluna] = nova
+    self.codigos = todos
+    self.data_base = inicio
+
+  def inserir(self, tabela: pa.Table) -> Optional[Tuple[date, date]]:
+    """Grava as linhas da tabela nas matrizes e retorna o primeiro e o último dia alterados."""
+    if "cod_resplanejamento" not in tabela.column_names:
+      return None
+    codigos = tabela.column("cod_resplanejamento").to_numpy(zero_copy_only=False)
+    datas = tabela.column(COLUNA_DATA_CONSULTA).cast(pa.date32()).to_numpy().astype("datetime64[D]")
+    validas = ~np.isnan(codigos.astype("float64"))
+    if not validas.any():
+      return None
+    codigos, datas = codigos[validas].astype("int64"), datas[validas]
+
+    self._expandir(np.unique(codigos), datas.min(), datas.max())
+    linhas = np.searchsorted(self.codigos, codigos)
+    colunas = (datas - self.data_base).astype("int64")
+    for coluna in COLUNAS_ATRIBUTOS:
+      if coluna in tabela.column_names:
+        valores = tabela.column(coluna).to_numpy(zero_copy_only=False).astype("float64")[validas]
+        self.valores[coluna][linhas, colunas] = valores
+    return datas.min().astype(date), datas.max().astype(date)
+
+
+class PipelineAtributos:
+  """
+  Atributos para os modelos de previsão, calculados para todos os reservatórios de uma vez sobre
+  a `MatrizReservatorios`: defasagens, médias e desvios móveis, variação anual e calendário.
+  Atributos cujo período de referência começa antes do primeiro dia da matriz (o início da
+  cobertura do índice de séries) saem nulos, em vez de calculados sobre um histórico incompleto.
+
+  Acompanha o índice de séries. Quando chegam dias novos, só a janela final afetada por eles é
+  recalculada (do início do mês do dia mais antigo alterado até o último dia que ainda o usa) e,
+  com ATRIBUTOS_PARQUET_URI definida, gravada sobre as partições mensais correspondentes.
+  """
+
+  def __init__(
+      self, uri: Optional[str] = URI_ATRIBUTOS_PARQUET,
+      defasagens: Tuple[int, ...] = DEFASAGENS_ATRIBUTOS, janelas: Tuple[int, ...] = JANELAS_ATRIBUTOS,
+  ):
+    self.uri = uri
+    self.defasagens = tuple(sorted(set(defasagens)))
+    self.janelas = tuple(sorted(set(janelas)))
+    self.matriz = MatrizReservatorios()
+    self.atualizado_em: Optional[float] = None
+    self.ultimo_recalculo: Optional[Dict[str, Any]] = None
+    self._trava = threading.RLock()
+
+  @property
+  def alcance(self) -> int:
+    """Quantos dias anteriores são necessários para calcular os atributos de um dia."""
+    return max(self.defasagens + tuple(janela - 1 for janela in self.janelas) + (DIAS_VARIACAO_ANUAL,))
+
+  def atualizar(self, tabela: pa.Table) -> None:
+    """Aplica as linhas novas e recalcula (e grava, se configurado) apenas a janela afetada."""
+    tabela = padronizar_tabela(tabela)
+    if not tabela.num_rows:
+      return
+    with self._trava:
+      alterados = self.matriz.inserir(tabela)
+      if alterados is None:
+        return
+      mais_antigo, mais_recente = alterados
+      self.atualizado_em = time.time()
+      ultima = (self.matriz.data_base + self.matriz.num_dias - 1).astype(date)
+      # As partições gravadas são mensais: a janela recalculada cobre meses inteiros.
+      inicio = mais_antigo.replace(day=1)
+      fim = min(ultima, _ultimo_dia_do_mes(mais_recente + timedelta(days=self.alcance)))
+      self.ultimo_recalculo = {"data_inicio": inicio, "data_fim": fim}
+      if self.uri:
+        atributos = self.calcular(inicio, fim)
+        if atributos.num_rows:
+          gravar_dataset_parquet(atributos, self.uri, coluna_data=COLUNA_DATA_CONSULTA)
+
+  def calcular(
+      self, data_inicio: date, data_fim: date, cod_resplanejamento: Optional[int] = None
+  ) -> pa.Table:
+    """
+    Atributos dos dias com leitura em [data_inicio, data_fim], uma linha por (reservatório, dia),
+    ordenadas por reservatório e data. Só as colunas do intervalo mais o `alcance` anterior são lidas.
+    """
+    with self._trava:
+      matriz = self.matriz
+      if matriz.data_base is None:
+        return pa.table({})
+      primeira = max(0, int((np.datetime64(data_inicio, "D") - matriz.data_base).astype(int)) - self.alcance)
+      fim = min(matriz.num_dias, int((np.datetime64(data_fim, "D") - matriz.data_base).astype(int)) + 1)
+      codigos = matriz.codigos
+      linhas = slice(None)
+      if cod_resplanejamento is not None:
+        posicao = np.searchsorted(codigos, cod_resplanejamento)
+        encontrado = posicao < len(codigos) and codigos[posicao] == cod_resplanejamento
+        linhas = slice(posicao, posicao + 1 if encontrado else posicao)
+      codigos = codigos[linhas]
+      valores = {coluna: matriz.valores[coluna][linhas, primeira:max(primeira, fim)] for coluna in COLUNAS_ATRIBUTOS}
+      datas = matriz.data_base + np.arange(primeira, max(primeira, fim))
+    # Dias de histórico na matriz antes de cada data do recorte.
+    historico = np.arange(primeira, max(primeira, fim))
+
+    atributos: Dict[str, np.ndarray] = {}
+    for coluna, valores_coluna in valores.items():
+      atributos[coluna] = valores_coluna
+      for dias in self.defasagens:
+        atributos[f"{coluna}_defasagem_{dias}d"] = _anular_sem_historico(
+          _defasar(valores_coluna, dias), historico, dias
+        )
+      for janela in self.janelas:
+        media, desvio = _janela_movel(valores_coluna, janela)
+        atributos[f"{coluna}_media_{janela}d"] = _anular_sem_historico(media, historico, janela - 1)
+        atributos[f"{coluna}_desvio_{janela}d"] = _anular_sem_historico(desvio, historico, janela - 1)
+      atributos[f"{coluna}_variacao_anual"] = _anular_sem_historico(
+        valores_coluna - _defasar(valores_coluna, DIAS_VARIACAO_ANUAL), historico, DIAS_VARIACAO_ANUAL
+      )
+
+    # Só os dias do intervalo pedido em que o reservatório tem alguma leitura viram linhas.
+    no_intervalo = datas >= np.datetime64(data_inicio, "D")
+    com_leitura = np.zeros((len(codigos), len(datas)), dtype=bool)
+    for coluna in COLUNAS_ATRIBUTOS:
+      com_leitura |= ~np.isnan(valores[coluna])
+    linhas_saida, colunas_saida = np.nonzero(com_leitura & no_intervalo)
+
+    datas_saida = datas[colunas_saida]
+    colunas_tabela = {
+      COLUNA_DATA_CONSULTA: pa.array(datas_saida),
+      "cod_resplanejamento": pa.array(codigos[linhas_saida]),
+    }
+    for nome, valores_calendario in atributos_calendario(datas_saida).items():
+      colunas_tabela[nome] = pa.array(valores_calendario.astype("int16"))
+    for nome, matriz_atributo in atributos.items():
+      colunas_tabela[nome] = pa.array(matriz_atributo[linhas_saida, colunas_saida], from_pandas=True)
+    return pa.table(colunas_tabela)
+
+  def estado(self) -> Dict[str, Any]:
+    atualizado_em = None
+    if self.atualizado_em is not None:
+      atualizado_em = datetime.fromtimestamp(self.atualizado_em, tz=timezone.utc).isoformat()
+    datas = self.matriz.datas()
+    return {
+      "atualizado_em": atualizado_em,
+      "reservatorios": len(self.matriz.codigos),
+      "primeira_data": datas[0].astype(date) if len(datas) else None,
+      "ultima_data": datas[-1].astype(date) if len(datas) else None,
+      "defasagens": list(self.defasagens),
+      "janelas": list(self.janelas),
+      "ultimo_recalculo": self.ultimo_recalculo,
+      "destino_parquet": self.uri,
+    }
+
+
+def _ultimo_dia_do_mes(dia: date) -> date:
+  proximo_mes = (dia.replace(day=28) + timedelta(days=4)).replace(day=1)
+  return proximo_mes - timedelta(days=1)
+
+
+def tabela_para_parquet(tabela: pa.Table) -> bytes:
+  """Serializa a tabela em um arquivo Parquet em memória, para respostas HTTP."""
+  buffer = io.BytesIO()
+  pq.write_table(tabela, buffer)
+  return buffer.getvalue()
+
+
+pipeline_atributos = PipelineAtributos()
+# Assim como os agregados, os atributos recebem cada tabela aplicada ao índice de séries.
+indice_series.assinar(pipeline_atributos.atualizar)
@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+
+# Configurações do cache de resultados por partição
+GRANULARIDADE_CACHE = os.getenv("CACHE_CONSULTA_GRANULARIDADE", "mes")
+MEMORIA_MAXIMA_CACHE_MB = float(os.getenv("CACHE_CONSULTA_MAX_MB", "256"))
+TTL_PARTICAO_RECENTE = float(os.getenv("CACHE_CONSULTA_TTL_RECENTE", "300"))
+TTL_PARTICAO_ANO_CORRENTE = float(os.getenv("CACHE_CONSULTA_TTL_ANO_CORRENTE", "21600"))
+DIAS_PARTICAO_RECENTE = int(os.getenv("CACHE_CONSULTA_DIAS_RECENTES", "7"))
+
+Bloco = Tuple[date, date]
+
+
+def _estimar_bytes(registros: List[Dict[str, Any]]) -> int:
+  """Estimativa barata do espaço ocupado por um bloco, extrapolada a partir do primeiro registro."""
+  if not registros:
+    return sys.getsizeof(registros)
+  amostra = registros[0]
+  bytes_por_registro = sys.getsizeof(amostra) + sum(sys.getsizeof(v) for v in amostra.values())
+  return sys.getsizeof(registros) + bytes_por_registro * len(registros)
+
+
+class CacheParticoes:
+  """
+  Cache LRU em memória de resultados de consulta, dividido em blocos de partições (dia ou mês).
+
+  Cada bloco guarda os registros de um intervalo fechado de datas já ordenados de forma
+  decrescente. Consultas sobrepostas são montadas a partir dos blocos em cache e apenas os
+  blocos ausentes ou expirados precisam ser buscados na origem.
+  """
+
+  def __init__(
+      self,
+      granularidade: str = GRANULARIDADE_CACHE,
+      memoria_maxima_bytes: int = int(MEMORIA_MAXIMA_CACHE_MB * 1024 * 1024),
+  ):
+    if granularidade not in ("dia", "mes"):
+      raise ValueError("A granularidade do cache deve ser 'dia' ou 'mes'.")
+    self.granularidade = granularidade
+    self.memoria_maxima_bytes = memoria_maxima_bytes
+    self._blocos: "OrderedDict[Bloco, Tuple[List[Dict[str, Any]], float, int]]" = OrderedDict()
+    self.memoria_em_uso = 0
+    self.acertos = 0
+    self.falhas = 0
+    self.remocoes = 0
+
+  def blocos_do_intervalo(self, data_inicio: date, data_fim: date) -> List[Bloco]:
+    """Divide o intervalo nos blocos de partição que o cobrem, do mais recente ao mais antigo."""
+    blocos = []
+    atual = data_inicio if self.granularidade == "dia" else data_inicio.replace(day=1)
+    while atual <= data_fim:
+      if self.granularidade == "dia":
+        fim_bloco = atual
+      else:
+        proximo_mes = (atual.replace(day=28) + timedelta(days=4)).replace(day=1)
+        fim_bloco = proximo_mes - timedelta(days=1)
+      blocos.append((atual, fim_bloco))
+      atual = fim_bloco + timedelta(days=1)
+    blocos.reverse()
+    return blocos
+
+  def bloco_da_data(self, dia: date) -> Bloco:
+    """Retorna o bloco de partição ao qual uma data pertence."""
+    if self.granularidade == "dia":
+      return dia, dia
+    return self.blocos_do_intervalo(dia, dia)[0]
+
+  def ttl_do_bloco(self, bloco: Bloco, hoje: Optional[date] = None) -> float:
+    """
+    Partições de anos já encerrados não mudam mais e ficam em cache indefinidamente; as do ano
+    corrente expiram em algumas horas e as dos últimos dias, que ainda recebem carga, em minutos.
+    """
+    hoje = hoje or date.today()
+    if bloco[1].year < hoje.year:
+      return float("inf")
+    if bloco[1] >= hoje - timedelta(days=DIAS_PARTICAO_RECENTE):
+      return TTL_PARTICAO_RECENTE
+    return TTL_PARTICAO_ANO_CORRENTE
+
+  def obter(self, bloco: Bloco) -> Optional[List[Dict[str, Any]]]:
+    """Retorna os registros do bloco se estiverem em cache e válidos, contabilizando acerto/falha."""
+    entrada = self._blocos.get(bloco)
+    if entrada and entrada[1] > time.monotonic():
+      self._blocos.move_to_end(bloco)
+      self.acertos += 1
+      return entrada[0]
+
+    if entrada:
+      self._remover(bloco)
+    self.falhas += 1
+    return None
+
+  def guardar(self, bloco: Bloco, registros: List[Dict[str, Any]]) -> None:
+    """Armazena um bloco e remove os menos usados até respeitar o limite de memória."""
+    if bloco in self._blocos:
+      self._remover(bloco)
+
+    tamanho = _estimar_bytes(registros)
+    if tamanho > self.memoria_maxima_bytes:
+      return
+
+    self._blocos[bloco] = (registros, time.monotonic() + self.ttl_do_bloco(bloco), tamanho)
+    self.memoria_em_uso += tamanho
+    while self.memoria_em_uso > self.memoria_maxima_bytes:
+      self._remover(next(iter(self._blocos)))
+      self.remocoes += 1
+
+  def contem_intervalo(self, data_inicio: date, data_fim: date) -> bool:
+    """Indica, sem alterar contadores nem a ordem LRU, se todo o intervalo já está em cache."""
+    agora = time.monotonic()
+    return all(
+      bloco in self._blocos and self._blocos[bloco][1] > agora
+      for bloco in self.blocos_do_intervalo(data_inicio, data_fim)
+    )
+
+  def invalidar_intervalo(self, data_inicio: date, data_fim: date) -> None:
+    """Descarta os blocos que se sobrepõem ao intervalo, por exemplo após uma nova carga."""
+    for bloco in [b for b in self._blocos if b[0] <= data_fim and b[1] >= data_inicio]:
+      self._remover(bloco)
+
+  def limpar(self) -> None:
+    """Esvazia o cache e zera os contadores."""
+    self._blocos.clear()
+    self.memoria_em_uso = 0
+    self.acertos = 0
+    self.falhas = 0
+    self.remocoes = 0
+
+  def estatisticas(self) -> Dict[str, Any]:
+    """Resumo do estado do cache para monitoramento."""
+    return {
+      "granularidade": self.granularidade,
+      "blocos": len(self._blocos),
+      "memoria_em_uso_bytes": self.memoria_em_uso,
+      "memoria_maxima_bytes": self.memoria_maxima_bytes,
+      "acertos": self.acertos,
+      "falhas": self.falhas,
+      "remocoes": self.remocoes,
+    }
+
+  def _remover(self, bloco: Bloco) -> None:
+    _, _, tamanho = self._blocos.pop(bloco)
+    self.memoria_em_uso -= tamanho
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from datetime import date, datetime, timezone
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+
+import service
+
+# Configurações do catálogo de recursos da ONS
+TTL_CATALOGO = float(os.getenv("ONS_CATALOGO_TTL", "3600"))
+INTERVALO_ATUALIZACAO_CATALOGO = float(os.getenv("ONS_CATALOGO_INTERVALO_ATUALIZACAO", "1800"))
+INTERVALO_NOVA_TENTATIVA_CATALOGO = float(os.getenv("ONS_CATALOGO_INTERVALO_NOVA_TENTATIVA", "60"))
+
+
+class CatalogoONS:
+  """
+  Mantém em memória o índice ano -> melhor recurso do pacote da ONS.
+
+  Apenas a primeira carga bloqueia quem pede o índice. Depois disso a cópia em memória é sempre
+  servida imediatamente; quando passa do TTL, uma atualização é disparada em segundo plano e, se
+  a ONS estiver lenta ou fora do ar, a cópia anterior continua valendo.
+  """
+
+  def __init__(
+      self,
+      buscar_recursos: Callable[[], Awaitable[List[Dict[str, Any]]]] = service.obter_recursos_ons,
+      ttl: float = TTL_CATALOGO,
+  ):
+    self._buscar_recursos = buscar_recursos
+    self.ttl = ttl
+    self.indice: Optional[Dict[int, Dict[str, Any]]] = None
+    self.total_recursos = 0
+    self.atualizado_em: Optional[float] = None
+    self.ultimo_erro: Optional[str] = None
+    self._tarefa_atualizacao: Optional[asyncio.Task] = None
+    self._trava_primeira_carga = asyncio.Lock()
+
+  def expirado(self) -> bool:
+    """Indica se o índice passou do TTL (ou nunca foi carregado)."""
+    return self.atualizado_em is None or time.time() - self.atualizado_em > self.ttl
+
+  async def atualizar(self) -> bool:
+    """Busca o pacote na ONS e troca o índice. Em caso de falha mantém a cópia anterior."""
+    try:
+      recursos = await self._buscar_recursos()
+    except Exception as e:
+      recursos = []
+      self.ultimo_erro = str(e)
+    if not recursos:
+      self.ultimo_erro = self.ultimo_erro or "A ONS não retornou nenhum recurso."
+      print(f"Não foi possível atualizar o catálogo da ONS; mantendo a cópia anterior. ({self.ultimo_erro})")
+      return False
+
+    self.indice = service.indexar_recursos_por_ano(recursos)
+    self.total_recursos = len(recursos)
+    self.atualizado_em = time.time()
+    self.ultimo_erro = None
+    print(f"Catálogo da ONS atualizado: {len(self.indice)} anos disponíveis.")
+    return True
+
+  def agendar_atualizacao(self) -> None:
+    """Dispara uma atualização em segundo plano, se ainda não houver uma em andamento."""
+    if self._tarefa_atualizacao is None or self._tarefa_atualizacao.done():
+      self._tarefa_atualizacao = asyncio.create_task(self.atualizar())
+
+  async def obter_indice(self) -> Dict[int, Dict[str, Any]]:
+    """Retorna o índice atual, carregando-o na primeira chamada."""
+    if self.indice is None:
+      async with self._trava_primeira_carga:
+        if self.indice is None:
+          await self.atualizar()
+    elif self.expirado():
+      self.agendar_atualizacao()
+    return self.indice or {}
+
+  async def recursos_para_intervalo(self, data_inicio: date, data_fim: date) -> List[Dict[str, Any]]:
+    """Retorna os recursos que cobrem o intervalo, sem acessar a rede quando o índice está carregado."""
+    return service.selecionar_recursos_do_intervalo(await self.obter_indice(), data_inicio, data_fim)
+
+  async def manter_atualizado(self, intervalo: float = INTERVALO_ATUALIZACAO_CATALOGO) -> None:
+    """Laço de atualização periódica, executado durante toda a vida da aplicação."""
+    while True:
+      sucesso = await self.atualizar()
+      await asyncio.sleep(intervalo if sucesso else INTERVALO_NOVA_TENTATIVA_CATALOGO)
+
+  def estado(self) -> Dict[str, Any]:
+    """Resumo do catálogo em memória para o endpoint /catalogo."""
+    atualizado_em = None
+    idade_segundos = None
+    if self.atualizado_em is not None:
+      atualizado_em = datetime.fromtimestamp(self.atualizado_em, tz=timezone.utc).isoformat()
+      idade_segundos = round(time.time() - self.atualizado_em, 1)
+
+    return {
+      "carregado": self.indice is not None,
+      "atualizado_em": atualizado_em,
+      "idade_segundos": idade_segundos,
+      "ttl_segundos": self.ttl,
+      "expirado": self.expirado(),
+      "atualizando": self._tarefa_atualizacao is not None and not self._tarefa_atualizacao.done(),
+      "ultimo_erro": self.ultimo_erro,
+      "total_recursos": self.total_recursos,
+      "anos": {
+        ano: {
+          "id": recurso.get("id"),
+          "nome": recurso.get("name"),
+          "formato": recurso.get("format"),
+          "url": recurso.get("url"),
+          "ultima_modificacao": recurso.get("last_modified"),
+        }
+        for ano, recurso in sorted((self.indice or {}).items())
+      },
+    }
+
+
+catalogo_ons = CatalogoONS()
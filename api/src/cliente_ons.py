@@ -0,0 +1,121 @@
+import asyncio
+import os
+import random
+from typing import Dict, Any, Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from downloads import CacheArquivosONS
+
+# Configurações do cliente HTTP compartilhado com a ONS
+MAXIMO_CONEXOES_ONS = int(os.getenv("ONS_MAX_CONEXOES", "8"))
+DOWNLOADS_SIMULTANEOS_ONS = int(os.getenv("ONS_DOWNLOADS_SIMULTANEOS", "4"))
+TENTATIVAS_ONS = int(os.getenv("ONS_TENTATIVAS", "4"))
+ESPERA_INICIAL_ONS = float(os.getenv("ONS_ESPERA_INICIAL", "1"))
+TIMEOUT_CONEXAO_ONS = float(os.getenv("ONS_TIMEOUT_CONEXAO", "10"))
+TIMEOUT_LEITURA_ONS = float(os.getenv("ONS_TIMEOUT_LEITURA", "60"))
+# Prazo total de um recurso (download com todas as tentativas), em segundos.
+TIMEOUT_RECURSO_ONS = float(os.getenv("ONS_TIMEOUT_RECURSO", "600"))
+
+# Respostas que indicam uma falha passageira do lado da ONS (ou de um proxy no caminho).
+STATUS_TRANSITORIOS = {408, 425, 429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+def erro_transitorio(erro: Exception) -> bool:
+  """Falhas de rede e respostas 408/429/5xx valem uma nova tentativa; as demais, não."""
+  if isinstance(erro, httpx.HTTPStatusError):
+    return erro.response.status_code in STATUS_TRANSITORIOS
+  return isinstance(erro, httpx.TransportError)
+
+
+class ClienteONS:
+  """
+  Cliente HTTP da ONS compartilhado por toda a aplicação: um único `httpx.AsyncClient` com pool
+  de conexões (aberto e fechado no lifespan do FastAPI), no máximo DOWNLOADS_SIMULTANEOS_ONS
+  downloads em andamento e novas tentativas com espera exponencial para falhas transitórias.
+  """
+
+  def __init__(
+      self,
+      maximo_conexoes: int = MAXIMO_CONEXOES_ONS,
+      downloads_simultaneos: int = DOWNLOADS_SIMULTANEOS_ONS,
+      tentativas: int = TENTATIVAS_ONS,
+      espera_inicial: float = ESPERA_INICIAL_ONS,
+      timeout_recurso: float = TIMEOUT_RECURSO_ONS,
+      transporte: Optional[httpx.AsyncBaseTransport] = None,
+  ):
+    self.maximo_conexoes = maximo_conexoes
+    self.downloads_simultaneos = downloads_simultaneos
+    self.tentativas = tentativas
+    self.espera_inicial = espera_inicial
+    self.timeout_recurso = timeout_recurso
+    self._transporte = transporte
+    self._client: Optional[httpx.AsyncClient] = None
+    self._semaforo: Optional[asyncio.Semaphore] = None
+
+  @property
+  def client(self) -> httpx.AsyncClient:
+    """O cliente compartilhado; aberto sob demanda se o lifespan não o abriu (scripts e testes)."""
+    if self._client is None or self._client.is_closed:
+      self.abrir()
+    return self._client
+
+  def abrir(self) -> None:
+    self._client = httpx.AsyncClient(
+      limits=httpx.Limits(max_connections=self.maximo_conexoes, max_keepalive_connections=self.maximo_conexoes),
+      timeout=httpx.Timeout(TIMEOUT_LEITURA_ONS, connect=TIMEOUT_CONEXAO_ONS),
+      follow_redirects=True,
+      transport=self._transporte,
+    )
+
+  async def fechar(self) -> None:
+    if self._client is not None:
+      await self._client.aclose()
+      self._client = None
+    self._semaforo = None
+
+  @property
+  def semaforo(self) -> asyncio.Semaphore:
+    if self._semaforo is None:
+      self._semaforo = asyncio.Semaphore(self.downloads_simultaneos)
+    return self._semaforo
+
+  async def com_tentativas(self, operacao: Callable[[], Awaitable[T]], descricao: str) -> T:
+    """Executa `operacao`, repetindo-a em falhas transitórias com espera exponencial e jitter."""
+    for tentativa in range(1, self.tentativas + 1):
+      try:
+        return await operacao()
+      except httpx.HTTPError as e:
+        if tentativa == self.tentativas or not erro_transitorio(e):
+          raise
+        espera = self.espera_inicial * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5)
+        print(f"  -> Falha transitória em {descricao} ({e}); nova tentativa em {espera:.1f}s.")
+        await asyncio.sleep(espera)
+    raise RuntimeError("número de tentativas deve ser positivo")
+
+  async def obter_json(self, url: str) -> Dict[str, Any]:
+    async def requisitar():
+      response = await self.client.get(url)
+      response.raise_for_status()
+      return response.json()
+
+    return await self.com_tentativas(requisitar, url)
+
+  async def baixar(self, recurso: Dict[str, Any], url_download: str, cache: CacheArquivosONS) -> str:
+    """
+    Garante o arquivo do recurso no cache local, transmitido direto para o disco, e retorna o
+    caminho. Espera uma vaga entre os downloads simultâneos; o prazo de TIMEOUT_RECURSO_ONS conta
+    a partir daí e cobre todas as tentativas.
+    """
+    async with self.semaforo:
+      return await asyncio.wait_for(
+        self.com_tentativas(
+          lambda: cache.obter_arquivo(recurso, url_download, self.client), recurso.get("name") or url_download
+        ),
+        timeout=self.timeout_recurso,
+      )
+
+
+cliente_ons = ClienteONS()
@@ -0,0 +1,333 @@
+import os
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Iterator, Optional, Tuple
+
+import fsspec
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from esquema import COLUNA_DATA_ONS, ESQUEMA_ENA_CONSOLIDADO
+from leitura import filtro_de_datas
+from metricas import BYTES_PROCESSADOS_BIGQUERY, etapa
+
+if TYPE_CHECKING:
+  import pyarrow.dataset as ds
+  from google.cloud import bigquery
+
+# Configurações do backend usado pelo /consultar
+BACKEND_CONSULTA = os.getenv("CONSULTA_BACKEND", "bigquery")
+URI_DATASET_PARQUET = os.getenv("CONSULTA_PARQUET_URI")
+
+# Nome da coluna de data nos registros devolvidos pela API. Na tabela do BigQuery (e nos
+# arquivos da ONS) a coluna é `ear_data`; as consultas a devolvem com este nome.
+COLUNA_DATA_CONSULTA = "ena_data"
+
+# Colunas lidas da tabela `ena_consolidado`, com a de data renomeada para o nome da API.
+SELECAO_BIGQUERY = ",\n      ".join(
+  f"{nome} AS {COLUNA_DATA_CONSULTA}" if nome == COLUNA_DATA_ONS else nome
+  for nome, _, _ in ESQUEMA_ENA_CONSOLIDADO
+)
+
+# Colunas que podem ser usadas como filtro de igualdade, além do intervalo de datas.
+COLUNAS_FILTRAVEIS = ("cod_resplanejamento", "nom_subsistema")
+
+COLUNAS_PARTICAO = ("year", "month")
+ESQUEMA_PARTICAO = pa.schema([("year", pa.int16()), ("month", pa.int8())])
+
+
+class BackendConsulta(ABC):
+  """
+  Interface das origens de dados do /consultar.
+
+  Todos os métodos são síncronos (o serviço os executa em threads) e devolvem os registros em
+  ordem decrescente de (ena_data, cod_resplanejamento). `filtros` mapeia colunas de
+  COLUNAS_FILTRAVEIS para o valor exigido; `posicao` é um cursor decodificado.
+  """
+
+  nome = ""
+
+  @abstractmethod
+  def disponivel(self) -> bool:
+    ...
+
+  @abstractmethod
+  def consultar_intervalo(
+      self, data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]] = None
+  ) -> List[Dict[str, Any]]:
+    ...
+
+  @abstractmethod
+  def contar(self, data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]] = None) -> int:
+    ...
+
+  @abstractmethod
+  def consultar_tabela(
+      self, data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]] = None
+  ) -> pa.Table:
+    """O intervalo inteiro como tabela Arrow, com a coluna de data já chamada `ena_data`."""
+    ...
+
+  @abstractmethod
+  def consultar_pagina(
+      self,
+      data_inicio: date,
+      data_fim: date,
+      limite: int,
+      deslocamento: int,
+      posicao: Optional[Dict[str, Any]] = None,
+      filtros: Optional[Dict[str, Any]] = None,
+  ) -> List[Dict[str, Any]]:
+    ...
+
+  @abstractmethod
+  def iterar_lotes(
+      self, data_inicio: date, data_fim: date, tamanho_lote: int, filtros: Optional[Dict[str, Any]] = None
+  ) -> Iterator[List[Dict[str, Any]]]:
+    ...
+
+
+def _parametro(nome: str, tipo: str, valor: Any) -> "bigquery.ScalarQueryParameter":
+  # A biblioteca do BigQuery só é importada quando o backend é usado, não na subida da API.
+  from google.cloud import bigquery
+  return bigquery.ScalarQueryParameter(nome, tipo, valor)
+
+
+class BackendBigQuery(BackendConsulta):
+  """Consulta a tabela `ena_consolidado` no BigQuery, com um job por chamada."""
+
+  nome = "bigquery"
+
+  def __init__(self, obter_cliente: Callable[[], Any], obter_tabela: Callable[[], str]):
+    # O cliente e o nome da tabela são lidos a cada chamada, para que possam ser substituídos.
+    self._obter_cliente = obter_cliente
+    self._obter_tabela = obter_tabela
+
+  def disponivel(self) -> bool:
+    return self._obter_cliente() is not None
+
+  def _condicoes(
+      self, data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]]
+  ) -> Tuple[str, List["bigquery.ScalarQueryParameter"]]:
+    condicoes = ""
+    parametros = [
+      _parametro("data_inicio", "DATE", data_inicio),
+      _parametro("data_fim", "DATE", data_fim),
+    ]
+    for coluna, valor in sorted((filtros or {}).items()):
+      condicoes += f"\n      AND {coluna} = @{coluna}"
+      tipo = "INT64" if isinstance(valor, int) else "STRING"
+      parametros.append(_parametro(coluna, tipo, valor))
+    return condicoes, parametros
+
+  def _executar(self, query: str, parametros: List["bigquery.ScalarQueryParameter"], **opcoes: Any):
+    from google.cloud import bigquery
+    job_config = bigquery.QueryJobConfig(query_parameters=parametros)
+    with etapa("bigquery") as registro:
+      job = self._obter_cliente().query(query, job_config=job_config)
+      resultado = job.result(**opcoes)
+      bytes_processados = getattr(job, "total_bytes_processed", None)
+      if isinstance(bytes_processados, int):
+        registro["bytes_processados"] = bytes_processados
+        BYTES_PROCESSADOS_BIGQUERY.incrementar(bytes_processados)
+    return resultado
+
+  def _consulta_ordenada(self, condicoes: str, sufixo: str = "") -> str:
+    # Filtros e ordenação sobre `ear_data`, a coluna de partição: o BigQuery só lê as partições
+    # do intervalo.
+    return f"""
+    SELECT
+      {SELECAO_BIGQUERY}
+    FROM
+      `{self._obter_tabela()}`
+    WHERE
+      ear_data >= @data_inicio
+      AND ear_data <= @data_fim{condicoes}
+    ORDER BY
+      ear_data DESC,
+      cod_resplanejamento DESC{sufixo}
+    """
+
+  def consultar_intervalo(self, data_inicio, data_fim, filtros=None):
+    print(f"Executando a consulta no BigQuery no intervalo de {data_inicio} a {data_fim}...")
+    condicoes, parametros = self._condicoes(data_inicio, data_fim, filtros)
+    resultados = [dict(row) for row in self._executar(self._consulta_ordenada(condicoes), parametros)]
+    print(f"Consulta concluída. {len(resultados)} registros encontrados.")
+    return resultados
+
+  def consultar_tabela(self, data_inicio, data_fim, filtros=None):
+    condicoes, parametros = self._condicoes(data_inicio, data_fim, filtros)
+    return self._executar(self._consulta_ordenada(condicoes), parametros).to_arrow()
+
+  def contar(self, data_inicio, data_fim, filtros=None):
+    condicoes, parametros = self._condicoes(data_inicio, data_fim, filtros)
+    query = f"""
+    SELECT
+      COUNT(*) AS total
+    FROM
+      `{self._obter_tabela()}`
+    WHERE
+      ear_data >= @data_inicio
+      AND ear_data <= @data_fim{condicoes}
+    """
+    linhas = list(self._executar(query, parametros))
+    return int(linhas[0]["total"]) if linhas else 0
+
+  def consultar_pagina(self, data_inicio, data_fim, limite, deslocamento, posicao=None, filtros=None):
+    condicoes, parametros = self._condicoes(data_inicio, data_fim, filtros)
+    if posicao:
+      condicoes += """
+      AND (
+        ear_data < @cursor_data
+        OR (ear_data = @cursor_data AND cod_resplanejamento < @cursor_cod)
+      )"""
+      parametros += [
+        _parametro("cursor_data", "DATE", posicao["ena_data"]),
+        _parametro("cursor_cod", "INT64", posicao["cod_resplanejamento"]),
+      ]
+    # LIMIT e OFFSET são inteiros já validados pelo endpoint.
+    query = self._consulta_ordenada(condicoes, f"\n    LIMIT {int(limite)} OFFSET {int(deslocamento)}")
+    return [dict(row) for row in self._executar(query, parametros)]
+
+  def iterar_lotes(self, data_inicio, data_fim, tamanho_lote, filtros=None):
+    print(f"Transmitindo a consulta no BigQuery no intervalo de {data_inicio} a {data_fim}...")
+    condicoes, parametros = self._condicoes(data_inicio, data_fim, filtros)
+    linhas = self._executar(self._consulta_ordenada(condicoes), parametros, page_size=tamanho_lote)
+    for pagina in linhas.pages:
+      yield [dict(row) for row in pagina]
+
+
+def _meses_do_intervalo(data_inicio: date, data_fim: date) -> List[Tuple[int, int]]:
+  """(ano, mês) de cada partição mensal do intervalo, do mais recente ao mais antigo."""
+  meses = []
+  ano, mes = data_fim.year, data_fim.month
+  while (ano, mes) >= (data_inicio.year, data_inicio.month):
+    meses.append((ano, mes))
+    ano, mes = (ano, mes - 1) if mes > 1 else (ano - 1, 12)
+  return meses
+
+
+class BackendParquet(BackendConsulta):
+  """
+  Consulta um dataset Parquet local ou no GCS particionado no formato Hive `year=/month=`
+  (a camada silver), sem depender do BigQuery.
+
+  Os filtros de ano/mês descartam partições inteiras antes de qualquer leitura; os de
+  `ear_data`, `cod_resplanejamento` e `nom_subsistema` são empurrados para o leitor, que pula
+  row groups pelas estatísticas e só decodifica as linhas necessárias.
+  """
+
+  nome = "parquet"
+
+  def __init__(self, uri: Optional[str] = URI_DATASET_PARQUET):
+    self.uri = uri
+    self._dataset: Optional["ds.Dataset"] = None
+
+  def disponivel(self) -> bool:
+    return bool(self.uri)
+
+  @property
+  def dataset(self) -> "ds.Dataset":
+    if self._dataset is None:
+      # O pyarrow.dataset importa o pandas junto: fica para o primeiro uso do backend.
+      import pyarrow.dataset as ds
+      sistema_arquivos, caminho = fsspec.core.url_to_fs(self.uri)
+      self._dataset = ds.dataset(
+        caminho, filesystem=sistema_arquivos, format="parquet",
+        partitioning=ds.partitioning(ESQUEMA_PARTICAO, flavor="hive"),
+      )
+    return self._dataset
+
+  def recarregar(self) -> None:
+    """Descarta a lista de arquivos em memória, para enxergar partições gravadas depois."""
+    self._dataset = None
+
+  def _filtro(
+      self, data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]], posicao=None
+  ) -> pc.Expression:
+    ano, mes = pc.field("year"), pc.field("month")
+    filtro = (
+      ((ano > data_inicio.year) | ((ano == data_inicio.year) & (mes >= data_inicio.month)))
+      & ((ano < data_fim.year) | ((ano == data_fim.year) & (mes <= data_fim.month)))
+    )
+    filtro_datas = filtro_de_datas(self.dataset.schema.field(COLUNA_DATA_ONS).type, data_inicio, data_fim)
+    if filtro_datas is not None:
+      filtro &= filtro_datas
+    for coluna, valor in (filtros or {}).items():
+      filtro &= pc.field(coluna) == valor
+    if posicao:
+      data, cod = pc.field(COLUNA_DATA_ONS), pc.field("cod_resplanejamento")
+      filtro &= (data < posicao["ena_data"]) | ((data == posicao["ena_data"]) & (cod < posicao["cod_resplanejamento"]))
+    return filtro
+
+  def _colunas(self) -> List[str]:
+    return [nome for nome in self.dataset.schema.names if nome not in COLUNAS_PARTICAO]
+
+  def _ler(self, filtro: pc.Expression, limite: Optional[int] = None) -> pa.Table:
+    with etapa("parquet") as registro:
+      tabela = self.dataset.to_table(columns=self._colunas(), filter=filtro)
+      registro["linhas"] = tabela.num_rows
+    ordenacao = [(COLUNA_DATA_ONS, "descending"), ("cod_resplanejamento", "descending")]
+    if limite is not None and limite < tabela.num_rows:
+      # Só as `limite` primeiras linhas da ordenação são necessárias; evita ordenar o resto.
+      tabela = tabela.take(pc.select_k_unstable(tabela, k=limite, sort_keys=ordenacao))
+    return tabela.sort_by(ordenacao)
+
+  def _renomear(self, tabela: pa.Table) -> pa.Table:
+    nomes = [COLUNA_DATA_CONSULTA if nome == COLUNA_DATA_ONS else nome for nome in tabela.column_names]
+    return tabela.rename_columns(nomes)
+
+  def _registros(self, tabela: pa.Table) -> List[Dict[str, Any]]:
+    return self._renomear(tabela).to_pylist()
+
+  def consultar_tabela(self, data_inicio, data_fim, filtros=None):
+    return self._renomear(self._ler(self._filtro(data_inicio, data_fim, filtros)))
+
+  def consultar_intervalo(self, data_inicio, data_fim, filtros=None):
+    return self._registros(self._ler(self._filtro(data_inicio, data_fim, filtros)))
+
+  def contar(self, data_inicio, data_fim, filtros=None):
+    return self.dataset.count_rows(filter=self._filtro(data_inicio, data_fim, filtros))
+
+  def consultar_pagina(self, data_inicio, data_fim, limite, deslocamento, posicao=None, filtros=None):
+    tabela = self._ler(self._filtro(data_inicio, data_fim, filtros, posicao), limite=deslocamento + limite)
+    return self._registros(tabela.slice(deslocamento, limite))
+
+  def iterar_lotes(self, data_inicio, data_fim, tamanho_lote, filtros=None):
+    # Uma partição mensal por vez, da mais recente para a mais antiga, mantém a ordenação
+    # global sem carregar o intervalo inteiro em memória.
+    for ano, mes in _meses_do_intervalo(data_inicio, data_fim):
+      filtro = self._filtro(data_inicio, data_fim, filtros) & (pc.field("year") == ano) & (pc.field("month") == mes)
+      tabela = self._ler(filtro)
+      for indice in range(0, tabela.num_rows, tamanho_lote):
+        yield self._registros(tabela.slice(indice, tamanho_lote))
+
+
+def gravar_dataset_parquet(tabela: pa.Table, uri: str, coluna_data: str = COLUNA_DATA_ONS) -> None:
+  """
+  Grava uma tabela normalizada no layout lido por `BackendParquet` (`year=/month=`), particionada
+  pelos valores de `coluna_data`. As partições mensais presentes na tabela são substituídas por inteiro.
+  """
+  datas = tabela.column(coluna_data)
+  tabela = tabela.append_column("year", pc.year(datas).cast(pa.int16()))
+  tabela = tabela.append_column("month", pc.month(datas).cast(pa.int8()))
+  import pyarrow.dataset as ds
+  sistema_arquivos, caminho = fsspec.core.url_to_fs(uri)
+  ds.write_dataset(
+    tabela, caminho, filesystem=sistema_arquivos, format="parquet",
+    partitioning=ds.partitioning(ESQUEMA_PARTICAO, flavor="hive"),
+    existing_data_behavior="delete_matching",
+  )
+
+
+def criar_backend_consulta(
+    tipo: str = BACKEND_CONSULTA,
+    obter_cliente: Optional[Callable[[], Any]] = None,
+    obter_tabela: Optional[Callable[[], str]] = None,
+) -> BackendConsulta:
+  """Cria o backend configurado em CONSULTA_BACKEND ("bigquery" ou "parquet")."""
+  if tipo == "parquet":
+    return BackendParquet()
+  if tipo == "bigquery":
+    return BackendBigQuery(obter_cliente, obter_tabela)
+  raise ValueError(f"Backend de consulta desconhecido: {tipo}. Use 'bigquery' ou 'parquet'.")
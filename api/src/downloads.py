@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from typing import Dict, Any, Optional
+
+import httpx
+
+from metricas import BYTES_BAIXADOS_ONS, anotar
+
+# Configurações do cache local de arquivos da ONS
+DIRETORIO_CACHE_ONS = os.getenv("ONS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ons_cache"))
+TAMANHO_MAXIMO_CACHE_ONS_MB = float(os.getenv("ONS_CACHE_MAX_MB", "2048"))
+TAMANHO_BLOCO_DOWNLOAD = 1024 * 1024
+# Os acessos a arquivos já em cache só atualizam o índice em memória; ele é gravado em disco no
+# máximo uma vez por intervalo, a cada download novo e no encerramento da aplicação.
+INTERVALO_GRAVACAO_ACESSOS = float(os.getenv("ONS_CACHE_INTERVALO_GRAVACAO_ACESSOS", "300"))
+
+
+class CacheArquivosONS:
+  """
+  Cache em disco dos arquivos anuais da ONS, indexado pelo id do recurso.
+
+  Arquivos de anos já encerrados são servidos direto do disco. Os demais são revalidados com
+  ETag/Last-Modified: uma resposta 304 reaproveita o arquivo local e qualquer outra é gravada em
+  disco em blocos, sem carregar o conteúdo inteiro em memória. Quando o limite de tamanho é
+  ultrapassado, os arquivos acessados há mais tempo são removidos.
+
+  Toda escrita em disco (blocos, troca do arquivo e índice) roda em threads, fora do event loop.
+  Os horários de acesso são gravados em lote (ver INTERVALO_GRAVACAO_ACESSOS e `persistir`).
+  """
+
+  def __init__(
+      self,
+      diretorio: str = DIRETORIO_CACHE_ONS,
+      tamanho_maximo_bytes: int = int(TAMANHO_MAXIMO_CACHE_ONS_MB * 1024 * 1024),
+  ):
+    self.diretorio = diretorio
+    self.tamanho_maximo_bytes = tamanho_maximo_bytes
+    self._caminho_indice = os.path.join(diretorio, "indice.json")
+    self._trava = threading.Lock()
+    os.makedirs(diretorio, exist_ok=True)
+    self._indice: Dict[str, Dict[str, Any]] = self._ler_indice()
+    self._acessos_pendentes = False
+    self._gravado_em = time.monotonic()
+
+  async def obter_arquivo(self, recurso: Dict[str, Any], url_download: str, client: httpx.AsyncClient) -> str:
+    """Garante que o arquivo do recurso esteja atualizado no disco e retorna o seu caminho."""
+    id_recurso = recurso["id"]
+    entrada = self._entrada_valida(id_recurso)
+    ano_recurso = recurso.get("ano")
+
+    if entrada and ano_recurso and ano_recurso < date.today().year:
+      caminho = await self._registrar_acesso(id_recurso)
+      if caminho:
+        print(f"  -> Usando cópia local de {recurso.get('name')} (ano encerrado).")
+        anotar(origem="cache")
+        return caminho
+      # A entrada foi removida por um download concorrente: baixa de novo.
+      entrada = None
+
+    cabecalhos = {}
+    if entrada and entrada.get("etag"):
+      cabecalhos["If-None-Match"] = entrada["etag"]
+    if entrada and entrada.get("last_modified"):
+      cabecalhos["If-Modified-Since"] = entrada["last_modified"]
+
+    async with client.stream("GET", url_download, headers=cabecalhos, follow_redirects=True) as response:
+      if entrada and response.status_code == httpx.codes.NOT_MODIFIED:
+        caminho = await self._registrar_acesso(id_recurso)
+        if caminho:
+          print(f"  -> {recurso.get('name')} não mudou desde o último download (304).")
+          anotar(origem="304")
+          return caminho
+      else:
+        response.raise_for_status()
+        return await self._gravar(id_recurso, recurso, response)
+
+    # O 304 chegou depois que a entrada foi removida do cache: baixa sem cabeçalhos condicionais.
+    async with client.stream("GET", url_download, follow_redirects=True) as response:
+      response.raise_for_status()
+      return await self._gravar(id_recurso, recurso, response)
+
+  def persistir(self) -> None:
+    """Grava o índice se houver acessos ainda não gravados (chamado no encerramento da aplicação)."""
+    with self._trava:
+      if self._acessos_pendentes:
+        self._salvar_indice()
+
+  def tamanho_total(self) -> int:
+    """Soma dos tamanhos dos arquivos em cache, em bytes."""
+    with self._trava:
+      return sum(entrada["tamanho"] for entrada in self._indice.values())
+
+  async def _gravar(self, id_recurso: str, recurso: Dict[str, Any], response: httpx.Response) -> str:
+    extensao = recurso.get("format", "").lower() or "bin"
+    caminho_final = os.path.join(self.diretorio, f"{id_recurso}.{extensao}")
+    descritor, caminho_temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".parcial")
+    try:
+      with os.fdopen(descritor, "wb") as arquivo:
+        async for bloco in response.aiter_bytes(TAMANHO_BLOCO_DOWNLOAD):
+          await asyncio.to_thread(arquivo.write, bloco)
+      # A troca é atômica: leitores concorrentes nunca veem um arquivo pela metade.
+      await asyncio.to_thread(os.replace, caminho_temporario, caminho_final)
+    except BaseException:
+      if os.path.exists(caminho_temporario):
+        os.remove(caminho_temporario)
+      raise
+
+    entrada = {
+      "arquivo": caminho_final,
+      "etag": response.headers.get("etag"),
+      "last_modified": response.headers.get("last-modified"),
+      "tamanho": os.path.getsize(caminho_final),
+      "ultimo_acesso": time.time(),
+    }
+    BYTES_BAIXADOS_ONS.incrementar(entrada["tamanho"])
+    anotar(origem="download", bytes=entrada["tamanho"])
+    await asyncio.to_thread(self._registrar_download, id_recurso, entrada)
+    return caminho_final
+
+  def _registrar_download(self, id_recurso: str, entrada: Dict[str, Any]) -> None:
+    with self._trava:
+      self._indice[id_recurso] = entrada
+      self._remover_excedentes(preservar=id_recurso)
+      self._salvar_indice()
+
+  def _entrada_valida(self, id_recurso: str) -> Optional[Dict[str, Any]]:
+    with self._trava:
+      entrada = self._indice.get(id_recurso)
+      if entrada and not os.path.exists(entrada["arquivo"]):
+        del self._indice[id_recurso]
+        return None
+      return entrada
+
+  async def _registrar_acesso(self, id_recurso: str) -> Optional[str]:
+    """
+    Atualiza o último acesso em memória; o índice só é gravado quando o intervalo venceu.
+
+    Retorna None se a entrada saiu do índice (removida pelo limite de tamanho durante um
+    download concorrente), caso em que o arquivo precisa ser baixado de novo.
+    """
+    with self._trava:
+      entrada = self._indice.get(id_recurso)
+      if entrada is None or not os.path.exists(entrada["arquivo"]):
+        return None
+      entrada["ultimo_acesso"] = time.time()
+      self._acessos_pendentes = True
+      gravar = time.monotonic() - self._gravado_em >= INTERVALO_GRAVACAO_ACESSOS
+    if gravar:
+      await asyncio.to_thread(self.persistir)
+    return entrada["arquivo"]
+
+  def _remover_excedentes(self, preservar: str) -> None:
+    total = sum(entrada["tamanho"] for entrada in self._indice.values())
+    candidatos = sorted(
+      (id_recurso for id_recurso in self._indice if id_recurso != preservar),
+      key=lambda id_recurso: self._indice[id_recurso]["ultimo_acesso"],
+    )
+    for id_recurso in candidatos:
+      if total <= self.tamanho_maximo_bytes:
+        break
+      entrada = self._indice.pop(id_recurso)
+      total -= entrada["tamanho"]
+      if os.path.exists(entrada["arquivo"]):
+        os.remove(entrada["arquivo"])
+      print(f"  -> Cache ONS cheio: removido {os.path.basename(entrada['arquivo'])}.")
+
+  def _ler_indice(self) -> Dict[str, Dict[str, Any]]:
+    try:
+      with open(self._caminho_indice, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+    except (OSError, ValueError):
+      return {}
+
+  def _salvar_indice(self) -> None:
+    caminho_temporario = self._caminho_indice + ".tmp"
+    with open(caminho_temporario, "w", encoding="utf-8") as arquivo:
+      json.dump(self._indice, arquivo)
+    os.replace(caminho_temporario, self._caminho_indice)
+    self._acessos_pendentes = False
+    self._gravado_em = time.monotonic()
@@ -1,5 +1,5 @@
-from datetime import date
-from typing import List, Dict, Any
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional
 
 from pydantic import BaseModel
 
@@ -16,3 +16,50 @@ class RespostaProcessamento(BaseModel):
   pagina_atual: int
   tamanho_pagina: int
   dados: List[Dict[str, Any]]
+  cursor: Optional[str] = None
+
+
+class RespostaJob(BaseModel):
+  id: str
+  status: str
+  data_inicio: date
+  data_fim: date
+  anos: List[int]
+  execucao_compartilhada: bool
+  progresso: Dict[str, Dict[str, Any]]
+  total_registros: Optional[int] = None
+  mensagem: Optional[str] = None
+  etapas: List[Dict[str, Any]] = []
+  criado_em: datetime
+  atualizado_em: datetime
+
+
+class RespostaIngestao(BaseModel):
+  mensagem: str
+  anos: List[int]
+  registros_carregados: int
+  recursos: List[Dict[str, Any]]
+
+
+class RespostaSerie(BaseModel):
+  chave: str
+  data_inicio: date
+  data_fim: date
+  total_registros: int
+  origem: str = "indice"
+  cobertura_inicio: Optional[date] = None
+  cobertura_fim: Optional[date] = None
+  metadados: Dict[str, Any] = {}
+  datas: List[date]
+  valores: Dict[str, List[Any]]
+
+
+class RespostaAgregados(BaseModel):
+  nivel: str
+  dimensao: str
+  data_inicio: date
+  data_fim: date
+  cobertura_inicio: Optional[date] = None
+  cobertura_fim: Optional[date] = None
+  total_registros: int
+  dados: List[Dict[str, Any]]
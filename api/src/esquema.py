@@ -0,0 +1,83 @@
+from typing import List, Dict, Optional, Tuple
+
+import pyarrow as pa
+
+# Espelho do schema da tabela `ena_consolidado` (terraform/ena-resources.tf): (coluna, tipo, modo).
+ESQUEMA_ENA_CONSOLIDADO: List[Tuple[str, str, str]] = [
+  ("ear_data", "DATE", "REQUIRED"),
+  ("cod_resplanejamento", "INT64", "REQUIRED"),
+  ("nom_reservatorio", "STRING", "REQUIRED"),
+  ("ear_total_mwmes", "FLOAT", "REQUIRED"),
+  ("ear_maxima_total_mwmes", "FLOAT", "REQUIRED"),
+  ("ear_reservatorio_percentual", "FLOAT", "REQUIRED"),
+  ("val_contribearbacia", "FLOAT", "REQUIRED"),
+  ("val_contribearsin", "FLOAT", "REQUIRED"),
+  ("nom_bacia", "STRING", "REQUIRED"),
+  ("nom_subsistema", "STRING", "REQUIRED"),
+  ("nom_ree", "STRING", "NULLABLE"),
+  ("tip_reservatorio", "STRING", "REQUIRED"),
+  ("ear_reservatorio_subsistema_proprio_mwmes", "FLOAT", "REQUIRED"),
+  ("ear_reservatorio_subsistema_jusante_mwmes", "FLOAT", "REQUIRED"),
+  ("earmax_reservatorio_subsistema_proprio_mwmes", "FLOAT", "REQUIRED"),
+  ("earmax_reservatorio_subsistema_jusante_mwmes", "FLOAT", "REQUIRED"),
+  ("val_contribearmaxbacia", "FLOAT", "REQUIRED"),
+  ("val_contribearsubsistema", "FLOAT", "REQUIRED"),
+  ("val_contribearmaxsubsistema", "FLOAT", "REQUIRED"),
+  ("val_contribearsubsistemajusante", "FLOAT", "REQUIRED"),
+  ("val_contribearmaxsubsistemajusante", "FLOAT", "REQUIRED"),
+  ("val_contribearmaxsin", "FLOAT", "REQUIRED"),
+  ("file_source", "STRING", "NULLABLE"),
+  ("ingestion_timestamp", "TIMESTAMP", "NULLABLE"),
+]
+
+COLUNAS_METADADOS = ("file_source", "ingestion_timestamp")
+
+# Colunas que vêm dos arquivos da ONS (as de metadados são preenchidas na ingestão).
+COLUNAS_ENA: List[str] = [
+  nome for nome, _, _ in ESQUEMA_ENA_CONSOLIDADO if nome not in COLUNAS_METADADOS
+]
+
+COLUNA_DATA_ONS = "ear_data"
+
+# Tipos do BigQuery (terraform/ena-resources.tf) e os tipos Arrow equivalentes.
+TIPOS_ARROW = {
+  "DATE": pa.date32(),
+  "INT64": pa.int64(),
+  "FLOAT": pa.float64(),
+  "STRING": pa.string(),
+  "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+# Textos com poucos valores distintos, guardados como dicionário (categorias no pandas).
+COLUNAS_CATEGORICAS = ("nom_subsistema", "nom_bacia", "nom_ree", "tip_reservatorio")
+
+
+def _tipo_arrow(coluna: str, tipo_bq: str) -> pa.DataType:
+  tipo = TIPOS_ARROW[tipo_bq]
+  if coluna in COLUNAS_CATEGORICAS:
+    return pa.dictionary(pa.int32(), tipo)
+  return tipo
+
+
+ESQUEMA_ARROW_ENA = pa.schema([
+  pa.field(nome, _tipo_arrow(nome, tipo), nullable=modo != "REQUIRED")
+  for nome, tipo, modo in ESQUEMA_ENA_CONSOLIDADO
+])
+
+
+def unificar_schema(schema: pa.Schema, sinonimos: Optional[Dict[str, str]] = None) -> pa.Schema:
+  """
+  O schema com os tipos da `ena_consolidado` nas colunas que ela conhece (`sinonimos` mapeia
+  nomes usados fora dela, como a data renomeada pela API, para os do schema). As demais colunas
+  mantêm o tipo inferido, e as sem tipo (só nulos) viram texto.
+  """
+  sinonimos = sinonimos or {}
+  campos = []
+  for campo in schema:
+    nome_ena = sinonimos.get(campo.name, campo.name)
+    if nome_ena in ESQUEMA_ARROW_ENA.names:
+      campo = campo.with_type(ESQUEMA_ARROW_ENA.field(nome_ena).type)
+    elif pa.types.is_null(campo.type):
+      campo = campo.with_type(pa.string())
+    campos.append(campo.with_nullable(True))
+  return pa.schema(campos)
@@ -0,0 +1,206 @@
+import asyncio
+import io
+import json
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional
+
+import fsspec
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import service
+from catalogo import catalogo_ons
+from esquema import COLUNA_DATA_ONS, ESQUEMA_ARROW_ENA
+from normalizacao import remover_linhas_incompletas
+from series import indice_series
+
+# Configurações da ingestão incremental. As marcas ficam no GCS (gs://...) para sobreviverem a
+# novas instâncias do serviço; sem INGESTAO_MARCAS_URI, vão para o bucket dos arquivos da ONS.
+URI_MARCAS_INGESTAO = os.getenv("INGESTAO_MARCAS_URI") or (
+  f"gs://{service.NOME_BUCKET}/ingestao/marcas_ingestao.json" if service.NOME_BUCKET else None
+)
+MAXIMO_CARGAS_SIMULTANEAS = int(os.getenv("INGESTAO_MAX_CARGAS_SIMULTANEAS", "8"))
+
+STATUS_SEM_ALTERACOES = "sem_alteracoes"
+STATUS_SEM_NOVOS_DIAS = "sem_novos_dias"
+STATUS_CARREGADO = "carregado"
+STATUS_ERRO = "erro"
+
+
+def _versao_recurso(recurso: Dict[str, Any]) -> Optional[str]:
+  """Data de modificação publicada no catálogo da ONS, usada para saber se o arquivo mudou."""
+  return recurso.get("last_modified") or recurso.get("metadata_modified")
+
+
+class MarcasIngestao:
+  """
+  Marca d'água por recurso da ONS: a versão do arquivo já ingerida, o último dia carregado e
+  quantos registros foram carregados até agora. Gravadas em um arquivo JSON a cada atualização;
+  a leitura e a gravação rodam em threads, fora do event loop.
+  """
+
+  def __init__(self, uri: Optional[str] = URI_MARCAS_INGESTAO):
+    self.uri = uri
+    self._marcas: Optional[Dict[str, Dict[str, Any]]] = None
+
+  async def obter(self, id_recurso: str) -> Optional[Dict[str, Any]]:
+    return (await self._carregar()).get(id_recurso)
+
+  async def registrar(self, id_recurso: str, marca: Dict[str, Any]) -> None:
+    marcas = await self._carregar()
+    marcas[id_recurso] = marca
+    await asyncio.to_thread(self._gravar, dict(marcas))
+
+  async def todas(self) -> Dict[str, Dict[str, Any]]:
+    return dict(await self._carregar())
+
+  async def _carregar(self) -> Dict[str, Dict[str, Any]]:
+    if self._marcas is None:
+      self._marcas = await asyncio.to_thread(self._ler)
+    return self._marcas
+
+  def _ler(self) -> Dict[str, Dict[str, Any]]:
+    if not self.uri:
+      raise RuntimeError("Destino das marcas de ingestão não configurado (defina INGESTAO_MARCAS_URI ou GCS_BUCKET_NAME).")
+    try:
+      with fsspec.open(self.uri, "r") as arquivo:
+        return json.load(arquivo)
+    except FileNotFoundError:
+      return {}
+    except ValueError:
+      print(f"AVISO: Marcas de ingestão ilegíveis em {self.uri}. Recomeçando do zero.")
+      return {}
+
+  def _gravar(self, marcas: Dict[str, Dict[str, Any]]) -> None:
+    with fsspec.open(self.uri, "w", auto_mkdir=True) as arquivo:
+      json.dump(marcas, arquivo)
+
+
+def _dividir_por_dia(tabela: pa.Table) -> List[pa.Table]:
+  """Separa a tabela em fatias contíguas, uma por valor de `ear_data`, sem copiar os dados."""
+  tabela = tabela.sort_by(COLUNA_DATA_ONS)
+  dias = tabela.column(COLUNA_DATA_ONS).to_numpy()
+  _, inicios = np.unique(dias, return_index=True)
+  fins = list(inicios[1:]) + [tabela.num_rows]
+  return [tabela.slice(inicio, fim - inicio) for inicio, fim in zip(inicios, fins)]
+
+
+def carregar_particoes(tabela: pa.Table) -> List[str]:
+  """
+  Carrega a tabela no BigQuery com load jobs de Parquet, um por partição diária
+  (`tabela$AAAAMMDD`) com WRITE_TRUNCATE: repetir a carga de um dia substitui a partição em vez
+  de duplicar linhas. Os jobs são disparados em lotes de até MAXIMO_CARGAS_SIMULTANEAS.
+  Retorna os dias carregados.
+
+  As fatias são gravadas com o schema de esquema.py, com as colunas REQUIRED não nulas: um
+  Parquet com todas as colunas anuláveis é rejeitado pela tabela ("changed mode from REQUIRED
+  to NULLABLE"). A tabela já deve ter passado por `remover_linhas_incompletas`.
+  """
+  cliente = service.obter_cliente_bigquery()
+  if cliente is None:
+    raise RuntimeError("Cliente do BigQuery não configurado (defina GCP_PROJECT_ID).")
+
+  from google.cloud import bigquery
+  job_config = bigquery.LoadJobConfig(
+    source_format=bigquery.SourceFormat.PARQUET,
+    write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+  )
+  fatias = _dividir_por_dia(tabela)
+  dias_carregados = []
+  for inicio_lote in range(0, len(fatias), MAXIMO_CARGAS_SIMULTANEAS):
+    jobs = []
+    for fatia in fatias[inicio_lote:inicio_lote + MAXIMO_CARGAS_SIMULTANEAS]:
+      dia = fatia.column(COLUNA_DATA_ONS)[0].as_py()
+      buffer = io.BytesIO()
+      pq.write_table(fatia.select(ESQUEMA_ARROW_ENA.names).cast(ESQUEMA_ARROW_ENA), buffer)
+      buffer.seek(0)
+      destino = f"{service.ID_PROJETO}.{service.ID_DATASET}.{service.ID_TABELA}${dia:%Y%m%d}"
+      jobs.append((dia, cliente.load_table_from_file(buffer, destino, job_config=job_config)))
+    for dia, job in jobs:
+      job.result()
+      dias_carregados.append(dia.isoformat())
+  return dias_carregados
+
+
+class IngestorIncremental:
+  """
+  Ingestão incremental dos arquivos da ONS na tabela `ena_consolidado`, pensada para a execução
+  diária agendada.
+
+  Recursos cuja versão no catálogo não mudou desde a última carga nem são baixados. Dos demais,
+  apenas os dias posteriores à marca d'água são lidos e carregados, por partição. A marca só
+  avança depois que todas as partições foram carregadas; se algo falhar, a próxima execução
+  repete os mesmos dias, sem duplicar linhas. Execuções concorrentes são serializadas.
+  """
+
+  def __init__(self, marcas: Optional[MarcasIngestao] = None):
+    self.marcas = marcas or MarcasIngestao()
+    self._trava = asyncio.Lock()
+
+  async def executar(self, anos: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Ingere os anos informados (por padrão, só o ano corrente) e retorna o resumo por recurso."""
+    anos = sorted(set(anos or [date.today().year]))
+    async with self._trava:
+      indice = await catalogo_ons.obter_indice()
+      resultados = [await self._ingerir_recurso(indice[ano]) for ano in anos if ano in indice]
+
+    return {
+      "anos": anos,
+      "registros_carregados": sum(resultado["registros"] for resultado in resultados),
+      "recursos": resultados,
+    }
+
+  async def _ingerir_recurso(self, recurso: Dict[str, Any]) -> Dict[str, Any]:
+    id_recurso = recurso["id"]
+    ano = recurso["ano"]
+    versao = _versao_recurso(recurso)
+    marca = await self.marcas.obter(id_recurso) or {}
+    resultado = {"recurso": recurso.get("name"), "ano": ano, "registros": 0, "particoes": []}
+
+    if versao and marca.get("versao") == versao:
+      print(f"  -> {recurso.get('name')} não mudou desde a última ingestão ({versao}).")
+      return {**resultado, "status": STATUS_SEM_ALTERACOES}
+
+    data_inicio = date(ano, 1, 1)
+    if marca.get("ultima_data"):
+      data_inicio = max(data_inicio, date.fromisoformat(marca["ultima_data"]) + timedelta(days=1))
+    data_fim = date(ano, 12, 31)
+
+    try:
+      tabela = pa.table({})
+      if data_inicio <= data_fim:
+        tabela = await service.ler_recurso_normalizado(recurso, data_inicio, data_fim)
+        tabela, descartadas = remover_linhas_incompletas(tabela)
+        if descartadas:
+          print(f"  -> {descartadas} linhas de {recurso.get('name')} descartadas por nulos em colunas obrigatórias.")
+      particoes = await asyncio.to_thread(carregar_particoes, tabela) if tabela.num_rows else []
+    except Exception as e:
+      print(f"  [!!!] FALHA NA INGESTÃO de {recurso.get('name')}: {e}")
+      return {**resultado, "status": STATUS_ERRO, "mensagem": str(e)}
+
+    ultima_data = marca.get("ultima_data")
+    if particoes:
+      ultima_data = pc.max(tabela.column(COLUNA_DATA_ONS)).as_py().isoformat()
+      # Os dias recém-carregados podem estar no cache do /consultar com o conteúdo anterior.
+      service.cache_resultados.invalidar_intervalo(data_inicio, date.fromisoformat(ultima_data))
+      service.etags_consulta.invalidar_intervalo(data_inicio, date.fromisoformat(ultima_data))
+      service._cache_contagens.clear()
+      if indice_series.carregado:
+        # Os assinantes do índice (agregados, atributos) podem gravar em disco: fora do event loop.
+        await asyncio.to_thread(indice_series.atualizar, tabela)
+
+    await self.marcas.registrar(id_recurso, {
+      "ano": ano,
+      "versao": versao,
+      "ultima_data": ultima_data,
+      "registros": marca.get("registros", 0) + tabela.num_rows,
+      "atualizado_em": datetime.now(timezone.utc).isoformat(),
+    })
+    status = STATUS_CARREGADO if particoes else STATUS_SEM_NOVOS_DIAS
+    return {**resultado, "status": status, "registros": tabela.num_rows, "particoes": particoes}
+
+
+ingestor_incremental = IngestorIncremental()
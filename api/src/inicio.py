@@ -0,0 +1,133 @@
+import asyncio
+import importlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Este módulo é o ponto de entrada do servidor e só usa a biblioteca padrão: tudo o que ele
+# importa atrasa a primeira resposta do /health.
+
+AplicacaoASGI = Callable[..., Awaitable[None]]
+
+CAMINHO_SAUDE = "/health"
+
+
+def _carregar_main() -> AplicacaoASGI:
+  """Importa a API (FastAPI, pyarrow e os módulos de src/) e registra quanto isso levou."""
+  inicio = time.perf_counter()
+  main = importlib.import_module("main")
+  from metricas import registrar_inicializacao
+  registrar_inicializacao("importacao", time.perf_counter() - inicio)
+  return main.app
+
+
+class AplicacaoAdiada:
+  """
+  Aplicação ASGI que sobe antes da API (`uvicorn inicio:app`). No startup do lifespan, a API é
+  importada em uma thread e o servidor já aceita conexões: o /health responde na hora, e as
+  demais requisições aguardam a importação e seguem para a API. O lifespan da API é repassado
+  assim que ela termina de carregar e encerrado junto com o servidor.
+
+  Se a importação falhar, o /health e as demais rotas respondem 503, para que a instância seja
+  substituída.
+  """
+
+  def __init__(self, carregar: Callable[[], AplicacaoASGI] = _carregar_main):
+    self._carregar = carregar
+    self._carga: Optional["asyncio.Task[AplicacaoASGI]"] = None
+    self._com_lifespan = False
+    self._tarefa_lifespan: Optional[asyncio.Task] = None
+    self._entrada_lifespan: Optional[asyncio.Queue] = None
+    self._saida_lifespan: Optional[asyncio.Queue] = None
+
+  @property
+  def carregada(self) -> bool:
+    return self._carga is not None and self._carga.done() and self._carga.exception() is None
+
+  async def __call__(self, scope: Dict[str, Any], receive, send) -> None:
+    if scope["type"] == "lifespan":
+      await self._ciclo_de_vida(receive, send)
+      return
+    if self._carga is None:
+      # Sem lifespan (uvicorn --lifespan off), a API é carregada na primeira requisição.
+      self._carga = asyncio.create_task(self._carregar_aplicacao())
+    if not self._carga.done() and scope["type"] == "http" and scope["path"] == CAMINHO_SAUDE:
+      await _responder(send, 200, {"status": "ok"})
+      return
+    try:
+      aplicacao = await asyncio.shield(self._carga)
+    except Exception as e:
+      if scope["type"] == "http":
+        await _responder(send, 503, {"status": "erro", "detail": f"Falha ao carregar a API: {e}"})
+      return
+    await aplicacao(scope, receive, send)
+
+  async def _ciclo_de_vida(self, receive, send) -> None:
+    while True:
+      mensagem = await receive()
+      if mensagem["type"] == "lifespan.startup":
+        self._com_lifespan = True
+        if self._carga is None:
+          self._carga = asyncio.create_task(self._carregar_aplicacao())
+        await send({"type": "lifespan.startup.complete"})
+      elif mensagem["type"] == "lifespan.shutdown":
+        await self._encerrar()
+        await send({"type": "lifespan.shutdown.complete"})
+        return
+
+  async def _carregar_aplicacao(self) -> AplicacaoASGI:
+    try:
+      aplicacao = await asyncio.to_thread(self._carregar)
+      if self._com_lifespan:
+        await self._iniciar_lifespan(aplicacao)
+    except Exception as e:
+      print(f"ERRO: falha ao carregar a API: {e}")
+      raise
+    return aplicacao
+
+  async def _iniciar_lifespan(self, aplicacao: AplicacaoASGI) -> None:
+    """Envia o startup do lifespan para a API e espera a confirmação."""
+    self._entrada_lifespan, self._saida_lifespan = asyncio.Queue(), asyncio.Queue()
+    escopo = {"type": "lifespan", "asgi": {"version": "3.0", "spec_version": "2.0"}, "state": {}}
+    self._tarefa_lifespan = asyncio.create_task(
+      aplicacao(escopo, self._entrada_lifespan.get, self._saida_lifespan.put)
+    )
+    await self._entrada_lifespan.put({"type": "lifespan.startup"})
+    resposta = await self._aguardar_lifespan()
+    if resposta is not None and resposta["type"] == "lifespan.startup.failed":
+      raise RuntimeError(resposta.get("message") or "o startup do lifespan falhou")
+
+  async def _aguardar_lifespan(self) -> Optional[Dict[str, Any]]:
+    """
+    A próxima mensagem do lifespan da API. Retorna None se a API não tratar o lifespan (a tarefa
+    termina sem responder), que passa a ser ignorado, como faz o uvicorn.
+    """
+    recebida = asyncio.ensure_future(self._saida_lifespan.get())
+    await asyncio.wait({recebida, self._tarefa_lifespan}, return_when=asyncio.FIRST_COMPLETED)
+    if recebida.done():
+      return recebida.result()
+    recebida.cancel()
+    self._tarefa_lifespan = None
+    return None
+
+  async def _encerrar(self) -> None:
+    if self._carga is not None and not self._carga.done():
+      # A thread da importação não pode ser interrompida; o processo termina sem esperá-la.
+      self._carga.cancel()
+      return
+    if self._tarefa_lifespan is not None and not self._tarefa_lifespan.done():
+      await self._entrada_lifespan.put({"type": "lifespan.shutdown"})
+      await self._aguardar_lifespan()
+
+
+async def _responder(send, status: int, conteudo: Dict[str, Any]) -> None:
+  corpo = json.dumps(conteudo).encode()
+  await send({
+    "type": "http.response.start",
+    "status": status,
+    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())],
+  })
+  await send({"type": "http.response.body", "body": corpo})
+
+
+app = AplicacaoAdiada()
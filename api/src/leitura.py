@@ -0,0 +1,245 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from esquema import COLUNAS_ENA, COLUNA_DATA_ONS, ESQUEMA_ENA_CONSOLIDADO, TIPOS_ARROW
+
+# O pandas só é importado pelos leitores que o usam (motor "threads"/"processos" e datas em
+# formatos que o Arrow não compara), não na subida da API.
+if TYPE_CHECKING:
+  import pandas as pd
+
+TAMANHO_BLOCO_CSV = 50_000
+BYTES_BLOCO_CSV_ARROW = 1 << 20
+
+
+def _colunas_projetadas(colunas_arquivo: List[str]) -> Optional[List[str]]:
+  """Colunas do schema presentes no arquivo; None (todas) se o arquivo não seguir o schema."""
+  colunas = [coluna for coluna in COLUNAS_ENA if coluna in colunas_arquivo]
+  return colunas if COLUNA_DATA_ONS in colunas else None
+
+
+def _filtrar_por_datas(df: "pd.DataFrame", data_inicio: date, data_fim: date) -> "pd.DataFrame":
+  """Mantém as linhas cuja data está no intervalo, seja qual for a representação da coluna."""
+  import pandas as pd
+  datas = pd.to_datetime(df[COLUNA_DATA_ONS], errors="coerce")
+  return df[(datas >= pd.Timestamp(data_inicio)) & (datas < pd.Timestamp(data_fim + timedelta(days=1)))]
+
+
+def filtro_de_datas(tipo_coluna: pa.DataType, data_inicio: date, data_fim: date) -> Optional[pc.Expression]:
+  """
+  Monta o filtro de intervalo compatível com o tipo da coluna de data no arquivo, para que o
+  leitor descarte row groups pelas estatísticas e linhas durante a decodificação. Retorna None
+  quando o tipo da coluna não permite comparar direto com datas.
+  """
+  campo = pc.field(COLUNA_DATA_ONS)
+  dia_seguinte = data_fim + timedelta(days=1)
+  if pa.types.is_date(tipo_coluna):
+    return (campo >= pa.scalar(data_inicio, tipo_coluna)) & (campo <= pa.scalar(data_fim, tipo_coluna))
+  if pa.types.is_timestamp(tipo_coluna):
+    inicio = datetime.combine(data_inicio, datetime.min.time())
+    fim = datetime.combine(dia_seguinte, datetime.min.time())
+    return (campo >= pa.scalar(inicio, tipo_coluna)) & (campo < pa.scalar(fim, tipo_coluna))
+  if pa.types.is_string(tipo_coluna) or pa.types.is_large_string(tipo_coluna):
+    # Datas ISO (com ou sem horário) ordenam lexicograficamente como datas.
+    return (campo >= data_inicio.isoformat()) & (campo < dia_seguinte.isoformat())
+  return None
+
+
+def filtrar_tabela_por_datas(tabela: pa.Table, data_inicio: date, data_fim: date) -> pa.Table:
+  """Mantém as linhas de uma tabela Arrow cuja data está no intervalo."""
+  if tabela.num_rows == 0 or COLUNA_DATA_ONS not in tabela.column_names:
+    return tabela
+  filtro = filtro_de_datas(tabela.schema.field(COLUNA_DATA_ONS).type, data_inicio, data_fim)
+  if filtro is not None:
+    return tabela.filter(filtro)
+  df = _filtrar_por_datas(tabela.to_pandas(), data_inicio, data_fim)
+  return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def ler_parquet_em_tabela(caminho: str, data_inicio: date, data_fim: date) -> pa.Table:
+  """Lê de um Parquet apenas as colunas do schema e as linhas do intervalo solicitado."""
+  schema = pq.read_schema(caminho, memory_map=True)
+  colunas = _colunas_projetadas(schema.names)
+  if colunas is None:
+    return pq.read_table(caminho, memory_map=True)
+
+  filtro = filtro_de_datas(schema.field(COLUNA_DATA_ONS).type, data_inicio, data_fim)
+  tabela = pq.read_table(caminho, columns=colunas, filters=filtro, memory_map=True)
+  if filtro is None:
+    tabela = filtrar_tabela_por_datas(tabela, data_inicio, data_fim)
+  return tabela
+
+
+def ler_parquet_filtrado(caminho: str, data_inicio: date, data_fim: date) -> "pd.DataFrame":
+  """Versão em DataFrame de `ler_parquet_em_tabela`."""
+  return ler_parquet_em_tabela(caminho, data_inicio, data_fim).to_pandas()
+
+
+def ler_csv_filtrado(caminho: str, data_inicio: date, data_fim: date) -> "pd.DataFrame":
+  """
+  Lê um CSV da ONS (latin-1, ';', cabeçalho na segunda linha) em blocos, mantendo só as colunas
+  do schema e descartando de cada bloco as linhas fora do intervalo antes de ler o próximo.
+  """
+  import pandas as pd
+  opcoes = {"sep": ";", "header": 1, "encoding": "latin-1"}
+  cabecalho = pd.read_csv(caminho, nrows=0, **opcoes)
+  colunas = _colunas_projetadas(list(cabecalho.columns))
+  if colunas is None:
+    return pd.read_csv(caminho, memory_map=True, **opcoes)
+
+  blocos = []
+  with pd.read_csv(caminho, usecols=colunas, chunksize=TAMANHO_BLOCO_CSV, memory_map=True, **opcoes) as leitor:
+    for bloco in leitor:
+      bloco = _filtrar_por_datas(bloco, data_inicio, data_fim)
+      if not bloco.empty:
+        blocos.append(bloco)
+
+  if not blocos:
+    return cabecalho[colunas]
+  return pd.concat(blocos, ignore_index=True)[colunas]
+
+
+def _cabecalho_csv(caminho: str) -> List[str]:
+  """Nomes das colunas de um CSV da ONS, lidos da segunda linha do arquivo."""
+  with open(caminho, encoding="latin-1", newline="") as arquivo:
+    arquivo.readline()
+    return [coluna.strip().strip('"') for coluna in arquivo.readline().rstrip("\r\n").split(";")]
+
+
+def _tipos_colunas_csv(colunas: Optional[List[str]], numeros_como_texto: bool = False) -> Dict[str, pa.DataType]:
+  """
+  Tipos das colunas projetadas, tirados do schema da `ena_consolidado`. O leitor em fluxo do Arrow
+  fixa os tipos pelo primeiro bloco; sem eles, uma coluna FLOAT com só inteiros no início do
+  ano (ou uma de texto ainda vazia) seria lida como int64 (ou null) e a leitura falharia adiante.
+  A data fica com o tipo inferido, que não muda ao longo do arquivo.
+  """
+  if colunas is None:
+    return {}
+  tipos = {}
+  for nome, tipo, _ in ESQUEMA_ENA_CONSOLIDADO:
+    if nome not in colunas or nome == COLUNA_DATA_ONS:
+      continue
+    tipos[nome] = pa.string() if numeros_como_texto or tipo == "STRING" else TIPOS_ARROW[tipo]
+  return tipos
+
+
+def _abrir_csv_arrow(caminho: str, numeros_como_texto: bool = False) -> pa_csv.CSVStreamingReader:
+  colunas = _colunas_projetadas(_cabecalho_csv(caminho))
+  return pa_csv.open_csv(
+    caminho,
+    read_options=pa_csv.ReadOptions(
+      skip_rows=1, encoding="latin-1", use_threads=True, block_size=BYTES_BLOCO_CSV_ARROW
+    ),
+    parse_options=pa_csv.ParseOptions(delimiter=";"),
+    convert_options=pa_csv.ConvertOptions(
+      include_columns=colunas, column_types=_tipos_colunas_csv(colunas, numeros_como_texto)
+    ),
+  )
+
+
+def filtrar_lotes_por_datas(
+    lotes: Iterable[pa.RecordBatch], schema: pa.Schema, data_inicio: date, data_fim: date
+) -> Iterator[pa.RecordBatch]:
+  """Descarta de cada lote as linhas fora do intervalo, à medida que os lotes são lidos."""
+  if COLUNA_DATA_ONS not in schema.names:
+    yield from lotes
+    return
+  filtro = filtro_de_datas(schema.field(COLUNA_DATA_ONS).type, data_inicio, data_fim)
+  for lote in lotes:
+    if filtro is not None:
+      lote = lote.filter(filtro)
+    else:
+      df = _filtrar_por_datas(lote.to_pandas(), data_inicio, data_fim)
+      lote = pa.RecordBatch.from_pandas(df, schema=schema, preserve_index=False)
+    if lote.num_rows:
+      yield lote
+
+
+def ler_csv_arrow(caminho: str, data_inicio: date, data_fim: date) -> pa.Table:
+  """
+  Lê um CSV da ONS em fluxo com o leitor nativo do Arrow, que decodifica blocos de
+  BYTES_BLOCO_CSV_ARROW em paralelo fora do GIL, projetando as colunas do schema. As linhas fora
+  do intervalo são descartadas lote a lote: o arquivo inteiro nunca fica em memória.
+  """
+  try:
+    leitor = _abrir_csv_arrow(caminho)
+    lotes = list(filtrar_lotes_por_datas(leitor, leitor.schema, data_inicio, data_fim))
+  except pa.ArrowInvalid as e:
+    # Ex.: números com vírgula decimal. Lidos como texto, são convertidos na normalização.
+    print(f"AVISO: {os.path.basename(caminho)} fora dos tipos do schema ({e}). Lendo os números como texto.")
+    leitor = _abrir_csv_arrow(caminho, numeros_como_texto=True)
+    lotes = list(filtrar_lotes_por_datas(leitor, leitor.schema, data_inicio, data_fim))
+  return pa.Table.from_batches(lotes, schema=leitor.schema)
+
+
+def ler_arquivo_em_tabela(
+    caminho: str, formato: str, data_inicio: date, data_fim: date, leitor: str = "pandas"
+) -> pa.Table:
+  """
+  Lê um arquivo da ONS já filtrado pelo intervalo e o devolve como tabela Arrow.
+
+  `leitor` escolhe como os CSVs são decodificados: "pandas" (em blocos) ou "arrow" (nativo).
+  Parquet é sempre lido pelo pyarrow.
+  """
+  if formato == "PARQUET":
+    return ler_parquet_em_tabela(caminho, data_inicio, data_fim)
+  if formato != "CSV":
+    raise ValueError(f"Formato não suportado: {formato}")
+  if leitor == "arrow":
+    return ler_csv_arrow(caminho, data_inicio, data_fim)
+  return pa.Table.from_pandas(ler_csv_filtrado(caminho, data_inicio, data_fim), preserve_index=False)
+
+
+def ler_arquivo_em_ipc(
+    caminho: str, formato: str, data_inicio: date, data_fim: date, leitor: str = "pandas"
+) -> bytes:
+  """
+  Ponto de entrada dos processos do motor: lê o arquivo e devolve a tabela serializada em Arrow
+  IPC, que volta ao processo principal como um único buffer em vez de uma lista de dicts.
+  """
+  tabela = ler_arquivo_em_tabela(caminho, formato, data_inicio, data_fim, leitor)
+  destino = pa.BufferOutputStream()
+  with pa.ipc.new_stream(destino, tabela.schema) as escritor:
+    escritor.write_table(tabela)
+  return destino.getvalue().to_pybytes()
+
+
+def tabela_de_ipc(conteudo: bytes) -> pa.Table:
+  """Reconstrói a tabela devolvida por `ler_arquivo_em_ipc`."""
+  return pa.ipc.open_stream(pa.py_buffer(conteudo)).read_all()
+
+
+def concatenar_tabelas(tabelas: List[pa.Table]) -> pa.Table:
+  """
+  Junta as tabelas de vários arquivos. Tipos compatíveis são promovidos (ex.: int -> double);
+  colunas cujo tipo diverge entre arquivos (ex.: data em um ano e texto em outro) viram texto.
+  """
+  tabelas = [tabela for tabela in tabelas if tabela is not None and tabela.num_columns]
+  if not tabelas:
+    return pa.table({})
+  try:
+    return pa.concat_tables(tabelas, promote_options="permissive")
+  except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+    campos = {}
+    for tabela in tabelas:
+      for campo in tabela.schema:
+        campos.setdefault(campo.name, []).append(campo)
+    divergentes = set()
+    for nome, variantes in campos.items():
+      try:
+        pa.unify_schemas([pa.schema([campo]) for campo in variantes], promote_options="permissive")
+      except (pa.ArrowInvalid, pa.ArrowTypeError):
+        divergentes.add(nome)
+    convertidas = []
+    for tabela in tabelas:
+      for nome in divergentes & set(tabela.column_names):
+        indice = tabela.schema.get_field_index(nome)
+        tabela = tabela.set_column(indice, nome, tabela.column(nome).cast(pa.string()))
+      convertidas.append(tabela)
+    return pa.concat_tables(convertidas, promote_options="permissive")
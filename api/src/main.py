@@ -1,16 +1,86 @@
+import asyncio
 import math
+from contextlib import asynccontextmanager
 from datetime import date
+from typing import List, Dict, Any, Callable, Optional, Tuple, Union
 
+import pyarrow as pa
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, status, Query
+from fastapi import FastAPI, HTTPException, status, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 
-from dto import RequisicaoIntervaloDatas, RespostaProcessamento
-from processing import executar_fluxo
-from service import consultar_dados_por_intervalo
+from agregados import DIMENSOES, NIVEIS, agregados_ena
+from atributos import pipeline_atributos, tabela_para_parquet
+from catalogo import catalogo_ons
+from cliente_ons import cliente_ons
+from dto import RequisicaoIntervaloDatas, RespostaAgregados, RespostaIngestao, RespostaJob, RespostaProcessamento, RespostaSerie
+from ingestao import STATUS_ERRO as STATUS_INGESTAO_ERRO, ingestor_incremental
+from jobs import STATUS_CONCLUIDO, gerenciador_jobs
+from metricas import MiddlewareMetricas, RotaInstrumentada, registro_metricas
+from motor import motor_processamento
+from processing import executar_fluxo, iterar_fluxo
+from respostas import RespostaJSONRapida, etag_corresponde, resposta_nao_modificada
+import service
+from series import IndiceSeries, Serie, indice_do_backend, indice_series, serie_para_colunas
+from service import consultar_pagina_com_total, decodificar_cursor, iterar_lotes_por_intervalo
+from streaming import TIPO_PARQUET, criar_resposta_streaming, escolher_formato
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+  """
+  Abre o cliente HTTP compartilhado com a ONS, mantém o catálogo e o índice de séries
+  atualizados em segundo plano enquanto a aplicação estiver no ar e, no desligamento, fecha o
+  cliente, grava os acessos pendentes do cache de arquivos e libera os workers do motor de
+  processamento. Os clientes do BigQuery e do GCS são criados em segundo plano, sem atrasar a
+  subida.
+  """
+  cliente_ons.abrir()
+  tarefas = [
+    asyncio.create_task(asyncio.to_thread(service.aquecer_clientes)),
+    asyncio.create_task(catalogo_ons.manter_atualizado()),
+    asyncio.create_task(indice_series.manter_atualizado()),
+  ]
+  yield
+  for tarefa in tarefas:
+    tarefa.cancel()
+  await cliente_ons.fechar()
+  await asyncio.to_thread(service.cache_arquivos_ons.persistir)
+  motor_processamento.encerrar()
+
+
+app = FastAPI(lifespan=lifespan)
+app.router.route_class = RotaInstrumentada
+app.add_middleware(MiddlewareMetricas)
+
+
+def _coletar_estado() -> list:
+  """Medições de estado exportadas no /metrics: caches, catálogo e índice de séries."""
+  cache = service.cache_resultados.estatisticas()
+  medicoes = [
+    (f"cache_consulta_{nome}", f"Cache de partições do /consultar: {nome}.", [({}, cache[nome])])
+    for nome in ("acertos", "falhas", "remocoes", "blocos", "memoria_em_uso_bytes")
+  ]
+  medicoes.append((
+    "cache_ons_bytes", "Bytes dos arquivos da ONS em cache no disco.",
+    [({}, service.cache_arquivos_ons.tamanho_total())],
+  ))
+  if catalogo_ons.atualizado_em is not None:
+    medicoes.append((
+      "catalogo_ons_atualizado_em_segundos", "Momento (epoch) da última atualização do catálogo.",
+      [({}, catalogo_ons.atualizado_em)],
+    ))
+  medicoes.append((
+    "indice_series_linhas", "Linhas no índice de séries em memória.",
+    [({}, sum(len(serie) for serie in indice_series.reservatorios.values()))],
+  ))
+  return medicoes
+
+
+registro_metricas.registrar_coletor(_coletar_estado)
 
 
 @app.get("/health", status_code=status.HTTP_200_OK, tags=["Monitoramento"])
@@ -19,15 +89,82 @@ def verificar_saude():
   return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Monitoramento"])
+def exportar_metricas() -> PlainTextResponse:
+  """Métricas no formato de texto do Prometheus: latência por rota e por etapa, bytes e caches."""
+  return PlainTextResponse(registro_metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/catalogo", status_code=status.HTTP_200_OK, tags=["Monitoramento"])
+def consultar_catalogo():
+  """Mostra o estado do catálogo de recursos da ONS mantido em memória."""
+  return catalogo_ons.estado()
+
+
+@app.get("/series", status_code=status.HTTP_200_OK, tags=["Monitoramento"])
+def consultar_indice_series():
+  """Mostra o estado do índice de séries e das estruturas derivadas dele mantidas em memória."""
+  return {
+    **indice_series.estado(),
+    "agregados": agregados_ena.estado(),
+    "atributos": pipeline_atributos.estado(),
+  }
+
+
+def _resposta_paginada(
+    mensagem: str,
+    total_de_registros: int,
+    pagina: int,
+    tamanho: int,
+    dados: Union[List[dict], pa.Table],
+    cursor: Optional[str] = None,
+    ao_gerar_etag: Optional[Callable[[str], None]] = None,
+) -> RespostaJSONRapida:
+  """
+  Resposta no formato de `RespostaProcessamento`, codificada direto em JSON: páginas grandes
+  não passam pela validação do modelo, registro a registro.
+  """
+  return RespostaJSONRapida({
+    "mensagem": mensagem,
+    "total_registros": total_de_registros,
+    "total_paginas": math.ceil(total_de_registros / tamanho) if total_de_registros > 0 else 0,
+    "pagina_atual": pagina,
+    "tamanho_pagina": tamanho,
+    "dados": dados,
+    "cursor": cursor,
+  }, ao_gerar_etag=ao_gerar_etag)
+
+
 @app.get("/consultar", response_model=RespostaProcessamento, tags=["Consulta BigQuery"])
 async def endpoint_consultar_bigquery(
+    request: Request,
     data_inicio: date = Query(..., description="Data de início no formato AAAA-MM-DD"),
     data_fim: date = Query(..., description="Data de fim no formato AAAA-MM-DD"),
     pagina: int = Query(1, description="Número da página a ser retornada", ge=1),
     tamanho: int = Query(20, description="Quantidade de itens por página", ge=1),
-) -> RespostaProcessamento:
+    cursor: Optional[str] = Query(
+      None, description="Token opaco da próxima página, retornado na resposta anterior"
+    ),
+    formato: Optional[str] = Query(
+      None, description="json (padrão), ndjson ou arrow; os dois últimos transmitem o intervalo inteiro",
+      pattern="^(json|ndjson|arrow)$",
+    ),
+    cod_resplanejamento: Optional[int] = Query(None, description="Retorna apenas este reservatório"),
+    nom_subsistema: Optional[str] = Query(None, description="Retorna apenas este subsistema"),
+) -> Response:
   """
-  Consulta o BigQuery por um intervalo de datas e retorna os resultados paginados.
+  Consulta por um intervalo de datas o backend configurado (BigQuery ou o dataset Parquet
+  particionado) e retorna os resultados paginados.
+
+  Intervalos curtos são servidos pelo cache de partições; nos demais a paginação é feita no
+  próprio backend e apenas a página solicitada é lida. Para páginas profundas, prefira enviar o
+  `cursor` devolvido pela resposta anterior em vez de `pagina`.
+
+  Com `formato=ndjson|arrow` (ou o cabeçalho Accept equivalente) o intervalo inteiro é
+  transmitido em streaming, lote a lote do backend, e a paginação é ignorada.
+
+  As respostas JSON levam ETag. Em intervalos só de anos encerrados, o ETag fica guardado e um
+  If-None-Match igual recebe 304 sem consultar o backend.
   """
   if data_inicio > data_fim:
     raise HTTPException(
@@ -35,37 +172,73 @@ async def endpoint_consultar_bigquery(
       detail="A data de início não pode ser posterior à data de fim."
     )
 
-  todos_os_registros = await consultar_dados_por_intervalo(data_inicio, data_fim)
+  filtros = {
+    coluna: valor
+    for coluna, valor in (("cod_resplanejamento", cod_resplanejamento), ("nom_subsistema", nom_subsistema))
+    if valor is not None
+  }
+
+  formato_streaming = escolher_formato(formato, request.headers.get("accept"))
+  if formato_streaming:
+    return criar_resposta_streaming(
+      iterar_lotes_por_intervalo(data_inicio, data_fim, filtros=filtros), formato_streaming
+    )
 
-  total_de_registros = len(todos_os_registros)
-  total_de_paginas = math.ceil(total_de_registros / tamanho) if total_de_registros > 0 else 0
-  indice_inicio = (pagina - 1) * tamanho
-  indice_fim = indice_inicio + tamanho
-  dados_paginados = todos_os_registros[indice_inicio:indice_fim]
+  posicao = None
+  if cursor:
+    try:
+      posicao = decodificar_cursor(cursor, data_inicio, data_fim, filtros)
+    except ValueError as e:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    pagina = posicao["pagina"]
 
-  if not todos_os_registros:
-    mensagem = "Nenhum dado encontrado no BigQuery para o período especificado."
+  chave_etag = None
+  if service.intervalo_historico(data_inicio, data_fim):
+    chave_etag = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    etag = service.etags_consulta.obter(chave_etag)
+    if etag and etag_corresponde(request.headers.get("if-none-match"), etag):
+      return resposta_nao_modificada(etag)
+
+  dados_paginados, proximo_cursor, total_de_registros = await consultar_pagina_com_total(
+    data_inicio, data_fim, tamanho, pagina, posicao, filtros
+  )
+
+  if not total_de_registros:
+    mensagem = "Nenhum dado encontrado para o período especificado."
   else:
     mensagem = f"Consulta retornou {total_de_registros} registros com sucesso."
 
-  return RespostaProcessamento(
-    mensagem=mensagem,
-    total_registros=total_de_registros,
-    total_paginas=total_de_paginas,
-    pagina_atual=pagina,
-    tamanho_pagina=tamanho,
-    dados=dados_paginados,
+  ao_gerar_etag = None
+  if chave_etag and total_de_registros:
+    # Respostas vazias não são guardadas: podem vir de uma falha passageira do backend.
+    ao_gerar_etag = lambda etag: service.etags_consulta.guardar(chave_etag, etag, data_inicio, data_fim)
+  return _resposta_paginada(
+    mensagem, total_de_registros, pagina, tamanho, dados_paginados, proximo_cursor, ao_gerar_etag
   )
 
 
 @app.post("/processar", response_model=RespostaProcessamento)
 async def endpoint_processar_arquivos(
     requisicao: RequisicaoIntervaloDatas,
+    request: Request,
     pagina: int = Query(1, description="Número da página a ser retornada", ge=1),
     tamanho: int = Query(50, description="Quantidade de itens por página", ge=1),
-) -> RespostaProcessamento:
+    formato: Optional[str] = Query(
+      None, description="json (padrão), ndjson ou arrow; os dois últimos transmitem o intervalo inteiro",
+      pattern="^(json|ndjson|arrow)$",
+    ),
+    modo_assincrono: bool = Query(
+      False, alias="async", description="Executa em segundo plano e retorna o id do job"
+    ),
+) -> Response:
   """
   Inicia o fluxo de processamento de dados e retorna os dados paginados no corpo da resposta.
+
+  Com `async=true` a requisição retorna imediatamente (202) com o job criado; o progresso é
+  acompanhado em `/jobs/{id}` e os dados paginados em `/jobs/{id}/resultado`.
+
+  Com `formato=ndjson|arrow` (ou o cabeçalho Accept equivalente) os registros de cada arquivo
+  da ONS são transmitidos assim que o arquivo termina de ser processado.
   """
   if requisicao.data_inicio > requisicao.data_fim:
     raise HTTPException(
@@ -73,26 +246,242 @@ async def endpoint_processar_arquivos(
       detail="A data de início não pode ser posterior à data de fim."
     )
 
-  todos_os_registros = await executar_fluxo(requisicao.data_inicio, requisicao.data_fim)
+  if modo_assincrono:
+    job = await gerenciador_jobs.submeter(requisicao.data_inicio, requisicao.data_fim)
+    return JSONResponse(
+      status_code=status.HTTP_202_ACCEPTED,
+      content=jsonable_encoder(RespostaJob(**job)),
+      headers={"Location": f"/jobs/{job['id']}"},
+    )
+
+  formato_streaming = escolher_formato(formato, request.headers.get("accept"))
+  if formato_streaming:
+    return criar_resposta_streaming(
+      iterar_fluxo(requisicao.data_inicio, requisicao.data_fim), formato_streaming
+    )
 
-  # Lógica para calcular a paginação dos resultados.
-  total_de_registros = len(todos_os_registros)
-  total_de_paginas = math.ceil(total_de_registros / tamanho) if total_de_registros > 0 else 0
+  tabela_registros = await executar_fluxo(requisicao.data_inicio, requisicao.data_fim)
 
-  indice_inicio = (pagina - 1) * tamanho
-  indice_fim = indice_inicio + tamanho
-  dados_paginados = todos_os_registros[indice_inicio:indice_fim]
+  # Só a página retornada é codificada, direto da tabela Arrow para JSON.
+  total_de_registros = tabela_registros.num_rows
+  dados_paginados = tabela_registros.slice((pagina - 1) * tamanho, tamanho)
 
-  if not todos_os_registros:
+  if not total_de_registros:
     mensagem = "O fluxo de trabalho terminou, mas nenhum dado foi processado."
   else:
     mensagem = f"Processados {total_de_registros} registros com sucesso."
 
-  return RespostaProcessamento(
-    mensagem=mensagem,
-    total_registros=total_de_registros,
-    total_paginas=total_de_paginas,
-    pagina_atual=pagina,
-    tamanho_pagina=tamanho,
-    dados=dados_paginados,
+  return _resposta_paginada(mensagem, total_de_registros, pagina, tamanho, dados_paginados)
+
+
+@app.get("/jobs/{id_job}", response_model=RespostaJob, tags=["Jobs"])
+async def endpoint_consultar_job(id_job: str) -> RespostaJob:
+  """Retorna o status e o progresso por recurso de um job do /processar."""
+  job = await gerenciador_jobs.obter(id_job)
+  if not job:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job não encontrado.")
+  return RespostaJob(**job)
+
+
+@app.get("/jobs/{id_job}/resultado", response_model=RespostaProcessamento, tags=["Jobs"])
+async def endpoint_resultado_job(
+    id_job: str,
+    pagina: int = Query(1, description="Número da página a ser retornada", ge=1),
+    tamanho: int = Query(50, description="Quantidade de itens por página", ge=1),
+) -> Response:
+  """Retorna os dados paginados de um job concluído."""
+  job = await gerenciador_jobs.obter(id_job)
+  if not job:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job não encontrado.")
+  if job["status"] != STATUS_CONCLUIDO:
+    raise HTTPException(
+      status_code=status.HTTP_409_CONFLICT,
+      detail=f"O job ainda não foi concluído (status: {job['status']}).",
+    )
+
+  total_de_registros = job["total_registros"] or 0
+  dados_paginados = await gerenciador_jobs.obter_resultado(id_job, (pagina - 1) * tamanho, tamanho)
+  return _resposta_paginada(job["mensagem"], total_de_registros, pagina, tamanho, dados_paginados)
+
+
+@app.post("/ingestao/incremental", response_model=RespostaIngestao, tags=["Ingestão"])
+async def endpoint_ingestao_incremental(
+    ano: Optional[List[int]] = Query(None, description="Anos a ingerir; por padrão, apenas o ano corrente"),
+) -> Union[RespostaIngestao, JSONResponse]:
+  """
+  Carrega na tabela do BigQuery apenas os dias novos dos arquivos da ONS que mudaram desde a
+  última execução. Pensado para a execução diária agendada; repetir a chamada é seguro.
+  """
+  try:
+    resultado = await ingestor_incremental.executar(ano)
+  except RuntimeError as e:
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+  falhas = [r["recurso"] for r in resultado["recursos"] if r["status"] == STATUS_INGESTAO_ERRO]
+  if falhas:
+    mensagem = f"Falha na ingestão de {', '.join(falhas)}. Os dias não carregados serão repetidos."
+  else:
+    mensagem = f"Ingestão concluída com {resultado['registros_carregados']} novos registros."
+  resposta = RespostaIngestao(mensagem=mensagem, **resultado)
+
+  if falhas:
+    # Um status de erro faz o agendador tentar de novo; a nova tentativa não duplica linhas.
+    return JSONResponse(status_code=status.HTTP_502_BAD_GATEWAY, content=jsonable_encoder(resposta))
+  return resposta
+
+
+def _validar_intervalo(data_inicio: date, data_fim: date) -> None:
+  if data_inicio > data_fim:
+    raise HTTPException(
+      status_code=status.HTTP_400_BAD_REQUEST,
+      detail="A data de início não pode ser posterior à data de fim."
+    )
+
+
+async def _garantir_indice_series() -> None:
+  if not await indice_series.garantir_carregado():
+    raise HTTPException(
+      status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+      detail=f"O índice de séries ainda não está disponível. ({indice_series.ultimo_erro})",
+    )
+
+
+async def _indice_para_intervalo(
+    data_inicio: date, data_fim: date, filtros: Dict[str, Any]
+) -> Tuple[IndiceSeries, str]:
+  """
+  O índice em memória quando ele cobre o intervalo; senão, um índice avulso lido do backend
+  (recortes anteriores aos DIAS_HISTORICO_SERIES dias mantidos em memória) só com as linhas
+  de `filtros`.
+  """
+  await _garantir_indice_series()
+  if indice_series.cobre(data_inicio):
+    return indice_series, "indice"
+  return await asyncio.to_thread(indice_do_backend, data_inicio, data_fim, filtros), "backend"
+
+
+def _resposta_serie(
+    chave: str, serie: Serie, data_inicio: date, data_fim: date, colunas: Optional[List[str]],
+    origem: str, metadados: Optional[dict] = None,
+) -> RespostaSerie:
+  datas, valores = serie_para_colunas(serie, colunas)
+  # Lida do backend, a série cobre exatamente o intervalo pedido, e não o do índice em memória.
+  if origem == "backend":
+    cobertura_inicio, cobertura_fim = data_inicio, data_fim
+  else:
+    cobertura_inicio, cobertura_fim = indice_series.primeira_data, indice_series.ultima_data
+  return RespostaSerie(
+    chave=chave,
+    data_inicio=data_inicio,
+    data_fim=data_fim,
+    total_registros=len(datas),
+    origem=origem,
+    cobertura_inicio=cobertura_inicio,
+    cobertura_fim=cobertura_fim,
+    metadados=metadados or {},
+    datas=datas,
+    valores=valores,
+  )
+
+
+@app.get("/reservatorios/{cod_resplanejamento}/serie", response_model=RespostaSerie, tags=["Séries"])
+async def endpoint_serie_reservatorio(
+    cod_resplanejamento: int,
+    data_inicio: date = Query(..., description="Data de início no formato AAAA-MM-DD"),
+    data_fim: date = Query(..., description="Data de fim no formato AAAA-MM-DD"),
+    coluna: Optional[List[str]] = Query(None, description="Colunas de valores a retornar; por padrão, todas"),
+) -> RespostaSerie:
+  """
+  Série diária de um reservatório no intervalo, em formato colunar (um array de datas e um por
+  coluna), servida do índice em memória por busca binária, sem consultar o backend. Intervalos
+  que começam antes da cobertura do índice são lidos do backend (`origem` = "backend").
+  """
+  _validar_intervalo(data_inicio, data_fim)
+  filtros = {"cod_resplanejamento": cod_resplanejamento}
+  indice, origem = await _indice_para_intervalo(data_inicio, data_fim, filtros)
+  serie = indice.serie_reservatorio(cod_resplanejamento, data_inicio, data_fim)
+  if serie is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservatório não encontrado.")
+  return _resposta_serie(
+    str(cod_resplanejamento), serie, data_inicio, data_fim, coluna, origem,
+    indice.metadados.get(cod_resplanejamento),
   )
+
+
+@app.get("/subsistemas/{nom_subsistema}/serie", response_model=RespostaSerie, tags=["Séries"])
+async def endpoint_serie_subsistema(
+    nom_subsistema: str,
+    data_inicio: date = Query(..., description="Data de início no formato AAAA-MM-DD"),
+    data_fim: date = Query(..., description="Data de fim no formato AAAA-MM-DD"),
+    coluna: Optional[List[str]] = Query(None, description="Colunas de valores a retornar; por padrão, todas"),
+) -> RespostaSerie:
+  """
+  Linhas de todos os reservatórios de um subsistema no intervalo, ordenadas por (data,
+  cod_resplanejamento), em formato colunar e servidas do índice em memória (ou do backend,
+  antes da cobertura do índice).
+  """
+  _validar_intervalo(data_inicio, data_fim)
+  nom_subsistema = nom_subsistema.strip().upper()
+  indice, origem = await _indice_para_intervalo(data_inicio, data_fim, {"nom_subsistema": nom_subsistema})
+  serie = indice.serie_subsistema(nom_subsistema, data_inicio, data_fim)
+  if serie is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subsistema não encontrado.")
+  if coluna:
+    coluna = list(coluna) + ["cod_resplanejamento"]
+  return _resposta_serie(nom_subsistema, serie, data_inicio, data_fim, coluna, origem)
+
+
+@app.get("/agregados", response_model=RespostaAgregados, tags=["Séries"])
+async def endpoint_agregados(
+    data_inicio: date = Query(..., description="Data de início no formato AAAA-MM-DD"),
+    data_fim: date = Query(..., description="Data de fim no formato AAAA-MM-DD"),
+    nivel: str = Query("mensal", description="diario, semanal ou mensal", pattern=f"^({'|'.join(NIVEIS)})$"),
+    dimensao: str = Query(
+      "nom_subsistema", description="nom_subsistema, nom_bacia ou nom_ree", pattern=f"^({'|'.join(DIMENSOES)})$"
+    ),
+    chave: Optional[str] = Query(None, description="Retorna apenas este valor da dimensão (ex.: SE)"),
+) -> RespostaAgregados:
+  """
+  Somas e médias diárias, semanais ou mensais de EAR por subsistema, bacia ou REE nos períodos
+  que se sobrepõem ao intervalo. Servidas dos agregados em memória, mantidos junto com o índice
+  de séries, sem varrer os dados a cada requisição. Os agregados cobrem os mesmos dias do índice
+  (`cobertura_inicio` a `cobertura_fim`); períodos que começam antes da cobertura vêm com
+  `parcial` verdadeiro.
+  """
+  _validar_intervalo(data_inicio, data_fim)
+  await _garantir_indice_series()
+  dados = agregados_ena.consultar(nivel, dimensao, data_inicio, data_fim, chave)
+  return RespostaAgregados(
+    nivel=nivel,
+    dimensao=dimensao,
+    data_inicio=data_inicio,
+    data_fim=data_fim,
+    cobertura_inicio=agregados_ena.primeira_data,
+    cobertura_fim=agregados_ena.ultima_data,
+    total_registros=len(dados),
+    dados=dados,
+  )
+
+
+@app.get("/atributos", tags=["Séries"])
+async def endpoint_atributos(
+    data_inicio: date = Query(..., description="Data de início no formato AAAA-MM-DD"),
+    data_fim: date = Query(..., description="Data de fim no formato AAAA-MM-DD"),
+    formato: str = Query("arrow", description="arrow (stream Arrow IPC) ou parquet", pattern="^(arrow|parquet)$"),
+    cod_resplanejamento: Optional[int] = Query(None, description="Retorna apenas este reservatório"),
+) -> Response:
+  """
+  Atributos para os modelos de previsão (defasagens, médias e desvios móveis, variação anual e
+  calendário de `ear_total_mwmes` e `ear_reservatorio_percentual`), uma linha por reservatório
+  e dia com leitura. Calculados sobre a matriz reservatório × data em memória.
+  """
+  _validar_intervalo(data_inicio, data_fim)
+  await _garantir_indice_series()
+  tabela = await asyncio.to_thread(pipeline_atributos.calcular, data_inicio, data_fim, cod_resplanejamento)
+  if formato == "parquet":
+    conteudo = await asyncio.to_thread(tabela_para_parquet, tabela)
+    return Response(content=conteudo, media_type=TIPO_PARQUET)
+
+  async def lotes():
+    yield tabela
+
+  return criar_resposta_streaming(lotes(), "arrow")
@@ -0,0 +1,438 @@
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+# Configurações da instrumentação
+LIMIAR_LOG_REQUISICAO_MS = float(os.getenv("METRICAS_LIMIAR_LOG_MS", "1000"))
+PERFIL_HABILITADO = os.getenv("PERFIL_HABILITADO", "false").lower() in ("1", "true")
+DIRETORIO_PERFIS = os.getenv("PERFIL_DIRETORIO", os.path.join(tempfile.gettempdir(), "ons_perfis"))
+
+# Limites (em segundos) dos buckets dos histogramas de duração.
+LIMITES_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _formatar_rotulos(rotulos: Rotulos, extra: Optional[Tuple[str, str]] = None) -> str:
+  pares = list(rotulos) + ([extra] if extra else [])
+  if not pares:
+    return ""
+  texto = ",".join(
+    f'{nome}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+    for nome, valor in pares
+  )
+  return "{" + texto + "}"
+
+
+def _formatar_numero(valor: float) -> str:
+  return "+Inf" if valor == float("inf") else repr(float(valor))
+
+
+class Contador:
+  """Contador monotônico por combinação de rótulos (tipo `counter` do Prometheus)."""
+
+  tipo = "counter"
+
+  def __init__(self, nome: str, descricao: str):
+    self.nome = nome
+    self.descricao = descricao
+    self._valores: Dict[Rotulos, float] = {}
+    self._trava = threading.Lock()
+
+  def incrementar(self, valor: float = 1.0, **rotulos: Any) -> None:
+    chave = tuple(sorted((nome, str(v)) for nome, v in rotulos.items()))
+    with self._trava:
+      self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+  def valor(self, **rotulos: Any) -> float:
+    return self._valores.get(tuple(sorted((nome, str(v)) for nome, v in rotulos.items())), 0.0)
+
+  def exportar(self) -> List[str]:
+    with self._trava:
+      return [f"{self.nome}{_formatar_rotulos(chave)} {_formatar_numero(v)}" for chave, v in sorted(self._valores.items())]
+
+
+class Histograma:
+  """Histograma cumulativo por combinação de rótulos (tipo `histogram` do Prometheus)."""
+
+  tipo = "histogram"
+
+  def __init__(self, nome: str, descricao: str, limites: Tuple[float, ...] = LIMITES_DURACAO):
+    self.nome = nome
+    self.descricao = descricao
+    self.limites = tuple(sorted(limites))
+    self._series: Dict[Rotulos, List[float]] = {}
+    self._trava = threading.Lock()
+
+  def observar(self, valor: float, **rotulos: Any) -> None:
+    chave = tuple(sorted((nome, str(v)) for nome, v in rotulos.items()))
+    with self._trava:
+      # Uma contagem por bucket, seguida da soma e do total de observações.
+      serie = self._series.setdefault(chave, [0.0] * (len(self.limites) + 2))
+      for indice, limite in enumerate(self.limites):
+        if valor <= limite:
+          serie[indice] += 1
+          break
+      serie[-2] += valor
+      serie[-1] += 1
+
+  def contagem(self, **rotulos: Any) -> int:
+    serie = self._series.get(tuple(sorted((nome, str(v)) for nome, v in rotulos.items())))
+    return int(serie[-1]) if serie else 0
+
+  def exportar(self) -> List[str]:
+    linhas = []
+    with self._trava:
+      for chave, serie in sorted(self._series.items()):
+        acumulado = 0.0
+        for limite, quantidade in zip(self.limites + (float("inf"),), serie[:-2] + [serie[-1] - sum(serie[:-2])]):
+          acumulado += quantidade
+          linhas.append(f"{self.nome}_bucket{_formatar_rotulos(chave, ('le', _formatar_numero(limite)))} {_formatar_numero(acumulado)}")
+        linhas.append(f"{self.nome}_sum{_formatar_rotulos(chave)} {_formatar_numero(serie[-2])}")
+        linhas.append(f"{self.nome}_count{_formatar_rotulos(chave)} {_formatar_numero(serie[-1])}")
+    return linhas
+
+
+# Um coletor devolve, no momento da exportação, medições de estado (tipo `gauge`):
+# (nome, descrição, [(rótulos, valor)]).
+Coletor = Callable[[], List[Tuple[str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+
+class RegistroMetricas:
+  """Reúne as métricas da aplicação e as exporta no formato de texto do Prometheus."""
+
+  def __init__(self):
+    self._metricas: Dict[str, Any] = {}
+    self._coletores: List[Coletor] = []
+
+  def contador(self, nome: str, descricao: str) -> Contador:
+    return self._metricas.setdefault(nome, Contador(nome, descricao))
+
+  def histograma(self, nome: str, descricao: str, limites: Tuple[float, ...] = LIMITES_DURACAO) -> Histograma:
+    return self._metricas.setdefault(nome, Histograma(nome, descricao, limites))
+
+  def registrar_coletor(self, coletor: Coletor) -> None:
+    self._coletores.append(coletor)
+
+  def exportar(self) -> str:
+    linhas: List[str] = []
+    for metrica in self._metricas.values():
+      linhas += [f"# HELP {metrica.nome} {metrica.descricao}", f"# TYPE {metrica.nome} {metrica.tipo}"]
+      linhas += metrica.exportar()
+    for coletor in self._coletores:
+      try:
+        medicoes = coletor()
+      except Exception as e:
+        print(f"AVISO: coletor de métricas falhou: {e}")
+        continue
+      for nome, descricao, valores in medicoes:
+        linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} gauge"]
+        for rotulos, valor in valores:
+          chave = tuple(sorted((k, str(v)) for k, v in rotulos.items()))
+          linhas.append(f"{nome}{_formatar_rotulos(chave)} {_formatar_numero(valor)}")
+    return "\n".join(linhas) + "\n"
+
+
+registro_metricas = RegistroMetricas()
+
+DURACAO_REQUISICOES = registro_metricas.histograma(
+  "api_requisicao_duracao_segundos", "Duração das requisições HTTP por rota, método e status."
+)
+DURACAO_ETAPAS = registro_metricas.histograma(
+  "api_etapa_duracao_segundos", "Duração de cada etapa instrumentada (download, leitura, BigQuery...)."
+)
+BYTES_BAIXADOS_ONS = registro_metricas.contador("ons_download_bytes_total", "Bytes baixados da ONS.")
+LINHAS_PROCESSADAS = registro_metricas.contador(
+  "ons_linhas_processadas_total", "Linhas lidas dos arquivos da ONS, por recurso."
+)
+BYTES_PROCESSADOS_BIGQUERY = registro_metricas.contador(
+  "bigquery_bytes_processados_total", "Bytes processados pelas consultas no BigQuery."
+)
+
+
+class Rastreamento:
+  """Etapas cronometradas de uma requisição ou de um job, na ordem em que começaram."""
+
+  def __init__(self, nome: str):
+    self.nome = nome
+    self.id = uuid.uuid4().hex[:16]
+    self.inicio = time.perf_counter()
+    self.etapas: List[Dict[str, Any]] = []
+    self._trava = threading.Lock()
+
+  def adicionar(self, etapa: Dict[str, Any]) -> None:
+    with self._trava:
+      self.etapas.append(etapa)
+
+  def resumo(self) -> List[Dict[str, Any]]:
+    with self._trava:
+      return [dict(etapa) for etapa in self.etapas]
+
+  def server_timing(self) -> str:
+    """Cabeçalho Server-Timing com o total de cada etapa concluída até agora."""
+    totais: Dict[str, float] = {}
+    with self._trava:
+      for etapa in self.etapas:
+        if etapa.get("duracao_ms") is not None:
+          totais[etapa["etapa"]] = totais.get(etapa["etapa"], 0.0) + etapa["duracao_ms"]
+    return ", ".join(f"{nome};dur={duracao:.1f}" for nome, duracao in totais.items())
+
+
+_rastreamento_atual: contextvars.ContextVar[Optional[Rastreamento]] = contextvars.ContextVar(
+  "rastreamento_atual", default=None
+)
+_etapa_atual: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("etapa_atual", default=None)
+
+
+def rastreamento_atual() -> Optional[Rastreamento]:
+  return _rastreamento_atual.get()
+
+
+@contextmanager
+def rastrear(nome: str) -> Iterator[Rastreamento]:
+  """Abre um rastreamento novo para o contexto atual (e as tarefas e threads criadas a partir dele)."""
+  rastreamento = Rastreamento(nome)
+  token = _rastreamento_atual.set(rastreamento)
+  try:
+    yield rastreamento
+  finally:
+    _rastreamento_atual.reset(token)
+
+
+@contextmanager
+def etapa(nome: str, **atributos: Any) -> Iterator[Dict[str, Any]]:
+  """
+  Cronometra um trecho: a duração vai para o histograma `api_etapa_duracao_segundos` e, se houver
+  um rastreamento no contexto, a etapa entra nele com os atributos (recurso, bytes, linhas...).
+  Atributos conhecidos só no fim podem ser acrescentados ao dicionário devolvido ou com `anotar`.
+  """
+  rastreamento = _rastreamento_atual.get()
+  registro = {"etapa": nome, **atributos, "inicio_ms": None, "duracao_ms": None}
+  if rastreamento is not None:
+    registro["inicio_ms"] = round((time.perf_counter() - rastreamento.inicio) * 1000, 1)
+    rastreamento.adicionar(registro)
+  token = _etapa_atual.set(registro)
+  inicio = time.perf_counter()
+  try:
+    yield registro
+  except BaseException:
+    registro["erro"] = True
+    raise
+  finally:
+    duracao = time.perf_counter() - inicio
+    registro["duracao_ms"] = round(duracao * 1000, 1)
+    _etapa_atual.reset(token)
+    DURACAO_ETAPAS.observar(duracao, etapa=nome)
+
+
+def anotar(**atributos: Any) -> None:
+  """Acrescenta atributos à etapa em andamento no contexto atual, se houver."""
+  registro = _etapa_atual.get()
+  if registro is not None:
+    registro.update(atributos)
+
+
+def registrar_etapa(nome: str, duracao: float, **atributos: Any) -> None:
+  """Registra uma etapa medida por fora de `etapa` (por exemplo, por diferença entre dois tempos)."""
+  DURACAO_ETAPAS.observar(duracao, etapa=nome)
+  rastreamento = _rastreamento_atual.get()
+  if rastreamento is not None:
+    rastreamento.adicionar({"etapa": nome, **atributos, "duracao_ms": round(duracao * 1000, 1)})
+
+
+# Duração de cada fase da subida da API (importação dos módulos, criação dos clientes de nuvem).
+_duracoes_inicializacao: Dict[str, float] = {}
+
+
+def registrar_inicializacao(fase: str, duracao: float) -> None:
+  """Guarda a duração de uma fase da inicialização, exportada no gauge `api_inicializacao_segundos`."""
+  _duracoes_inicializacao[fase] = duracao
+  print(f"Inicialização: {fase} em {duracao * 1000:.0f} ms.")
+
+
+def _coletar_inicializacao() -> list:
+  if not _duracoes_inicializacao:
+    return []
+  return [(
+    "api_inicializacao_segundos", "Duração de cada fase da inicialização da API.",
+    [({"fase": fase}, duracao) for fase, duracao in _duracoes_inicializacao.items()],
+  )]
+
+
+registro_metricas.registrar_coletor(_coletar_inicializacao)
+
+
+# Medição do endpoint da requisição corrente: as durações e quando ele terminou.
+_medicao_endpoint: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+  "medicao_endpoint", default=None
+)
+
+
+def _cronometrar_endpoint(endpoint: Callable) -> Callable:
+  """Envolve o endpoint para registrar quanto da requisição foi gasto nele."""
+  def registrar(inicio: float) -> None:
+    medicao = _medicao_endpoint.get()
+    if medicao is not None:
+      medicao["fim"] = time.perf_counter()
+      medicao["duracoes"].append(medicao["fim"] - inicio)
+
+  if asyncio.iscoroutinefunction(endpoint):
+    @functools.wraps(endpoint)
+    async def cronometrado(*args, **kwargs):
+      inicio = time.perf_counter()
+      try:
+        return await endpoint(*args, **kwargs)
+      finally:
+        registrar(inicio)
+  else:
+    @functools.wraps(endpoint)
+    def cronometrado(*args, **kwargs):
+      inicio = time.perf_counter()
+      try:
+        return endpoint(*args, **kwargs)
+      finally:
+        registrar(inicio)
+  return cronometrado
+
+
+@functools.lru_cache(maxsize=None)
+def _cronometrar_resposta(classe: type) -> type:
+  """
+  Subclasse da classe de resposta da rota que registra a etapa `serializacao` ao renderizar o
+  corpo: do fim do endpoint até o corpo pronto, ou seja, a validação pelo `response_model`, o
+  `jsonable_encoder` e a codificação do JSON.
+  """
+  def render(self, content: Any) -> bytes:
+    corpo = classe.render(self, content)
+    medicao = _medicao_endpoint.get()
+    if medicao is not None and medicao.get("fim") is not None:
+      registrar_etapa("serializacao", time.perf_counter() - medicao["fim"])
+    return corpo
+
+  return type(classe.__name__, (classe,), {"render": render, "__doc__": classe.__doc__})
+
+
+class RotaInstrumentada(APIRoute):
+  """
+  Rota do FastAPI que separa o tempo do endpoint (etapa `endpoint`) do tempo que o FastAPI gasta
+  validando e serializando o retorno dele (etapa `serializacao`, medida na renderização da
+  resposta). A leitura e validação da requisição e as dependências não entram em nenhuma das
+  duas. Endpoints que já devolvem uma Response não passam pela serialização do FastAPI; a
+  codificação delas (RespostaJSONRapida e as respostas em streaming) registra a própria etapa
+  `serializacao`.
+  """
+
+  def __init__(self, path: str, endpoint: Callable, **opcoes: Any):
+    classe = opcoes.get("response_class", Default(JSONResponse))
+    if isinstance(classe, DefaultPlaceholder):
+      opcoes["response_class"] = Default(_cronometrar_resposta(classe.value))
+    else:
+      opcoes["response_class"] = _cronometrar_resposta(classe)
+    super().__init__(path, _cronometrar_endpoint(endpoint), **opcoes)
+
+  def get_route_handler(self) -> Callable:
+    tratar = super().get_route_handler()
+
+    async def tratar_instrumentado(request):
+      medicao = {"duracoes": [], "fim": None}
+      token = _medicao_endpoint.set(medicao)
+      try:
+        return await tratar(request)
+      finally:
+        _medicao_endpoint.reset(token)
+        if medicao["duracoes"]:
+          registrar_etapa("endpoint", sum(medicao["duracoes"]))
+
+    return tratar_instrumentado
+
+
+class MiddlewareMetricas:
+  """
+  Middleware ASGI que abre um rastreamento por requisição, mede a duração por rota (incluindo o
+  envio de respostas em streaming), devolve as etapas no cabeçalho Server-Timing e registra em
+  log, como JSON, as requisições mais lentas que METRICAS_LIMIAR_LOG_MS.
+
+  Com PERFIL_HABILITADO, `?perfil=1` (ou o cabeçalho `X-Perfil: 1`) executa a requisição sob o
+  cProfile; o arquivo .prof é gravado em PERFIL_DIRETORIO e indicado no cabeçalho `X-Perfil-Arquivo`.
+  O cProfile mede a thread do event loop enquanto a requisição está aberta: inclui as corrotinas
+  de outras requisições que rodarem nesse meio-tempo e não inclui o trabalho feito em threads
+  (`asyncio.to_thread`, endpoints síncronos).
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    status = 500
+    perfil = cProfile.Profile() if PERFIL_HABILITADO and _perfil_solicitado(scope) else None
+    arquivo_perfil = None
+    if perfil is not None:
+      os.makedirs(DIRETORIO_PERFIS, exist_ok=True)
+      arquivo_perfil = os.path.join(DIRETORIO_PERFIS, f"{int(time.time())}-{uuid.uuid4().hex[:8]}.prof")
+
+    with rastrear(f"{scope['method']} {scope['path']}") as rastreamento:
+      async def enviar(mensagem):
+        nonlocal status
+        if mensagem["type"] == "http.response.start":
+          status = mensagem["status"]
+          cabecalhos = MutableHeaders(scope=mensagem)
+          cabecalhos.append("X-Rastreamento-Id", rastreamento.id)
+          if rastreamento.etapas:
+            cabecalhos.append("Server-Timing", rastreamento.server_timing())
+          if arquivo_perfil:
+            cabecalhos.append("X-Perfil-Arquivo", arquivo_perfil)
+        await send(mensagem)
+
+      if perfil is not None:
+        perfil.enable()
+      try:
+        await self.app(scope, receive, enviar)
+      finally:
+        if perfil is not None:
+          perfil.disable()
+          perfil.dump_stats(arquivo_perfil)
+          _imprimir_perfil(perfil, arquivo_perfil)
+        duracao = time.perf_counter() - rastreamento.inicio
+        rota = getattr(scope.get("route"), "path", None) or "nao_encontrada"
+        DURACAO_REQUISICOES.observar(duracao, metodo=scope["method"], rota=rota, status=status)
+        if duracao * 1000 >= LIMIAR_LOG_REQUISICAO_MS:
+          print(json.dumps({
+            "rastreamento": rastreamento.id,
+            "requisicao": rastreamento.nome,
+            "status": status,
+            "duracao_ms": round(duracao * 1000, 1),
+            "etapas": rastreamento.resumo(),
+          }, default=str, ensure_ascii=False))
+
+
+def _perfil_solicitado(scope) -> bool:
+  consulta = scope.get("query_string", b"").decode("latin-1")
+  if any(parte in ("perfil=1", "perfil=true") for parte in consulta.split("&")):
+    return True
+  return any(nome == b"x-perfil" and valor in (b"1", b"true") for nome, valor in scope.get("headers", []))
+
+
+def _imprimir_perfil(perfil: cProfile.Profile, arquivo: str) -> None:
+  saida = io.StringIO()
+  pstats.Stats(perfil, stream=saida).sort_stats("cumulative").print_stats(15)
+  print(f"Perfil da requisição gravado em {arquivo}:\n{saida.getvalue()}")
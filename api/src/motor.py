@@ -0,0 +1,74 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from typing import Optional
+
+import pyarrow as pa
+
+import leitura
+
+# Configurações do motor de leitura dos arquivos da ONS
+BACKEND_MOTOR = os.getenv("MOTOR_PROCESSAMENTO", "arrow")
+MAXIMO_WORKERS_MOTOR = int(os.getenv("MOTOR_MAX_WORKERS", str(os.cpu_count() or 1)))
+
+BACKENDS_MOTOR = ("threads", "processos", "arrow")
+
+
+class MotorProcessamento:
+  """
+  Executa a leitura e conversão dos arquivos da ONS com um número limitado de workers.
+
+  - "threads": leitores do pandas em um pool de threads (limitado pelo GIL).
+  - "processos": leitores do pandas em um pool de processos; cada worker devolve a tabela em
+    Arrow IPC, e não uma lista de dicts serializada com pickle.
+  - "arrow": leitor de CSV nativo do Arrow, em fluxo e fora do GIL.
+
+  O download não passa pelo motor: é assíncrono, feito pelo `cliente_ons` no event loop; só a
+  leitura dos arquivos já em disco roda nos workers.
+  """
+
+  def __init__(self, backend: str = BACKEND_MOTOR, maximo_workers: int = MAXIMO_WORKERS_MOTOR):
+    if backend not in BACKENDS_MOTOR:
+      raise ValueError(f"Backend do motor desconhecido: {backend}. Use um de {BACKENDS_MOTOR}.")
+    self.backend = backend
+    self.maximo_workers = max(1, maximo_workers)
+    self._executor: Optional[Executor] = None
+
+  @property
+  def executor(self) -> Executor:
+    if self._executor is None:
+      if self.backend == "processos":
+        # "spawn" evita herdar travas de threads do processo principal, como faria o fork.
+        self._executor = ProcessPoolExecutor(
+          max_workers=self.maximo_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+      else:
+        self._executor = ThreadPoolExecutor(
+          max_workers=self.maximo_workers, thread_name_prefix="motor-ons"
+        )
+    return self._executor
+
+  async def ler(self, caminho: str, formato: str, data_inicio: date, data_fim: date) -> pa.Table:
+    """Lê um arquivo da ONS, já filtrado pelo intervalo, no backend configurado."""
+    loop = asyncio.get_running_loop()
+    if self.backend == "processos":
+      conteudo = await loop.run_in_executor(
+        self.executor, leitura.ler_arquivo_em_ipc, caminho, formato, data_inicio, data_fim, "pandas"
+      )
+      return leitura.tabela_de_ipc(conteudo)
+
+    leitor = "arrow" if self.backend == "arrow" else "pandas"
+    return await loop.run_in_executor(
+      self.executor, leitura.ler_arquivo_em_tabela, caminho, formato, data_inicio, data_fim, leitor
+    )
+
+  def encerrar(self) -> None:
+    """Libera os workers; um novo pool é criado se o motor voltar a ser usado."""
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
+
+
+motor_processamento = MotorProcessamento()
@@ -0,0 +1,157 @@
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from esquema import ESQUEMA_ARROW_ENA
+
+# Regras do dicionário de dados (docs/engenharia-de-dados/pre_codigo_overview.md): colunas
+# numéricas não podem ser negativas e o código do reservatório também não pode ser zero.
+COLUNAS_NAO_ZERO = ("cod_resplanejamento",)
+
+
+def _converter_data(coluna: pa.ChunkedArray) -> pa.ChunkedArray:
+  """Converte a coluna de data para DATE; valores fora do formato YYYY-MM-DD viram nulos."""
+  if pa.types.is_date32(coluna.type):
+    return coluna
+  if pa.types.is_date(coluna.type) or pa.types.is_timestamp(coluna.type):
+    return coluna.cast(pa.date32())
+  texto = pc.utf8_slice_codeunits(coluna.cast(pa.string()), 0, 10)
+  return pc.strptime(texto, format="%Y-%m-%d", unit="s", error_is_null=True).cast(pa.date32())
+
+
+def _converter_numero(coluna: pa.ChunkedArray, tipo: pa.DataType) -> pa.ChunkedArray:
+  """Converte a coluna para o tipo numérico do schema; textos inválidos viram nulos."""
+  if pa.types.is_integer(coluna.type) or pa.types.is_floating(coluna.type):
+    try:
+      return coluna.cast(tipo)
+    except pa.ArrowInvalid:
+      # Ex.: float com casas decimais em uma coluna INT64.
+      pass
+  # Caminho raro (textos com vírgula decimal): o pandas só é importado quando chega aqui.
+  import pandas as pd
+  texto = pc.replace_substring(coluna.cast(pa.string()), ",", ".")
+  numeros = pd.to_numeric(pd.Series(texto.to_pandas()), errors="coerce")
+  if pa.types.is_integer(tipo):
+    numeros = numeros.where(numeros % 1 == 0).astype("Int64")
+  return pa.chunked_array([pa.array(numeros, type=tipo, from_pandas=True)])
+
+
+def _converter_coluna(coluna: pa.ChunkedArray, campo: pa.Field) -> pa.ChunkedArray:
+  tipo = campo.type
+  if pa.types.is_dictionary(tipo):
+    return pc.dictionary_encode(coluna.cast(tipo.value_type)).cast(tipo)
+  if pa.types.is_date32(tipo):
+    return _converter_data(coluna)
+  if pa.types.is_integer(tipo) or pa.types.is_floating(tipo):
+    return _converter_numero(coluna, tipo)
+  return coluna.cast(tipo)
+
+
+def validar_tabela(tabela: pa.Table) -> Dict[str, Any]:
+  """
+  Aplica as regras de validação do schema sobre colunas inteiras e mede a completude.
+
+  Retorna o total de registros, a taxa de preenchimento de cada coluna, as violações por
+  coluna (nulos em colunas obrigatórias, negativos e zeros não permitidos) e quantas linhas
+  têm ao menos uma violação.
+  """
+  total = tabela.num_rows
+  completude: Dict[str, float] = {}
+  violacoes: Dict[str, Dict[str, int]] = {}
+  linhas_invalidas: Optional[pa.ChunkedArray] = None
+
+  for campo in ESQUEMA_ARROW_ENA:
+    if campo.name not in tabela.column_names:
+      continue
+    coluna = tabela.column(campo.name)
+    nulos = coluna.null_count
+    completude[campo.name] = round(1 - nulos / total, 4) if total else 1.0
+
+    mascaras: Dict[str, pa.ChunkedArray] = {}
+    if not campo.nullable and nulos:
+      mascaras["nulos"] = pc.is_null(coluna)
+    if pa.types.is_integer(campo.type) or pa.types.is_floating(campo.type):
+      mascaras["negativos"] = pc.fill_null(pc.less(coluna, 0), False)
+      if campo.name in COLUNAS_NAO_ZERO:
+        mascaras["zeros"] = pc.fill_null(pc.equal(coluna, 0), False)
+
+    contagens = {}
+    for regra, mascara in mascaras.items():
+      quantidade = pc.sum(mascara).as_py() or 0
+      if quantidade:
+        contagens[regra] = quantidade
+        linhas_invalidas = mascara if linhas_invalidas is None else pc.or_(linhas_invalidas, mascara)
+    if contagens:
+      violacoes[campo.name] = contagens
+
+  return {
+    "total_registros": total,
+    "completude": completude,
+    "violacoes": violacoes,
+    "linhas_invalidas": 0 if linhas_invalidas is None else pc.sum(linhas_invalidas).as_py(),
+  }
+
+
+def normalizar_tabela(
+    tabela: pa.Table, arquivo_origem: str, momento_ingestao: Optional[datetime] = None
+) -> Tuple[pa.Table, Dict[str, Any]]:
+  """
+  Converte a tabela lida de um arquivo da ONS para o schema da `ena_consolidado`.
+
+  As colunas recebem os tipos do schema (DATE, INT64, FLOAT), os textos de baixa cardinalidade
+  viram colunas de dicionário, colunas ausentes são criadas vazias e as demais são descartadas.
+  `file_source` e `ingestion_timestamp` são preenchidas a partir de `arquivo_origem` e de
+  `momento_ingestao` (agora, por padrão). Retorna a tabela tipada e o relatório de
+  `validar_tabela`; linhas inválidas são mantidas, apenas contadas.
+  """
+  momento_ingestao = momento_ingestao or datetime.now(timezone.utc)
+  total = tabela.num_rows
+  colunas: List[pa.ChunkedArray] = []
+
+  for campo in ESQUEMA_ARROW_ENA:
+    if campo.name == "file_source":
+      coluna = pa.chunked_array([pa.repeat(pa.scalar(arquivo_origem, campo.type), total)])
+    elif campo.name == "ingestion_timestamp":
+      coluna = pa.chunked_array([pa.repeat(pa.scalar(momento_ingestao, campo.type), total)])
+    elif campo.name in tabela.column_names:
+      coluna = _converter_coluna(tabela.column(campo.name), campo)
+    else:
+      coluna = pa.chunked_array([pa.nulls(total, type=campo.type)])
+    colunas.append(coluna)
+
+  # O schema sem as restrições de nulidade: violações são reportadas, e não rejeitadas aqui.
+  esquema = pa.schema([campo.with_nullable(True) for campo in ESQUEMA_ARROW_ENA])
+  tabela_tipada = pa.Table.from_arrays(colunas, schema=esquema)
+  return tabela_tipada, validar_tabela(tabela_tipada)
+
+
+def remover_linhas_incompletas(tabela: pa.Table) -> Tuple[pa.Table, int]:
+  """
+  Remove as linhas com nulos em colunas obrigatórias do schema, que fariam o BigQuery rejeitar
+  a carga inteira. Retorna a tabela filtrada e quantas linhas foram descartadas.
+  """
+  mascara = None
+  for campo in ESQUEMA_ARROW_ENA:
+    if campo.nullable or campo.name not in tabela.column_names:
+      continue
+    if not tabela.column(campo.name).null_count:
+      continue
+    validas = pc.is_valid(tabela.column(campo.name))
+    mascara = validas if mascara is None else pc.and_(mascara, validas)
+  if mascara is None:
+    return tabela, 0
+  filtrada = tabela.filter(mascara)
+  return filtrada, tabela.num_rows - filtrada.num_rows
+
+
+def resumir_relatorio(relatorio: Dict[str, Any]) -> str:
+  """Resumo de uma linha do relatório de qualidade, para os logs do processamento."""
+  incompletas = {
+    coluna: taxa for coluna, taxa in relatorio["completude"].items() if taxa < 1
+  }
+  return (
+    f"{relatorio['total_registros']} registros, {relatorio['linhas_invalidas']} com violações "
+    f"{relatorio['violacoes'] or ''}; colunas incompletas: {incompletas or 'nenhuma'}"
+  )
@@ -1,37 +1,105 @@
 import asyncio
+import os
 from datetime import date
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Optional
+
+import pyarrow as pa
 
 import service
+from catalogo import catalogo_ons
+from leitura import concatenar_tabelas
 
+# Recursos processados ao mesmo tempo pelo /processar em streaming.
+MAXIMO_RECURSOS_EM_ANDAMENTO = int(os.getenv("FLUXO_MAX_RECURSOS_EM_ANDAMENTO", "4"))
 
-async def executar_fluxo(data_inicio: date, data_fim: date) -> List[Dict[str, Any]]:
-  """
-  Orquestra todo o fluxo de trabalho para o intervalo de datas, retornando todos os dados.
-  """
-  print("Buscando a lista de recursos da ONS...")
-  todos_os_recursos = await service.obter_recursos_ons()
-  if not todos_os_recursos:
-    print("Não foi possível obter os recursos da ONS.")
-    return []
 
-  print("Filtrando pelo melhor formato disponível...")
-  recursos_para_processar = service.filtrar_recursos_por_ano_e_formato(
-    todos_os_recursos, data_inicio, data_fim
-  )
+async def _obter_recursos_para_processar(data_inicio: date, data_fim: date) -> List[Dict[str, Any]]:
+  """Seleciona, pelo catálogo em memória, o melhor recurso da ONS para cada ano do intervalo."""
+  print("Consultando o catálogo de recursos da ONS...")
+  recursos_para_processar = await catalogo_ons.recursos_para_intervalo(data_inicio, data_fim)
+
+  if not recursos_para_processar:
+    if catalogo_ons.indice is None:
+      print("Não foi possível obter os recursos da ONS.")
+    else:
+      print(f"Nenhum recurso encontrado para o período solicitado.")
+  return recursos_para_processar
 
+
+async def executar_fluxo(
+    data_inicio: date,
+    data_fim: date,
+    ao_progredir: Optional[Callable[[Dict[str, Any], str, int], Awaitable[None]]] = None,
+) -> pa.Table:
+  """
+  Orquestra todo o fluxo de trabalho para o intervalo de datas, retornando todos os dados em uma
+  única tabela Arrow. A conversão para dicts fica a cargo de quem consome cada página.
+
+  Se `ao_progredir` for informado, ele é aguardado com (recurso, status, registros) quando a
+  lista de recursos é definida ("pendente") e quando cada recurso termina ("concluido" ou "erro").
+  """
+  recursos_para_processar = await _obter_recursos_para_processar(data_inicio, data_fim)
   if not recursos_para_processar:
-    print(f"Nenhum recurso encontrado para o período solicitado.")
-    return []
+    return pa.table({})
 
   print(f"Encontrados {len(recursos_para_processar)} recursos. Iniciando processamento paralelo...")
 
-  # Cria uma lista de tarefas para serem executadas de forma concorrente.
-  tarefas = [service.processar_recurso(res) for res in recursos_para_processar]
+  async def processar_e_notificar(recurso: Dict[str, Any]) -> Optional[pa.Table]:
+    tabela = await service.processar_recurso(recurso, data_inicio, data_fim)
+    if ao_progredir:
+      if tabela is None:
+        await ao_progredir(recurso, "erro", 0)
+      else:
+        await ao_progredir(recurso, "concluido", tabela.num_rows)
+    return tabela
+
+  if ao_progredir:
+    for recurso in recursos_para_processar:
+      await ao_progredir(recurso, "pendente", 0)
+
+  # Cria uma lista de tarefas para serem executadas de forma concorrente. Os downloads são
+  # limitados pelo cliente da ONS e a leitura pelos workers do motor, então um intervalo longo
+  # não dispara todos os arquivos de uma vez.
+  tarefas = [processar_e_notificar(res) for res in recursos_para_processar]
   resultados = await asyncio.gather(*tarefas)
 
-  # "Achata" a lista de listas de resultados em uma única lista de registros.
-  todos_os_registros = [registro for lista_resultado in resultados for registro in lista_resultado if lista_resultado]
+  # Junta as tabelas de cada ano em uma só, sem copiar os buffers de cada coluna.
+  tabela_final = concatenar_tabelas(resultados)
+
+  print(f"Fluxo de trabalho concluído. Total de {tabela_final.num_rows} registros processados.")
+  return tabela_final
+
+
+async def iterar_fluxo(data_inicio: date, data_fim: date) -> AsyncIterator[pa.Table]:
+  """
+  Executa o mesmo fluxo de `executar_fluxo`, mas entrega os registros de cada recurso assim que
+  ele termina de ser processado, em vez de esperar pelo intervalo completo.
+
+  No máximo MAXIMO_RECURSOS_EM_ANDAMENTO recursos ficam em processamento (ou prontos, à espera
+  do consumidor) ao mesmo tempo: o próximo só começa quando um resultado é entregue, então um
+  cliente lento não faz o intervalo inteiro se acumular em memória.
+  """
+  recursos_para_processar = await _obter_recursos_para_processar(data_inicio, data_fim)
+  if not recursos_para_processar:
+    return
 
-  print(f"Fluxo de trabalho concluído. Total de {len(todos_os_registros)} registros processados.")
-  return todos_os_registros
+  print(f"Encontrados {len(recursos_para_processar)} recursos. Iniciando processamento em streaming...")
+  pendentes = iter(recursos_para_processar)
+  em_andamento = set()
+  try:
+    while True:
+      for recurso in pendentes:
+        em_andamento.add(asyncio.ensure_future(service.processar_recurso(recurso, data_inicio, data_fim)))
+        if len(em_andamento) >= MAXIMO_RECURSOS_EM_ANDAMENTO:
+          break
+      if not em_andamento:
+        return
+      concluidas, em_andamento = await asyncio.wait(em_andamento, return_when=asyncio.FIRST_COMPLETED)
+      for tarefa in concluidas:
+        tabela = tarefa.result()
+        if tabela is not None and tabela.num_rows:
+          yield tabela
+  finally:
+    # Se o cliente desconectar no meio do stream, não há mais quem consuma os resultados.
+    for tarefa in em_andamento:
+      tarefa.cancel()
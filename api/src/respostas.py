@@ -0,0 +1,252 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from metricas import etapa
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+# Compressão das respostas JSON: corpos menores que o mínimo vão sem compressão.
+TAMANHO_MINIMO_COMPRESSAO = int(os.getenv("RESPOSTA_COMPRESSAO_MINIMO_BYTES", "1024"))
+NIVEL_GZIP = int(os.getenv("RESPOSTA_NIVEL_GZIP", "6"))
+NIVEL_BROTLI = int(os.getenv("RESPOSTA_NIVEL_BROTLI", "4"))
+MAXIMO_ETAGS_EM_MEMORIA = int(os.getenv("RESPOSTA_MAXIMO_ETAGS", "4096"))
+
+OPCOES_ORJSON = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+NULO_JSON = "null"
+
+
+def _converter_desconhecido(valor: Any) -> Any:
+  """Tipos que o orjson não conhece: NUMERIC do BigQuery vira número; o resto, texto."""
+  if isinstance(valor, Decimal):
+    return float(valor)
+  return str(valor)
+
+
+def _codificar_valor(valor: Any) -> bytes:
+  return orjson.dumps(valor, default=_converter_desconhecido, option=OPCOES_ORJSON)
+
+
+def _valores_json(coluna: pa.ChunkedArray) -> pa.ChunkedArray:
+  """
+  Cada valor da coluna já codificado em JSON, como texto. Números são formatados pelo Arrow
+  (NaN e infinitos viram null); textos, datas e horários são codificados uma vez por valor
+  distinto e replicados pelos índices do dicionário.
+  """
+  tipo = coluna.type
+  if pa.types.is_integer(tipo):
+    texto = coluna.cast(pa.string())
+  elif pa.types.is_floating(tipo):
+    texto = coluna.cast(pa.string())
+    # O Arrow escreve 100.0 como "100"; o ".0" mantém o valor como float para quem lê.
+    texto = pc.if_else(pc.match_substring_regex(texto, r"^-?\d+$"), pc.binary_join_element_wise(texto, ".0", ""), texto)
+    texto = pc.if_else(pc.is_finite(coluna), texto, pa.scalar(None, pa.string()))
+  elif pa.types.is_boolean(tipo):
+    texto = pc.if_else(coluna, "true", "false")
+  else:
+    try:
+      dicionarios = coluna if pa.types.is_dictionary(tipo) else pc.dictionary_encode(coluna)
+    except pa.ArrowNotImplementedError:
+      # Tipos aninhados (listas, structs): um valor por vez.
+      return pa.chunked_array([pa.array(
+        [_codificar_valor(valor).decode() for valor in coluna.to_pylist()], pa.string()
+      )])
+    pedacos = []
+    for pedaco in dicionarios.chunks:
+      valores = [_codificar_valor(valor).decode() for valor in pedaco.dictionary.to_pylist()]
+      pedacos.append(pa.array(valores, pa.string()).take(pedaco.indices))
+    texto = pa.chunked_array(pedacos, pa.string())
+  return pc.fill_null(texto, NULO_JSON)
+
+
+def tabela_para_linhas_json(tabela: pa.Table) -> pa.Array:
+  """Um objeto JSON por linha da tabela, montados coluna a coluna pelo Arrow, sem criar dicts."""
+  if not tabela.num_columns:
+    return pa.array(["{}"] * tabela.num_rows, pa.string())
+  partes = []
+  for indice, nome in enumerate(tabela.column_names):
+    partes += [("{" if indice == 0 else ",") + _codificar_valor(nome).decode() + ":", _valores_json(tabela.column(nome))]
+  linhas = pc.binary_join_element_wise(*partes, "}", "")
+  return linhas.combine_chunks() if isinstance(linhas, pa.ChunkedArray) else linhas
+
+
+def juntar_linhas(linhas: pa.Array, separador: str) -> bytes:
+  """Concatena as linhas com `separador` em um único buffer, também dentro do Arrow."""
+  if not len(linhas):
+    return b""
+  lista = pa.ListArray.from_arrays(pa.array([0, len(linhas)], pa.int32()), linhas)
+  return pc.binary_join(lista, separador)[0].as_buffer().to_pybytes()
+
+
+def tabela_para_json(tabela: pa.Table) -> bytes:
+  """A tabela como um array JSON de objetos, o mesmo que `orjson.dumps(tabela.to_pylist())`."""
+  return b"[" + juntar_linhas(tabela_para_linhas_json(tabela), ",") + b"]"
+
+
+def codificar_json(valor: Any) -> bytes:
+  """
+  Codifica `valor` com o orjson. Tabelas Arrow, soltas ou como valores de um dict (o envelope
+  das respostas paginadas), passam por `tabela_para_json` em vez de virar listas de dicts.
+  """
+  if isinstance(valor, pa.Table):
+    return tabela_para_json(valor)
+  if isinstance(valor, dict) and any(isinstance(item, pa.Table) for item in valor.values()):
+    campos = [_codificar_valor(str(chave)) + b":" + codificar_json(item) for chave, item in valor.items()]
+    return b"{" + b",".join(campos) + b"}"
+  return _codificar_valor(valor)
+
+
+def calcular_etag(conteudo: bytes) -> str:
+  """ETag fraco do conteúdo: vale para todas as codificações (gzip, br) da mesma resposta."""
+  return f'W/"{hashlib.blake2b(conteudo, digest_size=16).hexdigest()}"'
+
+
+def etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+  """Comparação fraca do If-None-Match (lista de ETags ou `*`) com o ETag atual."""
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == "*":
+    return True
+  atual = etag.removeprefix("W/")
+  return any(candidato.strip().removeprefix("W/") == atual for candidato in if_none_match.split(","))
+
+
+def escolher_codificacao(accept_encoding: Optional[str]) -> Optional[str]:
+  """Escolhe "br" (se o pacote brotli estiver instalado) ou "gzip" pelo Accept-Encoding."""
+  aceitas: Dict[str, float] = {}
+  for item in (accept_encoding or "").split(","):
+    nome, _, parametros = item.strip().partition(";")
+    qualidade = 1.0
+    if parametros.strip().startswith("q="):
+      try:
+        qualidade = float(parametros.strip()[2:])
+      except ValueError:
+        qualidade = 0.0
+    if nome:
+      aceitas[nome.strip().lower()] = qualidade
+  for codificacao in ("br", "gzip") if brotli is not None else ("gzip",):
+    if aceitas.get(codificacao, aceitas.get("*", 0.0)) > 0:
+      return codificacao
+  return None
+
+
+def comprimir(conteudo: bytes, codificacao: str) -> bytes:
+  if codificacao == "br":
+    return brotli.compress(conteudo, quality=NIVEL_BROTLI)
+  return gzip.compress(conteudo, compresslevel=NIVEL_GZIP)
+
+
+def resposta_nao_modificada(etag: str) -> Response:
+  return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+
+class RespostaJSONRapida(Response):
+  """
+  Resposta JSON que dispensa a validação por modelo e o `jsonable_encoder` do FastAPI: o conteúdo
+  (dicts, listas e tabelas Arrow) é codificado direto em bytes por `codificar_json`.
+
+  A codificação acontece no envio, em uma thread, e é registrada na etapa `serializacao`. Em GET,
+  a resposta leva um ETag do conteúdo e vira 304 se ele estiver no If-None-Match; `ao_gerar_etag`
+  recebe o ETag calculado. O corpo é comprimido com br ou gzip conforme o Accept-Encoding.
+  """
+
+  media_type = "application/json"
+
+  def __init__(
+      self,
+      conteudo: Any,
+      status_code: int = 200,
+      headers: Optional[Dict[str, str]] = None,
+      ao_gerar_etag: Optional[Callable[[str], None]] = None,
+  ):
+    self._conteudo = conteudo
+    self._ao_gerar_etag = ao_gerar_etag
+    super().__init__(content=b"", status_code=status_code, headers=headers)
+
+  def _preparar(self, requisicao: Headers, condicional: bool) -> Tuple[bytes, Dict[str, str]]:
+    corpo = codificar_json(self._conteudo)
+    cabecalhos = {"Vary": "Accept-Encoding"}
+    if condicional and self.status_code == 200:
+      etag = calcular_etag(corpo)
+      cabecalhos["ETag"] = etag
+      if self._ao_gerar_etag:
+        self._ao_gerar_etag(etag)
+      if etag_corresponde(requisicao.get("if-none-match"), etag):
+        self.status_code = 304
+        return b"", cabecalhos
+    codificacao = escolher_codificacao(requisicao.get("accept-encoding"))
+    if codificacao and len(corpo) >= TAMANHO_MINIMO_COMPRESSAO:
+      corpo = comprimir(corpo, codificacao)
+      cabecalhos["Content-Encoding"] = codificacao
+    return corpo, cabecalhos
+
+  async def __call__(self, scope, receive, send) -> None:
+    requisicao = Headers(scope=scope)
+    condicional = scope.get("method") in ("GET", "HEAD")
+    with etapa("serializacao", formato="json") as registro:
+      self.body, cabecalhos = await asyncio.to_thread(self._preparar, requisicao, condicional)
+      registro["bytes"] = len(self.body)
+    for nome, valor in cabecalhos.items():
+      self.headers[nome] = valor
+    if self.status_code == 304:
+      del self.headers["content-type"]
+      del self.headers["content-length"]
+    else:
+      self.headers["content-length"] = str(len(self.body))
+    await super().__call__(scope, receive, send)
+
+
+class MemoriaETags:
+  """
+  ETags das respostas de intervalos históricos, pela assinatura da requisição (rota e
+  parâmetros). Com eles, um If-None-Match repetido recebe 304 sem consultar o backend nem
+  codificar a resposta de novo. As entradas que se sobrepõem a um intervalo recarregado são
+  descartadas por `invalidar_intervalo`; acima de `maximo`, saem as usadas há mais tempo.
+  """
+
+  def __init__(self, maximo: int = MAXIMO_ETAGS_EM_MEMORIA):
+    self.maximo = maximo
+    self._etags: "OrderedDict[Hashable, Tuple[str, date, date]]" = OrderedDict()
+    self._trava = threading.Lock()
+
+  def obter(self, chave: Hashable) -> Optional[str]:
+    with self._trava:
+      entrada = self._etags.get(chave)
+      if entrada is None:
+        return None
+      self._etags.move_to_end(chave)
+      return entrada[0]
+
+  def guardar(self, chave: Hashable, etag: str, data_inicio: date, data_fim: date) -> None:
+    with self._trava:
+      self._etags[chave] = (etag, data_inicio, data_fim)
+      self._etags.move_to_end(chave)
+      while len(self._etags) > self.maximo:
+        self._etags.popitem(last=False)
+
+  def invalidar_intervalo(self, data_inicio: date, data_fim: date) -> None:
+    with self._trava:
+      for chave in [c for c, (_, inicio, fim) in self._etags.items() if inicio <= data_fim and fim >= data_inicio]:
+        del self._etags[chave]
+
+  def limpar(self) -> None:
+    with self._trava:
+      self._etags.clear()
+
+  def __len__(self) -> int:
+    return len(self._etags)
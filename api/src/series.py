@@ -0,0 +1,317 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import service
+from consultas import COLUNA_DATA_CONSULTA
+from esquema import ESQUEMA_ENA_CONSOLIDADO, COLUNA_DATA_ONS
+
+# Configurações do índice de séries em memória
+DIAS_HISTORICO_SERIES = int(os.getenv("SERIES_HISTORICO_DIAS", "1096"))
+INTERVALO_ATUALIZACAO_SERIES = float(os.getenv("SERIES_INTERVALO_ATUALIZACAO", "900"))
+INTERVALO_NOVA_TENTATIVA_SERIES = float(os.getenv("SERIES_INTERVALO_NOVA_TENTATIVA", "60"))
+
+# Colunas numéricas guardadas em cada série.
+COLUNAS_VALORES = [nome for nome, tipo, _ in ESQUEMA_ENA_CONSOLIDADO if tipo == "FLOAT"]
+# Textos que descrevem o reservatório, guardados uma vez por chave e não por linha.
+COLUNAS_METADADOS_RESERVATORIO = ("nom_reservatorio", "nom_subsistema", "nom_bacia", "nom_ree", "tip_reservatorio")
+
+Chave = Union[int, str]
+
+
+class Serie:
+  """
+  Série de uma chave (um reservatório ou um subsistema) em formato colunar: um array de datas
+  ordenado e um array NumPy por coluna de valores, todos com o mesmo comprimento.
+  """
+
+  __slots__ = ("datas", "colunas")
+
+  def __init__(self, datas: np.ndarray, colunas: Dict[str, np.ndarray]):
+    self.datas = datas
+    self.colunas = colunas
+
+  def __len__(self) -> int:
+    return len(self.datas)
+
+  def intervalo(self, data_inicio: date, data_fim: date) -> "Serie":
+    """Recorte [data_inicio, data_fim] por busca binária; os arrays são views, sem cópia."""
+    inicio = np.searchsorted(self.datas, np.datetime64(data_inicio, "D"), side="left")
+    fim = np.searchsorted(self.datas, np.datetime64(data_fim, "D"), side="right")
+    return Serie(self.datas[inicio:fim], {nome: valores[inicio:fim] for nome, valores in self.colunas.items()})
+
+  def _chaves_linha(self, desempate: Optional[str]) -> np.ndarray:
+    """Identificador de cada linha: o dia, ou o par (dia, `desempate`) em um único inteiro."""
+    dias = self.datas.astype("int64")
+    if desempate is None:
+      return dias
+    return dias * 1_000_000_000 + self.colunas[desempate]
+
+  def mesclar(self, nova: "Serie", desempate: Optional[str] = None) -> "Serie":
+    """
+    Junta uma série nova a esta. As linhas de `nova` substituem as do mesmo dia (ou do mesmo
+    dia e `desempate`, quando a série tem várias linhas por dia), então reaplicar a mesma carga
+    não duplica linhas. Linhas do mesmo dia são ordenadas por `desempate`.
+    """
+    manter = ~np.isin(self._chaves_linha(desempate), nova._chaves_linha(desempate))
+    datas = np.concatenate([self.datas[manter], nova.datas])
+    colunas = {
+      nome: np.concatenate([valores[manter], nova.colunas[nome]])
+      for nome, valores in self.colunas.items() if nome in nova.colunas
+    }
+    chaves_ordenacao = [datas] if desempate is None else [colunas[desempate], datas]
+    ordem = np.lexsort(chaves_ordenacao)
+    return Serie(datas[ordem], {nome: valores[ordem] for nome, valores in colunas.items()})
+
+
+def padronizar_tabela(tabela: pa.Table) -> pa.Table:
+  """Aceita tanto a tabela do backend (`ena_data`) quanto a normalizada da ONS (`ear_data`)."""
+  if COLUNA_DATA_CONSULTA not in tabela.column_names and COLUNA_DATA_ONS in tabela.column_names:
+    nomes = [COLUNA_DATA_CONSULTA if nome == COLUNA_DATA_ONS else nome for nome in tabela.column_names]
+    tabela = tabela.rename_columns(nomes)
+  if tabela.num_rows:
+    tabela = tabela.filter(pc.is_valid(tabela.column(COLUNA_DATA_CONSULTA)))
+  return tabela
+
+
+def _array_datas(coluna: pa.ChunkedArray) -> np.ndarray:
+  if not pa.types.is_date32(coluna.type):
+    coluna = coluna.cast(pa.date32())
+  return coluna.to_numpy().astype("datetime64[D]")
+
+
+def _agrupar(tabela: pa.Table, chaves: pa.ChunkedArray, colunas: List[str]) -> Dict[Chave, Serie]:
+  """
+  Separa a tabela em uma série por valor de `chaves` com uma única ordenação de toda a tabela
+  por (chave, data, cod_resplanejamento); cada série é uma fatia (view) dos arrays ordenados.
+  """
+  validas = pc.is_valid(chaves)
+  tabela, chaves = tabela.filter(validas), chaves.filter(validas)
+  if not tabela.num_rows:
+    return {}
+  if pa.types.is_dictionary(chaves.type):
+    chaves = chaves.cast(chaves.type.value_type)
+  codificadas = pc.dictionary_encode(chaves).combine_chunks()
+  codigos = codificadas.indices.to_numpy()
+  valores_chave = codificadas.dictionary.to_pylist()
+
+  datas = _array_datas(tabela.column(COLUNA_DATA_CONSULTA))
+  valores = {
+    nome: tabela.column(nome).to_numpy(zero_copy_only=False).astype(
+      "int64" if nome == "cod_resplanejamento" else "float64"
+    )
+    for nome in colunas if nome in tabela.column_names
+  }
+  desempate = valores.get("cod_resplanejamento", np.zeros(len(datas), "int64"))
+
+  ordem = np.lexsort((desempate, datas, codigos))
+  codigos, datas = codigos[ordem], datas[ordem]
+  valores = {nome: coluna[ordem] for nome, coluna in valores.items()}
+
+  inicios = np.flatnonzero(np.diff(codigos, prepend=-1))
+  fins = np.append(inicios[1:], len(codigos))
+  return {
+    valores_chave[codigos[inicio]]: Serie(datas[inicio:fim], {nome: coluna[inicio:fim] for nome, coluna in valores.items()})
+    for inicio, fim in zip(inicios, fins)
+  }
+
+
+def _normalizar_subsistema(nome: str) -> str:
+  return nome.strip().upper()
+
+
+class IndiceSeries:
+  """
+  Índice em memória das séries por reservatório (`cod_resplanejamento`) e por subsistema
+  (`nom_subsistema`), para consultas de intervalo sem varrer a tabela.
+
+  É montado a partir do backend de consulta com os últimos DIAS_HISTORICO_SERIES dias (a
+  cobertura começa em `primeira_data`; recortes anteriores são lidos do backend com
+  `indice_do_backend`) e atualizado de forma incremental: apenas os dias posteriores ao último já indexado são lidos,
+  e cargas novas (por exemplo, da ingestão incremental) podem ser aplicadas com `atualizar`.
+  Estruturas derivadas das mesmas linhas (como os agregados) se registram com `assinar` e
+  recebem cada tabela aplicada.
+  """
+
+  def __init__(self, dias_historico: int = DIAS_HISTORICO_SERIES):
+    self.dias_historico = dias_historico
+    self.reservatorios: Dict[int, Serie] = {}
+    self.subsistemas: Dict[str, Serie] = {}
+    self.metadados: Dict[int, Dict[str, Any]] = {}
+    self.primeira_data: Optional[date] = None
+    self.ultima_data: Optional[date] = None
+    self.atualizado_em: Optional[float] = None
+    self.ultimo_erro: Optional[str] = None
+    self._assinantes: List[Callable[[pa.Table], Any]] = []
+    self._trava = threading.Lock()
+    self._trava_primeira_carga = asyncio.Lock()
+
+  @property
+  def carregado(self) -> bool:
+    return self.atualizado_em is not None
+
+  def atualizar(self, tabela: pa.Table) -> int:
+    """Aplica ao índice as linhas de uma tabela (dias repetidos são substituídos)."""
+    tabela = padronizar_tabela(tabela)
+    if not tabela.num_rows:
+      return 0
+    novos_reservatorios, novos_subsistemas = {}, {}
+    if "cod_resplanejamento" in tabela.column_names:
+      novos_reservatorios = _agrupar(tabela, tabela.column("cod_resplanejamento"), COLUNAS_VALORES)
+    if "nom_subsistema" in tabela.column_names:
+      subsistemas = tabela.column("nom_subsistema")
+      if pa.types.is_dictionary(subsistemas.type):
+        subsistemas = subsistemas.cast(subsistemas.type.value_type)
+      subsistemas = pc.utf8_upper(pc.utf8_trim_whitespace(subsistemas))
+      novos_subsistemas = _agrupar(tabela, subsistemas, COLUNAS_VALORES + ["cod_resplanejamento"])
+    metadados = self._metadados(tabela)
+
+    with self._trava:
+      for cod, serie in novos_reservatorios.items():
+        atual = self.reservatorios.get(cod)
+        self.reservatorios[cod] = atual.mesclar(serie) if atual is not None else serie
+      for nome, serie in novos_subsistemas.items():
+        atual = self.subsistemas.get(nome)
+        self.subsistemas[nome] = atual.mesclar(serie, "cod_resplanejamento") if atual is not None else serie
+      for cod, campos in metadados.items():
+        self.metadados.setdefault(cod, {}).update(campos)
+      maior_data = pc.max(tabela.column(COLUNA_DATA_CONSULTA)).as_py()
+      if isinstance(maior_data, datetime):
+        maior_data = maior_data.date()
+      self.ultima_data = max(filter(None, [self.ultima_data, maior_data]))
+      if self.primeira_data is None:
+        menor_data = pc.min(tabela.column(COLUNA_DATA_CONSULTA)).as_py()
+        self.primeira_data = menor_data.date() if isinstance(menor_data, datetime) else menor_data
+      self.atualizado_em = time.time()
+    for assinante in self._assinantes:
+      assinante(tabela)
+    return tabela.num_rows
+
+  def assinar(self, assinante: Callable[[pa.Table], Any]) -> None:
+    """Registra uma função chamada com cada tabela aplicada ao índice, depois de `atualizar`."""
+    self._assinantes.append(assinante)
+
+  def _metadados(self, tabela: pa.Table) -> Dict[int, Dict[str, Any]]:
+    colunas = [c for c in COLUNAS_METADADOS_RESERVATORIO if c in tabela.column_names]
+    if not colunas or "cod_resplanejamento" not in tabela.column_names:
+      return {}
+    selecao = tabela.select(["cod_resplanejamento"] + colunas)
+    for indice, campo in enumerate(selecao.schema):
+      if pa.types.is_dictionary(campo.type):
+        selecao = selecao.set_column(indice, campo.name, selecao.column(indice).cast(campo.type.value_type))
+      elif pa.types.is_null(campo.type):
+        selecao = selecao.set_column(indice, campo.name, selecao.column(indice).cast(pa.string()))
+    # A última linha de cada reservatório vence, como em um upsert.
+    ultimas = selecao.group_by("cod_resplanejamento", use_threads=False).aggregate(
+      [(coluna, "last") for coluna in colunas]
+    )
+    return {
+      linha["cod_resplanejamento"]: {
+        coluna: linha[f"{coluna}_last"] for coluna in colunas if linha[f"{coluna}_last"] is not None
+      }
+      for linha in ultimas.to_pylist()
+    }
+
+  def cobre(self, data_inicio: date) -> bool:
+    """Se o índice tem todas as linhas a partir de `data_inicio`."""
+    return self.primeira_data is not None and data_inicio >= self.primeira_data
+
+  def serie_reservatorio(self, cod: int, data_inicio: date, data_fim: date) -> Optional[Serie]:
+    serie = self.reservatorios.get(cod)
+    return serie.intervalo(data_inicio, data_fim) if serie is not None else None
+
+  def serie_subsistema(self, nome: str, data_inicio: date, data_fim: date) -> Optional[Serie]:
+    serie = self.subsistemas.get(_normalizar_subsistema(nome))
+    return serie.intervalo(data_inicio, data_fim) if serie is not None else None
+
+  async def sincronizar(self) -> bool:
+    """Lê do backend os dias ainda não indexados (na primeira vez, todo o histórico configurado)."""
+    hoje = date.today()
+    data_inicio = (
+      self.ultima_data + timedelta(days=1) if self.ultima_data else hoje - timedelta(days=self.dias_historico)
+    )
+    if not service.backend_consulta.disponivel():
+      self.ultimo_erro = f"Backend de consulta '{service.backend_consulta.nome}' não configurado."
+      return False
+    try:
+      tabela = await asyncio.to_thread(service.backend_consulta.consultar_tabela, data_inicio, hoje)
+      linhas = await asyncio.to_thread(self.atualizar, tabela)
+      if self.primeira_data is None or data_inicio < self.primeira_data:
+        # A cobertura começa no dia pedido ao backend, mesmo que ele não tenha linhas nesse dia.
+        self.primeira_data = data_inicio
+    except Exception as e:
+      self.ultimo_erro = str(e)
+      print(f"Não foi possível atualizar o índice de séries: {e}")
+      return False
+
+    self.atualizado_em = time.time()
+    self.ultimo_erro = None
+    print(f"Índice de séries atualizado com {linhas} linhas a partir de {data_inicio}.")
+    return True
+
+  async def garantir_carregado(self) -> bool:
+    """Carrega o índice na primeira chamada; as seguintes retornam imediatamente."""
+    if not self.carregado:
+      async with self._trava_primeira_carga:
+        if not self.carregado:
+          await self.sincronizar()
+    return self.carregado
+
+  async def manter_atualizado(self, intervalo: float = INTERVALO_ATUALIZACAO_SERIES) -> None:
+    """Laço de atualização periódica, executado durante toda a vida da aplicação."""
+    while True:
+      sucesso = await self.sincronizar()
+      await asyncio.sleep(intervalo if sucesso else INTERVALO_NOVA_TENTATIVA_SERIES)
+
+  def estado(self) -> Dict[str, Any]:
+    atualizado_em = None
+    if self.atualizado_em is not None:
+      atualizado_em = datetime.fromtimestamp(self.atualizado_em, tz=timezone.utc).isoformat()
+    linhas = sum(len(serie) for serie in self.reservatorios.values())
+    bytes_em_uso = sum(
+      serie.datas.nbytes + sum(valores.nbytes for valores in serie.colunas.values())
+      for indice in (self.reservatorios, self.subsistemas) for serie in indice.values()
+    )
+    return {
+      "carregado": self.carregado,
+      "atualizado_em": atualizado_em,
+      "primeira_data": self.primeira_data,
+      "ultima_data": self.ultima_data,
+      "reservatorios": len(self.reservatorios),
+      "subsistemas": sorted(self.subsistemas),
+      "linhas": linhas,
+      "memoria_em_uso_bytes": bytes_em_uso,
+      "ultimo_erro": self.ultimo_erro,
+    }
+
+
+def serie_para_colunas(serie: Serie, colunas: Optional[List[str]] = None) -> Tuple[List[date], Dict[str, List[Any]]]:
+  """Converte a série para listas (datas e uma lista por coluna), com NaN virando None."""
+  selecionadas = [nome for nome in serie.colunas if not colunas or nome in colunas]
+  valores = {
+    nome: pa.array(serie.colunas[nome], from_pandas=True).to_pylist() for nome in selecionadas
+  }
+  return serie.datas.astype(object).tolist(), valores
+
+
+def indice_do_backend(
+    data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]] = None
+) -> IndiceSeries:
+  """
+  Índice avulso com as linhas do backend no intervalo, para recortes que começam antes da
+  cobertura do índice em memória. Não é guardado: cada chamada consulta o backend, lendo apenas
+  o reservatório ou subsistema pedido em `filtros` (colunas de COLUNAS_FILTRAVEIS).
+  """
+  indice = IndiceSeries()
+  indice.atualizar(service.backend_consulta.consultar_tabela(data_inicio, data_fim, filtros))
+  return indice
+
+
+indice_series = IndiceSeries()
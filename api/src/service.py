@@ -1,12 +1,26 @@
 import asyncio
-import io
+import base64
+import hashlib
+import json
 import os
-from datetime import date
-from typing import List, Dict, Any, Hashable
+import threading
+import time
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 
+import fsspec
 import httpx
-import pandas as pd
-from google.cloud import bigquery
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cache import Bloco, CacheParticoes
+from cliente_ons import cliente_ons
+from consultas import BackendConsulta, criar_backend_consulta
+from downloads import CacheArquivosONS
+from metricas import LINHAS_PROCESSADAS, etapa, registrar_inicializacao
+from motor import motor_processamento
+from normalizacao import normalizar_tabela, resumir_relatorio
+from respostas import MemoriaETags
 
 # Configurações Google Cloud
 ID_TABELA = os.getenv("BQ_TABLE_ID")
@@ -19,28 +33,103 @@ ID_PACOTE = "148e56a4-5a21-4bf2-9cd7-7f89bc4ed71c"
 URL_PACOTE_ONS = f"https://dados.ons.org.br/api/3/action/package_show?id={ID_PACOTE}"
 URL_DOWNLOAD_RECURSO_ONS = f"https://dados.ons.org.br/dataset/{ID_PACOTE}/resource/"
 
-bq_client = bigquery.Client(project=ID_PROJETO, location="us-central1") if ID_PROJETO else None
+# Criado no primeiro uso (ou no aquecimento do lifespan): importar a biblioteca do BigQuery e
+# montar as credenciais levam quase um segundo e não devem atrasar a subida da API.
+bq_client: Any = None
+_trava_cliente_bigquery = threading.Lock()
+
+cache_arquivos_ons = CacheArquivosONS()
+
+# Por quanto tempo (em segundos) o COUNT(*) de um intervalo é reaproveitado entre páginas.
+TTL_CACHE_CONTAGEM = float(os.getenv("BQ_CACHE_CONTAGEM_TTL", "300"))
+MAXIMO_CONTAGENS_EM_CACHE = 256
+
+_cache_contagens: Dict[Tuple[date, date, Tuple[Tuple[str, Any], ...]], Tuple[float, int]] = {}
+
+# Intervalos curtos (ou já inteiramente em cache) são servidos pelo cache de partições em vez de
+# uma consulta paginada no BigQuery.
+INTERVALO_MAXIMO_CACHE_DIAS = int(os.getenv("CACHE_CONSULTA_INTERVALO_MAXIMO_DIAS", "92"))
+
+# Quantidade de linhas lidas do BigQuery por página ao transmitir respostas em streaming.
+TAMANHO_LOTE_STREAMING = int(os.getenv("STREAMING_TAMANHO_LOTE", "5000"))
+
+cache_resultados = CacheParticoes()
+# ETags das respostas do /consultar para intervalos históricos; têm a mesma validade dos blocos em cache.
+etags_consulta = MemoriaETags()
+_blocos_em_carga: Dict[Bloco, "asyncio.Future[List[Dict[str, Any]]]"] = {}
+
+
+# Origem dos dados do /consultar: BigQuery (padrão) ou um dataset Parquet particionado.
+backend_consulta: BackendConsulta = criar_backend_consulta(
+  obter_cliente=lambda: obter_cliente_bigquery(), obter_tabela=lambda: f"{ID_PROJETO}.{ID_DATASET}.{ID_TABELA}"
+)
+
+
+def obter_cliente_bigquery() -> Any:
+  """O cliente do BigQuery, criado na primeira chamada. Sem GCP_PROJECT_ID, retorna None."""
+  global bq_client
+  if bq_client is None and ID_PROJETO:
+    with _trava_cliente_bigquery:
+      if bq_client is None:
+        from google.cloud import bigquery
+        bq_client = bigquery.Client(project=ID_PROJETO, location="us-central1")
+  return bq_client
+
+
+def aquecer_clientes() -> None:
+  """
+  Cria os clientes do BigQuery e do GCS antes da primeira requisição que precisa deles. Roda em
+  segundo plano no lifespan; uma falha aqui só adia a criação para o primeiro uso.
+  """
+  if ID_PROJETO:
+    inicio = time.perf_counter()
+    try:
+      obter_cliente_bigquery()
+      registrar_inicializacao("cliente_bigquery", time.perf_counter() - inicio)
+    except Exception as e:
+      print(f"AVISO: não foi possível criar o cliente do BigQuery na inicialização: {e}")
+  if NOME_BUCKET:
+    inicio = time.perf_counter()
+    try:
+      # O fsspec guarda a instância: os uploads seguintes reaproveitam o gcsfs já importado.
+      fsspec.filesystem("gs")
+      registrar_inicializacao("cliente_gcs", time.perf_counter() - inicio)
+    except Exception as e:
+      print(f"AVISO: não foi possível criar o cliente do GCS na inicialização: {e}")
+
+
+def definir_cliente_bigquery(cliente: Any) -> None:
+  """Substitui o cliente do BigQuery (por exemplo, por um falso nos testes) e descarta os caches."""
+  global bq_client
+  bq_client = cliente
+  cache_resultados.limpar()
+  etags_consulta.limpar()
+  _cache_contagens.clear()
+
+
+def definir_backend_consulta(backend: BackendConsulta) -> None:
+  """Troca o backend do /consultar e descarta os caches, que guardam dados do backend anterior."""
+  global backend_consulta
+  backend_consulta = backend
+  cache_resultados.limpar()
+  etags_consulta.limpar()
+  _cache_contagens.clear()
 
 
 async def obter_recursos_ons() -> List[Dict[str, Any]]:
   """Busca a lista de todos os recursos de dados disponíveis no pacote da ONS."""
   try:
-    async with httpx.AsyncClient(timeout=30.0) as client:
-      response = await client.get(URL_PACOTE_ONS)
-      response.raise_for_status()
-      dados_pacote = response.json()
-      return dados_pacote.get("result", {}).get("resources", [])
-  except httpx.RequestError as e:
+    with etapa("catalogo_ons"):
+      dados_pacote = await cliente_ons.obter_json(URL_PACOTE_ONS)
+    return dados_pacote.get("result", {}).get("resources", [])
+  except httpx.HTTPError as e:
     print(f"Erro ao buscar os dados do pacote ONS: {e}")
     return []
 
 
-def filtrar_recursos_por_ano_e_formato(
-    recursos: List[Dict[str, Any]], data_inicio_req: date, data_fim_req: date
-) -> List[Dict[str, Any]]:
-  """Encontra o melhor formato disponível (dando preferência a Parquet) para cada ano solicitado."""
+def indexar_recursos_por_ano(recursos: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+  """Monta o índice ano -> melhor recurso disponível (dando preferência a Parquet sobre CSV)."""
   melhores_recursos_por_ano = {}
-  anos_solicitados = set(range(data_inicio_req.year, data_fim_req.year + 1))
   for rec in recursos:
     try:
       url = rec.get("url", "")
@@ -56,115 +145,411 @@ def filtrar_recursos_por_ano_e_formato(
 
       ano_recurso = int(ano_str if len(ano_str) == 4 else ano_str[:4])
 
-      if ano_recurso in anos_solicitados:
-        if ano_recurso not in melhores_recursos_por_ano or tipo_formato == "PARQUET":
-          rec['ano'] = ano_recurso
-          melhores_recursos_por_ano[ano_recurso] = rec
+      if ano_recurso not in melhores_recursos_por_ano or tipo_formato == "PARQUET":
+        rec['ano'] = ano_recurso
+        melhores_recursos_por_ano[ano_recurso] = rec
 
     except (ValueError, IndexError):
       continue
 
-  lista_final = list(melhores_recursos_por_ano.values())
-  print(f"DEBUG: Encontrados {len(lista_final)} recursos ideais para processar.")
-  return lista_final
+  return melhores_recursos_por_ano
 
 
-def _buscar_e_processar_recurso(recurso: Dict[str, Any]) -> list[Any] | list[dict[Hashable, Any]]:
-  """
-  Processa um único recurso: baixa, converte para Parquet no GCS e retorna os dados.
-  """
+def selecionar_recursos_do_intervalo(
+    indice: Dict[int, Dict[str, Any]], data_inicio_req: date, data_fim_req: date
+) -> List[Dict[str, Any]]:
+  """Retorna, em ordem de ano, os recursos do índice que cobrem o intervalo solicitado."""
+  return [
+    indice[ano]
+    for ano in range(data_inicio_req.year, data_fim_req.year + 1)
+    if ano in indice
+  ]
+
+
+async def _baixar_recurso(recurso: Dict[str, Any]) -> str:
+  """Garante o arquivo do recurso no cache local, pelo cliente compartilhado, e retorna o seu caminho."""
   url_download = URL_DOWNLOAD_RECURSO_ONS + recurso.get("id") + "/download"
   print(f"  -> Buscando {recurso.get('name')} ({recurso.get('format')})...")
+  with etapa("download_ons", recurso=recurso.get("name")):
+    return await cliente_ons.baixar(recurso, url_download, cache_arquivos_ons)
 
-  if not url_download:
-    return []
 
-  try:
-    nome_arquivo = recurso.get("name")
-    formato_arquivo = recurso.get("format", "").upper()
-    print(f"  -> Processando {nome_arquivo} ({formato_arquivo})...")
-
-    with httpx.Client() as client:
-        response = client.get(url_download, follow_redirects=True, timeout=60.0)
-        response.raise_for_status()
-        content_bytes = response.content
-
-    if formato_arquivo == "CSV":
-      df = pd.read_csv(io.BytesIO(content_bytes), sep=';', header=1, encoding='latin-1')
-    elif formato_arquivo == "PARQUET":
-      df = pd.read_parquet(io.BytesIO(content_bytes))
-    else:
-      return []
+def _enviar_para_gcs(tabela: pa.Table, recurso: Dict[str, Any], data_inicio: date, data_fim: date) -> None:
+  """Grava a tabela já tipada como Parquet no bucket, se configurado."""
+  if not NOME_BUCKET:
+    print("  -> AVISO: NOME_BUCKET_GCS não configurado. Upload ignorado.")
+    return
 
-    if NOME_BUCKET:
-      try:
-        data_ingestao = date.today().strftime('%Y-%m-%d')
-        nome_original = url_download.split("/")[-1]
-        nome_base = os.path.splitext(nome_original)[0]
-        caminho_gcs = f"gs://{NOME_BUCKET}/dt={data_ingestao}/{nome_base}.parquet"
+  try:
+    data_ingestao = date.today().strftime('%Y-%m-%d')
+    # Um objeto por recurso (e, portanto, por ano): o nome do recurso na ONS, sem a extensão.
+    nome_base = os.path.splitext(recurso.get("name") or recurso["id"])[0]
+    ano_recurso = recurso.get("ano")
+    if ano_recurso and (data_inicio, data_fim) != (date(ano_recurso, 1, 1), date(ano_recurso, 12, 31)):
+      # Recortes parciais do ano não sobrescrevem o arquivo do ano completo.
+      nome_base = f"{nome_base}_{max(data_inicio, date(ano_recurso, 1, 1))}_{min(data_fim, date(ano_recurso, 12, 31))}"
+    caminho_gcs = f"gs://{NOME_BUCKET}/dt={data_ingestao}/{nome_base}.parquet"
+
+    print(f"  -> Fazendo upload para {caminho_gcs}...")
+    with etapa("upload_gcs", recurso=recurso.get("name")), fsspec.open(caminho_gcs, "wb") as arquivo:
+      pq.write_table(tabela, arquivo)
+    print(f"  SUCESSO! Arquivo Parquet enviado para o GCS.")
 
-        print("  -> Convertendo todas as colunas para string para o arquivo Parquet...")
-        df_para_parquet = df.astype(str)
+  except Exception as e:
+    print(f"  [!!!] FALHA NO UPLOAD PARA O GCS: {e}")
 
-        print(f"  -> Fazendo upload para {caminho_gcs}...")
-        df_para_parquet.to_parquet(caminho_gcs, index=False)
-        print(f"  SUCESSO! Arquivo Parquet (com strings) enviado para o GCS.")
 
-      except Exception as e:
-        print(f"  [!!!] FALHA NO UPLOAD PARA O GCS: {e}")
-    else:
-      print("  -> AVISO: NOME_BUCKET_GCS não configurado. Upload ignorado.")
+async def ler_recurso_normalizado(
+    recurso: Dict[str, Any], data_inicio: date, data_fim: date
+) -> pa.Table:
+  """
+  Baixa um recurso (pelo cache local) e retorna o recorte entre `data_inicio` e `data_fim`
+  normalizado para o schema da `ena_consolidado`.
 
-    df = df.where(pd.notna(df), None)
-    print(f"  SUCESSO! Processados {len(df)} registros de {nome_arquivo}")
-    return df.to_dict(orient='records')
+  O download usa o cliente HTTP compartilhado, que limita os downloads simultâneos; a leitura
+  do arquivo, que concentra o uso de CPU, roda no motor de processamento configurado. Apenas
+  as colunas do schema e as linhas do intervalo são lidas. Erros são propagados para quem
+  chamou.
+  """
+  nome_arquivo = recurso.get("name")
+  formato_arquivo = recurso.get("format", "").upper()
+  caminho_arquivo = await _baixar_recurso(recurso)
+  print(f"  -> Processando {nome_arquivo} ({formato_arquivo}) no motor '{motor_processamento.backend}'...")
+  with etapa("leitura", recurso=nome_arquivo, motor=motor_processamento.backend) as registro:
+    tabela = await motor_processamento.ler(caminho_arquivo, formato_arquivo, data_inicio, data_fim)
+    registro["linhas"] = tabela.num_rows
+  LINHAS_PROCESSADAS.incrementar(tabela.num_rows, recurso=nome_arquivo)
+  arquivo_origem = recurso.get("url", "").split("/")[-1] or nome_arquivo
+  with etapa("normalizacao", recurso=nome_arquivo):
+    tabela, relatorio = await asyncio.to_thread(normalizar_tabela, tabela, arquivo_origem)
+  print(f"  -> Qualidade de {nome_arquivo}: {resumir_relatorio(relatorio)}")
+  return tabela
+
+
+async def processar_recurso(
+    recurso: Dict[str, Any], data_inicio: date, data_fim: date
+) -> Optional[pa.Table]:
+  """
+  Processa um único recurso: baixa, normaliza para o schema da `ena_consolidado`, grava em
+  Parquet no GCS e retorna a tabela tipada. Retorna None se o recurso não puder ser processado.
+  """
+  nome_arquivo = recurso.get("name")
+  formato_arquivo = recurso.get("format", "").upper()
+  if formato_arquivo not in ("CSV", "PARQUET"):
+    return None
 
+  try:
+    tabela = await ler_recurso_normalizado(recurso, data_inicio, data_fim)
+    await asyncio.to_thread(_enviar_para_gcs, tabela, recurso, data_inicio, data_fim)
   except Exception as e:
     print(f"  [!!!] ERRO CRÍTICO durante o processamento: {e}")
-    return []
+    return None
+
+  print(f"  SUCESSO! Processados {tabela.num_rows} registros de {nome_arquivo}")
+  return tabela
+
+
+async def _consultar_origem_intervalo(data_inicio: date, data_fim: date) -> List[Dict[str, Any]]:
+  """
+  Busca no backend de consulta todos os registros de um intervalo de datas.
+
+  Lança a exceção do backend em caso de falha, para que quem chama decida se guarda o resultado.
+  """
+  # Os backends são síncronos, então a chamada roda em uma thread separada para não bloquear o
+  # loop de eventos do asyncio.
+  return await asyncio.to_thread(backend_consulta.consultar_intervalo, data_inicio, data_fim)
+
+
+def _backend_indisponivel() -> bool:
+  if backend_consulta.disponivel():
+    return False
+  if backend_consulta.nome == "bigquery":
+    print("Erro: Cliente do BigQuery não foi inicializado. Verifique a variável de ambiente GCP_PROJECT_ID.")
+  else:
+    print(f"Erro: Backend de consulta '{backend_consulta.nome}' não configurado. Verifique CONSULTA_PARQUET_URI.")
+  return True
+
 
-async def processar_recurso(recurso: Dict[str, Any]) -> List[Dict[str, Any]]:
-  """Função assíncrona que encapsula o processamento para rodar em uma thread separada."""
-  return await asyncio.to_thread(_buscar_e_processar_recurso, recurso)
+def _aplicar_filtros(registros: List[Dict[str, Any]], filtros: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+  if not filtros:
+    return registros
+  return [r for r in registros if all(r.get(coluna) == valor for coluna, valor in filtros.items())]
+
+
+async def _carregar_blocos(blocos: List[Bloco]) -> Dict[Bloco, List[Dict[str, Any]]]:
+  """
+  Busca com uma única consulta uma sequência contígua de blocos (do mais recente ao mais antigo)
+  e guarda cada um no cache, inclusive os que não têm registros.
+  """
+  futuros = {}
+  for bloco in blocos:
+    futuros[bloco] = asyncio.get_running_loop().create_future()
+    _blocos_em_carga[bloco] = futuros[bloco]
+
+  try:
+    registros = await _consultar_origem_intervalo(blocos[-1][0], blocos[0][1])
+    por_bloco: Dict[Bloco, List[Dict[str, Any]]] = {bloco: [] for bloco in blocos}
+    for registro in registros:
+      por_bloco[cache_resultados.bloco_da_data(registro["ena_data"])].append(registro)
+
+    for bloco, registros_bloco in por_bloco.items():
+      cache_resultados.guardar(bloco, registros_bloco)
+      futuros[bloco].set_result(registros_bloco)
+    return por_bloco
+  except Exception as e:
+    for futuro in futuros.values():
+      if not futuro.done():
+        futuro.set_exception(e)
+    raise
+  finally:
+    for bloco in blocos:
+      _blocos_em_carga.pop(bloco, None)
 
 
 async def consultar_dados_por_intervalo(
-    data_inicio: date, data_fim: date
+    data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]] = None
 ) -> List[Dict[str, Any]]:
   """
-  Executa uma consulta no BigQuery para buscar registros num intervalo de datas.
+  Retorna todos os registros do intervalo, ordenados por (ena_data, cod_resplanejamento) decrescentes.
+
+  O resultado é montado a partir dos blocos de partição em `cache_resultados`; só os blocos
+  ausentes ou expirados são consultados no backend, agrupados em uma consulta por trecho
+  contíguo. Blocos que outra requisição já está carregando são aguardados em vez de repetidos.
+  Os blocos guardam o intervalo completo; `filtros` é aplicado depois da montagem.
   """
-  if not bq_client:
-    print("Erro: Cliente do BigQuery não foi inicializado. Verifique a variável de ambiente GCP_PROJECT_ID.")
+  if _backend_indisponivel():
     return []
 
-  query = f"""
-    SELECT
-      *
-    FROM
-      `{ID_PROJETO}.{ID_DATASET}.{ID_TABELA}`
-    WHERE
-      ena_data >= @data_inicio
-      AND ena_data <= @data_fim
-    ORDER BY
-      ena_data DESC
-    """
-  job_config = bigquery.QueryJobConfig(
-    query_parameters=[
-      bigquery.ScalarQueryParameter("data_inicio", "DATE", data_inicio),
-      bigquery.ScalarQueryParameter("data_fim", "DATE", data_fim),
-    ]
-  )
+  blocos = cache_resultados.blocos_do_intervalo(data_inicio, data_fim)
+  encontrados: Dict[Bloco, Any] = {}
+  trechos_faltantes: List[List[Bloco]] = []
+  for bloco in blocos:
+    registros_bloco = cache_resultados.obter(bloco)
+    if registros_bloco is not None:
+      encontrados[bloco] = registros_bloco
+    elif bloco in _blocos_em_carga:
+      encontrados[bloco] = _blocos_em_carga[bloco]
+    elif trechos_faltantes and trechos_faltantes[-1][-1][0] - timedelta(days=1) == bloco[1]:
+      trechos_faltantes[-1].append(bloco)
+    else:
+      trechos_faltantes.append([bloco])
+
   try:
-    print(f"Executando a consulta no BigQuery no intervalo de {data_inicio} a {data_fim}...")
-    # A API do cliente Python do BigQuery é síncrona, então a executamos em uma thread separada
-    # para não bloquear o loop de eventos do asyncio.
-    query_job = await asyncio.to_thread(bq_client.query, query, job_config=job_config)
+    carregados = await asyncio.gather(*[_carregar_blocos(trecho) for trecho in trechos_faltantes])
+    for por_bloco in carregados:
+      encontrados.update(por_bloco)
+    for bloco, valor in encontrados.items():
+      if isinstance(valor, asyncio.Future):
+        encontrados[bloco] = await valor
+  except Exception as e:
+    print(f"Erro ao consultar o backend '{backend_consulta.nome}': {e}")
+    return []
+
+  return _aplicar_filtros([
+    registro
+    for bloco in blocos
+    for registro in encontrados[bloco]
+    if data_inicio <= registro["ena_data"] <= data_fim
+  ], filtros)
+
+
+def _assinatura_consulta(data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]]) -> str:
+  """Hash curto do intervalo e dos filtros, para amarrar o cursor à consulta que o gerou."""
+  consulta = [data_inicio.isoformat(), data_fim.isoformat(), sorted((filtros or {}).items())]
+  conteudo = json.dumps(consulta, separators=(",", ":")).encode()
+  return hashlib.sha256(conteudo).hexdigest()[:16]
+
+
+def codificar_cursor(
+    data_inicio: date,
+    data_fim: date,
+    ultimo_registro: Dict[str, Any],
+    proxima_pagina: int,
+    filtros: Optional[Dict[str, Any]] = None,
+) -> str:
+  """Gera o token opaco que aponta para a página seguinte à do último registro retornado."""
+  ultima_data = ultimo_registro.get("ena_data")
+  posicao = {
+    "h": _assinatura_consulta(data_inicio, data_fim, filtros),
+    "d": ultima_data.isoformat() if isinstance(ultima_data, date) else str(ultima_data),
+    "c": int(ultimo_registro.get("cod_resplanejamento")),
+    "p": proxima_pagina,
+  }
+  conteudo = json.dumps(posicao, separators=(",", ":")).encode()
+  return base64.urlsafe_b64encode(conteudo).decode().rstrip("=")
+
+
+def decodificar_cursor(
+    cursor: str, data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+  """
+  Valida e decodifica um cursor gerado por `codificar_cursor`.
+
+  Lança ValueError se o token estiver corrompido ou pertencer a outra consulta (outro intervalo
+  de datas ou outros filtros): a posição só vale na ordenação dos registros que a geraram.
+  """
+  try:
+    preenchimento = "=" * (-len(cursor) % 4)
+    posicao = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+    assinatura = posicao["h"]
+    decodificado = {
+      "ena_data": date.fromisoformat(posicao["d"]),
+      "cod_resplanejamento": int(posicao["c"]),
+      "pagina": int(posicao["p"]),
+    }
+  except (ValueError, KeyError, TypeError) as e:
+    raise ValueError("Cursor de paginação inválido.") from e
+
+  if assinatura != _assinatura_consulta(data_inicio, data_fim, filtros):
+    raise ValueError("O cursor informado pertence a outra consulta (intervalo de datas ou filtros diferentes).")
+  return decodificado
+
+
+async def contar_registros_por_intervalo(
+    data_inicio: date, data_fim: date, filtros: Optional[Dict[str, Any]] = None
+) -> int:
+  """
+  Retorna o total de registros do intervalo, reaproveitando a contagem por até TTL_CACHE_CONTAGEM
+  segundos para que a navegação entre páginas não dispare uma contagem a cada requisição.
+  """
+  if _backend_indisponivel():
+    return 0
 
-    resultados = await asyncio.to_thread(lambda: [dict(row) for row in query_job.result()])
+  chave = (data_inicio, data_fim, tuple(sorted((filtros or {}).items())))
+  agora = time.monotonic()
+  em_cache = _cache_contagens.get(chave)
+  if em_cache and agora - em_cache[0] < TTL_CACHE_CONTAGEM:
+    return em_cache[1]
 
-    print(f"Consulta concluída. {len(resultados)} registros encontrados.")
-    return resultados
+  try:
+    total = await asyncio.to_thread(backend_consulta.contar, data_inicio, data_fim, filtros)
   except Exception as e:
-    print(f"Erro ao consultar o BigQuery: {e}")
-    return []
+    print(f"Erro ao contar registros no backend '{backend_consulta.nome}': {e}")
+    return 0
+
+  if len(_cache_contagens) >= MAXIMO_CONTAGENS_EM_CACHE:
+    _cache_contagens.pop(min(_cache_contagens, key=lambda k: _cache_contagens[k][0]))
+  _cache_contagens[chave] = (agora, total)
+  return total
+
+
+async def consultar_pagina_por_intervalo(
+    data_inicio: date,
+    data_fim: date,
+    tamanho: int,
+    pagina: int = 1,
+    posicao: Optional[Dict[str, Any]] = None,
+    filtros: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+  """
+  Busca uma única página do intervalo diretamente no backend de consulta.
+
+  A ordenação é estável em (ena_data DESC, cod_resplanejamento DESC). Quando `posicao` (um cursor
+  decodificado) é informada, a página é localizada por keyset a partir do último registro visto,
+  sem reler as páginas anteriores; caso contrário usa LIMIT/OFFSET a partir de `pagina`.
+
+  Retorna os registros da página e o cursor da próxima página (None quando não houver mais dados).
+  """
+  if _backend_indisponivel():
+    return [], None
+
+  if posicao:
+    pagina = posicao["pagina"]
+    deslocamento = 0
+  else:
+    deslocamento = (pagina - 1) * tamanho
+
+  # Busca-se um registro a mais para saber se existe próxima página sem depender da contagem total.
+  try:
+    print(f"Executando a consulta paginada no backend '{backend_consulta.nome}' (página {pagina}, tamanho {tamanho})...")
+    resultados = await asyncio.to_thread(
+      backend_consulta.consultar_pagina, data_inicio, data_fim, tamanho + 1, deslocamento, posicao, filtros
+    )
+  except Exception as e:
+    print(f"Erro ao consultar o backend '{backend_consulta.nome}': {e}")
+    return [], None
+
+  if len(resultados) <= tamanho:
+    return resultados, None
+
+  dados_pagina = resultados[:tamanho]
+  return dados_pagina, codificar_cursor(data_inicio, data_fim, dados_pagina[-1], pagina + 1, filtros)
+
+
+def intervalo_servido_pelo_cache(data_inicio: date, data_fim: date) -> bool:
+  """Indica se a consulta do intervalo deve ser montada pelo cache de partições."""
+  return (
+    (data_fim - data_inicio).days < INTERVALO_MAXIMO_CACHE_DIAS
+    or cache_resultados.contem_intervalo(data_inicio, data_fim)
+  )
+
+
+def intervalo_historico(data_inicio: date, data_fim: date) -> bool:
+  """
+  Indica se o intervalo só tem partições de anos encerrados, que não mudam mais a não ser por
+  uma nova carga. As respostas desses intervalos podem ser revalidadas pelo ETag guardado.
+  """
+  return cache_resultados.ttl_do_bloco((data_inicio, data_fim)) == float("inf")
+
+
+async def consultar_pagina_com_total(
+    data_inicio: date,
+    data_fim: date,
+    tamanho: int,
+    pagina: int = 1,
+    posicao: Optional[Dict[str, Any]] = None,
+    filtros: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str], int]:
+  """
+  Retorna a página solicitada, o cursor da próxima página e o total de registros do intervalo.
+
+  Intervalos curtos ou já em cache são fatiados a partir de `consultar_dados_por_intervalo`;
+  os demais são paginados no backend de consulta. A ordenação é a mesma nos dois caminhos,
+  então os cursores gerados por um valem para o outro.
+  """
+  if not intervalo_servido_pelo_cache(data_inicio, data_fim):
+    (dados, proximo_cursor), total = await asyncio.gather(
+      consultar_pagina_por_intervalo(data_inicio, data_fim, tamanho, pagina, posicao, filtros),
+      contar_registros_por_intervalo(data_inicio, data_fim, filtros),
+    )
+    return dados, proximo_cursor, total
+
+  registros = await consultar_dados_por_intervalo(data_inicio, data_fim, filtros)
+  if posicao:
+    pagina = posicao["pagina"]
+  indice_inicio = (pagina - 1) * tamanho
+  dados = registros[indice_inicio:indice_inicio + tamanho]
+  proximo_cursor = None
+  if dados and indice_inicio + tamanho < len(registros):
+    proximo_cursor = codificar_cursor(data_inicio, data_fim, dados[-1], pagina + 1, filtros)
+  return dados, proximo_cursor, len(registros)
+
+
+async def iterar_lotes_por_intervalo(
+    data_inicio: date,
+    data_fim: date,
+    tamanho_lote: int = TAMANHO_LOTE_STREAMING,
+    filtros: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+  """
+  Percorre o intervalo em lotes de registros, na mesma ordenação do `/consultar`.
+
+  Intervalos inteiramente em cache são fatiados da memória; os demais são lidos lote a lote do
+  backend (páginas do resultado no BigQuery, partições mensais no Parquet), sem nunca
+  materializar o resultado completo.
+  """
+  if _backend_indisponivel():
+    return
+
+  if cache_resultados.contem_intervalo(data_inicio, data_fim):
+    registros = await consultar_dados_por_intervalo(data_inicio, data_fim, filtros)
+    for indice in range(0, len(registros), tamanho_lote):
+      yield registros[indice:indice + tamanho_lote]
+    return
+
+  lotes = await asyncio.to_thread(backend_consulta.iterar_lotes, data_inicio, data_fim, tamanho_lote, filtros)
+  while True:
+    lote = await asyncio.to_thread(next, lotes, None)
+    if lote is None:
+      break
+    yield lote
@@ -0,0 +1,128 @@
+import io
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional, Union
+
+import pyarrow as pa
+from fastapi.responses import StreamingResponse
+
+from consultas import COLUNA_DATA_CONSULTA
+from esquema import COLUNA_DATA_ONS, unificar_schema
+from metricas import registrar_etapa
+from respostas import codificar_json, juntar_linhas, tabela_para_linhas_json
+
+TIPO_NDJSON = "application/x-ndjson"
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+TIPO_PARQUET = "application/vnd.apache.parquet"
+
+TIPOS_POR_FORMATO = {"ndjson": TIPO_NDJSON, "arrow": TIPO_ARROW}
+
+# Cada lote pode ser uma lista de registros (páginas do BigQuery) ou uma tabela Arrow (arquivos da ONS).
+Lote = Union[List[Dict[str, Any]], pa.Table]
+
+
+def escolher_formato(formato: Optional[str], accept: Optional[str]) -> Optional[str]:
+  """
+  Decide se a resposta deve ser transmitida em streaming.
+
+  O parâmetro `formato` tem prioridade sobre o cabeçalho Accept. Retorna "ndjson", "arrow" ou
+  None quando a resposta JSON paginada tradicional deve ser usada.
+  """
+  if formato:
+    return formato if formato in TIPOS_POR_FORMATO else None
+  accept = accept or ""
+  for nome, tipo in TIPOS_POR_FORMATO.items():
+    if tipo in accept:
+      return nome
+  return None
+
+
+async def gerar_ndjson(lotes: AsyncIterator[Lote]) -> AsyncIterator[bytes]:
+  """Converte cada lote de registros em linhas JSON, enviadas assim que o lote fica pronto."""
+  serializacao = 0.0
+  try:
+    async for registros in lotes:
+      inicio = time.perf_counter()
+      if isinstance(registros, pa.Table):
+        blocos = [_linhas_tabela_ndjson(batch) for batch in registros.to_batches() if batch.num_rows]
+      else:
+        blocos = [_linhas_ndjson(registros)] if registros else []
+      serializacao += time.perf_counter() - inicio
+      for bloco in blocos:
+        yield bloco
+  finally:
+    registrar_etapa("serializacao", serializacao, formato="ndjson")
+
+
+def _linhas_ndjson(registros: List[Dict[str, Any]]) -> bytes:
+  return b"\n".join(codificar_json(registro) for registro in registros) + b"\n"
+
+
+def _linhas_tabela_ndjson(batch: pa.RecordBatch) -> bytes:
+  """As linhas do lote Arrow são montadas em JSON coluna a coluna, sem passar por dicts."""
+  return juntar_linhas(tabela_para_linhas_json(pa.Table.from_batches([batch])), "\n") + b"\n"
+
+
+async def gerar_arrow(lotes: AsyncIterator[Lote]) -> AsyncIterator[bytes]:
+  """
+  Converte os lotes em um único stream Arrow IPC, um record batch por lote.
+
+  O schema vem do primeiro lote não vazio, com os tipos da `ena_consolidado` (esquema.py) nas
+  colunas conhecidas; assim um lote com uma coluna só de nulos ou com inteiros onde o schema
+  pede FLOAT não fixa um tipo que os seguintes não cabem. Os lotes seguintes são convertidos
+  para ele: colunas ausentes viram nulos e colunas a mais são descartadas.
+  """
+  buffer = io.BytesIO()
+  escritor = None
+  schema = None
+  serializacao = 0.0
+  try:
+    async for registros in lotes:
+      inicio = time.perf_counter()
+      if isinstance(registros, pa.Table):
+        if not registros.num_rows:
+          continue
+        tabela = registros
+      elif not registros:
+        continue
+      else:
+        tabela = pa.Table.from_pylist(registros)
+      if escritor is None:
+        schema = unificar_schema(tabela.schema, {COLUNA_DATA_CONSULTA: COLUNA_DATA_ONS})
+        escritor = pa.ipc.new_stream(buffer, schema)
+      escritor.write_table(_conformar(tabela, schema))
+      serializacao += time.perf_counter() - inicio
+      yield _esvaziar(buffer)
+
+    if escritor is None:
+      escritor = pa.ipc.new_stream(buffer, pa.schema([]))
+    escritor.close()
+    yield _esvaziar(buffer)
+  finally:
+    registrar_etapa("serializacao", serializacao, formato="arrow")
+
+
+def _conformar(tabela: pa.Table, schema: pa.Schema) -> pa.Table:
+  """A tabela com exatamente as colunas e os tipos de `schema`."""
+  if tabela.schema == schema:
+    return tabela
+  colunas = [
+    tabela.column(campo.name).cast(campo.type) if campo.name in tabela.column_names
+    else pa.nulls(tabela.num_rows, campo.type)
+    for campo in schema
+  ]
+  return pa.Table.from_arrays(colunas, schema=schema)
+
+
+def _esvaziar(buffer: io.BytesIO) -> bytes:
+  conteudo = buffer.getvalue()
+  buffer.seek(0)
+  buffer.truncate()
+  return conteudo
+
+
+def criar_resposta_streaming(
+    lotes: AsyncIterator[Lote], formato: str
+) -> StreamingResponse:
+  """Monta a resposta em streaming no formato escolhido por `escolher_formato`."""
+  gerador = gerar_arrow(lotes) if formato == "arrow" else gerar_ndjson(lotes)
+  return StreamingResponse(gerador, media_type=TIPOS_POR_FORMATO[formato])
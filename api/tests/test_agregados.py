@@ -0,0 +1,98 @@
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+import main
+from agregados import AgregadosEna
+from series import IndiceSeries
+
+RESERVATORIOS = ((1, "SE", "GRANDE"), (2, "SE", "PARANA"), (3, "S", "IGUACU"))
+
+
+def _linhas(inicio, fim, acrescimo=0.0):
+  linhas = []
+  dia = inicio
+  while dia <= fim:
+    for cod, subsistema, bacia in RESERVATORIOS:
+      linhas.append({
+        "ear_data": dia, "cod_resplanejamento": cod, "nom_subsistema": subsistema, "nom_bacia": bacia,
+        "nom_ree": None, "ear_total_mwmes": cod + acrescimo,
+        "ear_reservatorio_percentual": None if cod == 3 else 50.0,
+      })
+    dia += timedelta(days=1)
+  return pa.Table.from_pylist(linhas)
+
+
+class TestAgregadosEna(unittest.TestCase):
+
+  def setUp(self):
+    self.agregados = AgregadosEna()
+    self.agregados.atualizar(_linhas(date(2023, 1, 1), date(2023, 2, 15)))
+
+  def test_somas_e_medias_por_periodo(self):
+    mensal = self.agregados.consultar("mensal", "nom_subsistema", date(2023, 1, 20), date(2023, 1, 31), "se")
+    self.assertEqual(len(mensal), 1)
+    self.assertEqual(mensal[0]["periodo"], date(2023, 1, 1))
+    self.assertEqual(mensal[0]["dias"], 31)
+    self.assertEqual(mensal[0]["ear_total_mwmes_soma"], 93.0)
+    self.assertEqual(mensal[0]["ear_total_mwmes_media"], 1.5)
+
+    semanal = self.agregados.consultar("semanal", "nom_bacia", date(2023, 2, 15), date(2023, 2, 15))
+    self.assertEqual([linha["nom_bacia"] for linha in semanal], ["GRANDE", "IGUACU", "PARANA"])
+    # A semana começa na segunda-feira e só tem os dias já carregados.
+    self.assertEqual(semanal[0]["periodo"], date(2023, 2, 13))
+    self.assertEqual(semanal[0]["dias"], 3)
+    self.assertIsNone(semanal[1]["ear_reservatorio_percentual_media"])
+
+  def test_periodos_anteriores_a_cobertura_sao_parciais(self):
+    # 01/01/2023 é um domingo: a semana começa em 26/12/2022, antes do primeiro dia carregado.
+    semanal = self.agregados.consultar("semanal", "nom_subsistema", date(2023, 1, 1), date(2023, 1, 2), "SE")
+    self.assertEqual([(linha["periodo"], linha["dias"], linha["parcial"]) for linha in semanal], [
+      (date(2022, 12, 26), 1, True), (date(2023, 1, 2), 7, False),
+    ])
+    mensal = self.agregados.consultar("mensal", "nom_subsistema", date(2022, 12, 1), date(2023, 1, 1), "SE")
+    self.assertEqual([(linha["periodo"], linha["parcial"]) for linha in mensal], [(date(2023, 1, 1), False)])
+    self.assertEqual((self.agregados.primeira_data, self.agregados.ultima_data), (date(2023, 1, 1), date(2023, 2, 15)))
+
+  def test_dias_novos_recalculam_apenas_os_periodos_afetados(self):
+    antes = self.agregados.consultar("mensal", "nom_subsistema", date(2023, 1, 1), date(2023, 1, 1), "SE")
+    self.agregados.atualizar(_linhas(date(2023, 2, 15), date(2023, 2, 16), acrescimo=10.0))
+
+    depois = self.agregados.consultar("mensal", "nom_subsistema", date(2023, 1, 1), date(2023, 2, 1), "SE")
+    self.assertEqual(depois[0], antes[0])
+    # 15/02 foi substituído, e não somado de novo; 16/02 é um dia novo.
+    self.assertEqual(depois[1]["dias"], 16)
+    self.assertEqual(depois[1]["ear_total_mwmes_soma"], 14 * 3.0 + 2 * 23.0)
+
+  def test_agregados_acompanham_o_indice_de_series(self):
+    indice = IndiceSeries()
+    agregados = AgregadosEna()
+    indice.assinar(agregados.atualizar)
+    indice.atualizar(_linhas(date(2023, 3, 1), date(2023, 3, 2)))
+
+    diario = agregados.consultar("diario", "nom_subsistema", date(2023, 3, 2), date(2023, 3, 2), "S")
+    self.assertEqual(diario[0]["ear_total_mwmes_soma"], 3.0)
+
+
+class TestEndpointAgregados(unittest.TestCase):
+
+  def test_agregados_do_intervalo(self):
+    indice = IndiceSeries()
+    agregados = AgregadosEna()
+    indice.assinar(agregados.atualizar)
+    indice.atualizar(_linhas(date(2023, 1, 1), date(2023, 1, 31)))
+    client = TestClient(main.app)
+
+    with patch("main.indice_series", indice), patch("main.agregados_ena", agregados):
+      response = client.get("/agregados?data_inicio=2023-01-01&data_fim=2023-01-31&nivel=mensal&dimensao=nom_bacia")
+      invalido = client.get("/agregados?data_inicio=2023-01-01&data_fim=2023-01-31&nivel=anual")
+
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()["total_registros"], 3)
+    self.assertEqual(response.json()["dados"][0]["nom_bacia"], "GRANDE")
+    self.assertEqual(response.json()["cobertura_inicio"], "2023-01-01")
+    self.assertEqual(response.json()["cobertura_fim"], "2023-01-31")
+    self.assertEqual(invalido.status_code, 422)
@@ -0,0 +1,110 @@
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+
+import main
+from atributos import PipelineAtributos
+from series import IndiceSeries
+
+
+def _tabela(inicio, fim, codigos=(5, 2, 9), semente=0):
+  gerador = np.random.default_rng(semente)
+  linhas = []
+  dia = inicio
+  while dia <= fim:
+    for cod in codigos:
+      linhas.append({
+        "ear_data": dia, "cod_resplanejamento": cod,
+        "ear_total_mwmes": float(gerador.normal(1000 * cod, 50)),
+        # Um dia sem leitura por mês, para exercitar as janelas incompletas.
+        "ear_reservatorio_percentual": None if dia.day == 10 else float(gerador.uniform(0, 100)),
+      })
+    dia += timedelta(days=1)
+  return pa.Table.from_pylist(linhas)
+
+
+class TestPipelineAtributos(unittest.TestCase):
+
+  def setUp(self):
+    self.tabela = _tabela(date(2021, 1, 1), date(2023, 3, 31))
+    self.pipeline = PipelineAtributos(uri=None, defasagens=(1, 7), janelas=(7, 30))
+    self.pipeline.atualizar(self.tabela)
+
+  def test_atributos_iguais_aos_do_pandas(self):
+    atributos = self.pipeline.calcular(date(2023, 1, 1), date(2023, 3, 31), cod_resplanejamento=9).to_pandas()
+    self.assertEqual(len(atributos), 90)
+
+    dados = self.tabela.to_pandas()
+    dados = dados[dados.cod_resplanejamento == 9]
+    serie = dados.set_index(pd.to_datetime(dados.ear_data))["ear_reservatorio_percentual"].asfreq("D")
+    esperado = {
+      "ear_reservatorio_percentual_defasagem_7d": serie.shift(7),
+      "ear_reservatorio_percentual_media_30d": serie.rolling(30).mean(),
+      "ear_reservatorio_percentual_desvio_30d": serie.rolling(30).std(),
+      "ear_reservatorio_percentual_variacao_anual": serie - serie.shift(365),
+    }
+    datas = pd.to_datetime(atributos.ena_data)
+    for coluna, valores in esperado.items():
+      np.testing.assert_allclose(
+        atributos[coluna].astype(float).values, valores.reindex(datas).values, err_msg=coluna
+      )
+
+  def test_atributos_nulos_antes_do_inicio_da_matriz(self):
+    atributos = self.pipeline.calcular(date(2021, 1, 1), date(2022, 1, 1), cod_resplanejamento=2)
+    datas = atributos.column("ena_data").to_pylist()
+
+    def primeiro_dia_com_valor(coluna):
+      valores = atributos.column(coluna).to_pylist()
+      return datas[next(i for i, valor in enumerate(valores) if valor is not None)]
+
+    self.assertEqual(datas[0], date(2021, 1, 1))
+    self.assertEqual(primeiro_dia_com_valor("ear_total_mwmes_defasagem_1d"), date(2021, 1, 2))
+    self.assertEqual(primeiro_dia_com_valor("ear_total_mwmes_defasagem_7d"), date(2021, 1, 8))
+    self.assertEqual(primeiro_dia_com_valor("ear_total_mwmes_media_7d"), date(2021, 1, 7))
+    self.assertEqual(primeiro_dia_com_valor("ear_total_mwmes_desvio_30d"), date(2021, 1, 30))
+    self.assertEqual(primeiro_dia_com_valor("ear_total_mwmes_variacao_anual"), date(2022, 1, 1))
+
+  def test_atributos_de_calendario(self):
+    linha = self.pipeline.calcular(date(2023, 3, 6), date(2023, 3, 6), cod_resplanejamento=2).to_pylist()[0]
+    self.assertEqual((linha["ano"], linha["mes"], linha["dia_ano"], linha["dia_semana"]), (2023, 3, 65, 0))
+
+  def test_dia_novo_recalcula_e_grava_apenas_a_janela_final(self):
+    with tempfile.TemporaryDirectory() as diretorio:
+      pipeline = PipelineAtributos(uri=diretorio, defasagens=(1,), janelas=(7,))
+      pipeline.atualizar(self.tabela)
+      self.assertEqual(ds.dataset(diretorio, partitioning="hive").count_rows(), self.tabela.num_rows)
+
+      with patch("atributos.gravar_dataset_parquet") as gravar:
+        pipeline.atualizar(_tabela(date(2023, 4, 1), date(2023, 4, 1), semente=1))
+
+      gravada = gravar.call_args.args[0]
+      self.assertEqual(pipeline.ultimo_recalculo, {"data_inicio": date(2023, 4, 1), "data_fim": date(2023, 4, 1)})
+      self.assertEqual(gravada.column("ena_data").to_pylist(), [date(2023, 4, 1)] * 3)
+      self.assertIsNotNone(gravada.column("ear_total_mwmes_defasagem_1d")[0].as_py())
+
+
+class TestEndpointAtributos(unittest.TestCase):
+
+  def test_atributos_em_arrow_e_parquet(self):
+    indice = IndiceSeries()
+    pipeline = PipelineAtributos(uri=None, defasagens=(1,), janelas=(7,))
+    indice.assinar(pipeline.atualizar)
+    indice.atualizar(_tabela(date(2023, 1, 1), date(2023, 1, 31)))
+    client = TestClient(main.app)
+
+    with patch("main.indice_series", indice), patch("main.pipeline_atributos", pipeline):
+      arrow = client.get("/atributos?data_inicio=2023-01-30&data_fim=2023-01-31")
+      parquet = client.get("/atributos?data_inicio=2023-01-30&data_fim=2023-01-31&formato=parquet")
+
+    self.assertEqual(arrow.headers["content-type"], "application/vnd.apache.arrow.stream")
+    self.assertEqual(pa.ipc.open_stream(arrow.content).read_all().num_rows, 6)
+    self.assertEqual(pq.read_table(pa.BufferReader(parquet.content)).num_rows, 6)
+    self.assertEqual(parquet.headers["content-type"], "application/vnd.apache.parquet")
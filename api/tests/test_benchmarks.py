@@ -0,0 +1,154 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import date
+
+import httpx
+
+import service
+from benchmarks import dados
+from benchmarks.cenarios import listar_cenarios, montar_requisicoes
+from benchmarks.inicializacao import resumir_importtime
+from benchmarks.nuvem_falsa import BigQueryFalso, gcs_local
+from benchmarks.servidor_ons import ServidorONS
+from consultas import BackendBigQuery, BackendParquet, gravar_dataset_parquet
+from downloads import CacheArquivosONS
+from leitura import ler_csv_arrow, ler_csv_filtrado, ler_parquet_em_tabela
+from normalizacao import normalizar_tabela
+
+
+class TestDadosSinteticos(unittest.TestCase):
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+    self.recursos = dados.gerar_arquivos(self.diretorio.name, [2023], reservatorios=5)
+
+  def tearDown(self):
+    self.diretorio.cleanup()
+
+  def test_csv_no_formato_da_ons(self):
+    csv = next(r for r in self.recursos if r["format"] == "CSV")
+    tabela = ler_csv_arrow(csv["arquivo"], date(2023, 1, 1), date(2023, 12, 31))
+    normalizada, relatorio = normalizar_tabela(tabela, "EAR_DIARIO_RESERVATORIOS_2023.csv")
+
+    self.assertEqual(tabela.num_rows, 365 * 5)
+    self.assertEqual(relatorio["linhas_invalidas"], 0)
+    self.assertIn("PARANÁ", normalizada.column("nom_bacia").to_pylist())
+    self.assertEqual(len(ler_csv_filtrado(csv["arquivo"], date(2023, 2, 1), date(2023, 2, 28))), 28 * 5)
+
+  def test_parquet_com_os_mesmos_dados(self):
+    parquet = next(r for r in self.recursos if r["format"] == "PARQUET")
+    tabela = ler_parquet_em_tabela(parquet["arquivo"], date(2023, 2, 1), date(2023, 2, 28))
+    self.assertEqual(tabela.num_rows, 28 * 5)
+    self.assertEqual(dados.gerar_tabela_ano(2023, 5).slice(31 * 5, 28 * 5), tabela)
+
+
+class TestServidorONS(unittest.TestCase):
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+    recursos = dados.gerar_arquivos(self.diretorio.name, [2022, 2023], ("PARQUET",), reservatorios=3)
+    self.servidor = ServidorONS(recursos).iniciar()
+
+  def tearDown(self):
+    self.servidor.parar()
+    self.diretorio.cleanup()
+
+  def test_catalogo_e_download_com_revalidacao(self):
+    cache = CacheArquivosONS(os.path.join(self.diretorio.name, "cache"))
+
+    async def baixar_duas_vezes():
+      async with httpx.AsyncClient() as client:
+        pacote = (await client.get(self.servidor.url_pacote)).json()
+        indice = service.indexar_recursos_por_ano(pacote["result"]["resources"])
+        # Sem o ano, o cache não trata o arquivo como encerrado e revalida com o ETag.
+        recurso = {**indice[2023], "ano": None}
+        url = self.servidor.url_download_recurso + recurso["id"] + "/download"
+        return indice, [await cache.obter_arquivo(recurso, url, client) for _ in range(2)]
+
+    indice, caminhos = asyncio.run(baixar_duas_vezes())
+
+    self.assertEqual(sorted(indice), [2022, 2023])
+    self.assertEqual(caminhos[0], caminhos[1])
+    with open(caminhos[0], "rb") as baixado, open(
+        os.path.join(self.diretorio.name, "EAR_DIARIO_RESERVATORIOS_2023.parquet"), "rb") as original:
+      self.assertEqual(baixado.read(), original.read())
+    self.assertEqual(self.servidor.estatisticas()["downloads"], 1)
+    self.assertEqual(self.servidor.estatisticas()["respostas_304"], 1)
+
+
+class TestBigQueryFalso(unittest.TestCase):
+  """O BigQuery falso precisa responder como o backend Parquet sobre os mesmos dados."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.diretorio = tempfile.TemporaryDirectory()
+    tabela = dados.tabela_normalizada([2023], reservatorios=4)
+    gravar_dataset_parquet(tabela, cls.diretorio.name)
+    cls.bigquery = BigQueryFalso(tabela)
+    cls.backend_bigquery = BackendBigQuery(lambda: cls.bigquery, lambda: "projeto.dataset.tabela")
+    cls.backend_parquet = BackendParquet(cls.diretorio.name)
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.diretorio.cleanup()
+
+  def _chaves(self, registros):
+    return [(r["ena_data"], r["cod_resplanejamento"]) for r in registros]
+
+  def test_paginas_contagens_e_cursor(self):
+    intervalo = (date(2023, 3, 1), date(2023, 5, 31))
+    filtros = {"nom_subsistema": "SE"}
+    posicao = {"ena_data": date(2023, 5, 20), "cod_resplanejamento": 1}
+    for backend_filtros, backend_posicao in ((None, None), (filtros, None), (None, posicao)):
+      self.assertEqual(
+        self._chaves(self.backend_bigquery.consultar_pagina(*intervalo, 15, 10, backend_posicao, backend_filtros)),
+        self._chaves(self.backend_parquet.consultar_pagina(*intervalo, 15, 10, backend_posicao, backend_filtros)),
+      )
+      self.assertEqual(
+        self.backend_bigquery.contar(*intervalo, backend_filtros),
+        self.backend_parquet.contar(*intervalo, backend_filtros),
+      )
+    self.assertGreater(self.bigquery.bytes_processados, 0)
+
+  def test_lotes_em_paginas(self):
+    lotes = list(self.backend_bigquery.iterar_lotes(date(2023, 1, 1), date(2023, 1, 31), 50))
+    self.assertEqual([len(lote) for lote in lotes], [50, 50, 24])
+    self.assertEqual(lotes[0][0]["ena_data"], date(2023, 1, 31))
+
+
+class TestInfraestruturaBenchmark(unittest.TestCase):
+
+  def test_gcs_local_grava_no_diretorio(self):
+    with tempfile.TemporaryDirectory() as diretorio:
+      sistema = gcs_local(diretorio)()
+      with sistema.open("gs://bucket/dt=2024-01-01/arquivo.parquet", "wb") as arquivo:
+        arquivo.write(b"conteudo")
+      self.assertTrue(os.path.exists(os.path.join(diretorio, "bucket", "dt=2024-01-01", "arquivo.parquet")))
+
+  def test_requisicoes_dentro_dos_dados(self):
+    cenario = next(c for c in listar_cenarios(rapido=True) if c["nome"] == "consultar/bigquery/30d/tamanho=20")
+    requisicoes = montar_requisicoes(cenario)
+    inicio_dados, fim_dados = dados.periodo_dos_dados(cenario["anos"])
+
+    self.assertEqual(len(requisicoes), cenario["requisicoes"])
+    self.assertEqual(requisicoes, montar_requisicoes(cenario))
+    for requisicao in requisicoes:
+      inicio = date.fromisoformat(requisicao["params"]["data_inicio"])
+      fim = date.fromisoformat(requisicao["params"]["data_fim"])
+      self.assertEqual((fim - inicio).days, 29)
+      self.assertTrue(inicio_dados <= inicio and fim <= fim_dados)
+
+  def test_resumo_do_importtime(self):
+    saida = "\n".join([
+      "import time: self [us] | cumulative | imported package",
+      "import time:       100 |        100 |     pyarrow.lib",
+      "import time:        50 |        150 |   pyarrow",
+      "import time:       300 |        300 |     fastapi.routing",
+      "import time:        20 |        320 |   fastapi",
+      "import time:        30 |        500 | main",
+    ])
+    resumo = resumir_importtime(saida)
+    self.assertEqual(resumo["total_ms"], 0.5)
+    self.assertEqual(resumo["por_pacote_ms"], {"fastapi": 0.3, "pyarrow": 0.1, "main": 0.0})
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from datetime import date, timedelta
+
+import pyarrow as pa
+
+import service
+from benchmarks.nuvem_falsa import BigQueryFalso
+from cache import CacheParticoes
+
+
+def _registros_diarios(inicio, fim, reservatorios=(1, 2)):
+  registros = []
+  dia = inicio
+  while dia <= fim:
+    registros += [{"ena_data": dia, "cod_resplanejamento": cod} for cod in reservatorios]
+    dia += timedelta(days=1)
+  return registros
+
+
+class TestCacheParticoes(unittest.TestCase):
+
+  def test_blocos_mensais(self):
+    cache = CacheParticoes("mes")
+    blocos = cache.blocos_do_intervalo(date(2023, 1, 15), date(2023, 3, 2))
+    self.assertEqual(blocos, [
+      (date(2023, 3, 1), date(2023, 3, 31)),
+      (date(2023, 2, 1), date(2023, 2, 28)),
+      (date(2023, 1, 1), date(2023, 1, 31)),
+    ])
+
+  def test_ttl_por_idade_da_particao(self):
+    cache = CacheParticoes("dia")
+    hoje = date(2025, 6, 30)
+    self.assertEqual(cache.ttl_do_bloco((date(2020, 1, 1), date(2020, 1, 1)), hoje), float("inf"))
+    recente = cache.ttl_do_bloco((date(2025, 6, 29), date(2025, 6, 29)), hoje)
+    ano_corrente = cache.ttl_do_bloco((date(2025, 2, 1), date(2025, 2, 1)), hoje)
+    self.assertLess(recente, ano_corrente)
+
+  def test_remocao_lru_por_memoria(self):
+    cache = CacheParticoes("dia", memoria_maxima_bytes=10_000)
+    registros = [{"valor": "x" * 100} for _ in range(20)]
+    for dia in range(1, 6):
+      cache.guardar((date(2020, 1, dia), date(2020, 1, dia)), registros)
+    self.assertLessEqual(cache.memoria_em_uso, 10_000)
+    self.assertGreater(cache.remocoes, 0)
+    self.assertIsNotNone(cache.obter((date(2020, 1, 5), date(2020, 1, 5))))
+    self.assertIsNone(cache.obter((date(2020, 1, 1), date(2020, 1, 1))))
+
+
+class TestConsultaComCache(unittest.TestCase):
+
+  def setUp(self):
+    self.cliente = BigQueryFalso(pa.Table.from_pylist(_registros_diarios(date(2022, 12, 1), date(2023, 4, 30))))
+    self.cliente_original = service.bq_client
+    service.definir_cliente_bigquery(self.cliente)
+
+  def tearDown(self):
+    service.definir_cliente_bigquery(self.cliente_original)
+
+  def test_intervalos_sobrepostos_consultam_apenas_blocos_faltantes(self):
+    primeiro = asyncio.run(service.consultar_dados_por_intervalo(date(2023, 1, 10), date(2023, 2, 20)))
+    segundo = asyncio.run(service.consultar_dados_por_intervalo(date(2023, 2, 1), date(2023, 3, 15)))
+
+    self.assertEqual(len(primeiro), (date(2023, 2, 20) - date(2023, 1, 10)).days * 2 + 2)
+    self.assertEqual(segundo[0]["ena_data"], date(2023, 3, 15))
+    self.assertEqual(segundo[-1]["ena_data"], date(2023, 2, 1))
+    self.assertEqual(self.cliente.intervalos, [
+      (date(2023, 1, 1), date(2023, 2, 28)),
+      (date(2023, 3, 1), date(2023, 3, 31)),
+    ])
+    self.assertEqual(service.cache_resultados.acertos, 1)
+
+  def test_pagina_servida_pelo_cache_com_cursor(self):
+    dados, cursor, total = asyncio.run(
+      service.consultar_pagina_com_total(date(2023, 1, 1), date(2023, 1, 31), 10)
+    )
+    posicao = service.decodificar_cursor(cursor, date(2023, 1, 1), date(2023, 1, 31))
+    seguinte, _, _ = asyncio.run(
+      service.consultar_pagina_com_total(date(2023, 1, 1), date(2023, 1, 31), 10, posicao=posicao)
+    )
+
+    self.assertEqual(total, 62)
+    self.assertEqual(dados[0], {"ena_data": date(2023, 1, 31), "cod_resplanejamento": 2})
+    self.assertEqual(seguinte[0]["ena_data"], date(2023, 1, 26))
+    self.assertEqual(self.cliente.consultas, 1)
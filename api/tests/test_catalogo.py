@@ -0,0 +1,81 @@
+import asyncio
+import time
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from catalogo import CatalogoONS
+
+RECURSOS = [
+  {"id": "1", "name": "ear_2022", "format": "CSV", "url": "http://ons/ear_reservatorio_2022.csv"},
+  {"id": "2", "name": "ear_2022", "format": "PARQUET", "url": "http://ons/ear_reservatorio_2022.parquet"},
+  {"id": "3", "name": "ear_2023", "format": "CSV", "url": "http://ons/ear_reservatorio_2023.csv"},
+  {"id": "4", "name": "dicionario", "format": "PDF", "url": "http://ons/dicionario.pdf"},
+]
+
+
+class BuscaFalsa:
+
+  def __init__(self, *respostas):
+    self.respostas = list(respostas)
+    self.chamadas = 0
+
+  async def __call__(self):
+    self.chamadas += 1
+    resposta = self.respostas.pop(0) if len(self.respostas) > 1 else self.respostas[0]
+    if isinstance(resposta, Exception):
+      raise resposta
+    return resposta
+
+
+class TestCatalogoONS(unittest.TestCase):
+
+  def test_indice_prefere_parquet(self):
+    catalogo = CatalogoONS(BuscaFalsa(RECURSOS))
+    recursos = asyncio.run(catalogo.recursos_para_intervalo(date(2021, 6, 1), date(2023, 1, 1)))
+    self.assertEqual([r["id"] for r in recursos], ["2", "3"])
+
+  def test_indice_carregado_nao_acessa_a_rede(self):
+    busca = BuscaFalsa(RECURSOS)
+    catalogo = CatalogoONS(busca)
+
+    async def duas_consultas():
+      await catalogo.recursos_para_intervalo(date(2022, 1, 1), date(2022, 12, 31))
+      await catalogo.recursos_para_intervalo(date(2023, 1, 1), date(2023, 12, 31))
+
+    asyncio.run(duas_consultas())
+    self.assertEqual(busca.chamadas, 1)
+
+  def test_serve_copia_antiga_quando_a_ons_falha(self):
+    busca = BuscaFalsa(RECURSOS, ConnectionError("ONS fora do ar"))
+    catalogo = CatalogoONS(busca, ttl=0)
+
+    async def consultar_com_catalogo_expirado():
+      await catalogo.obter_indice()
+      catalogo.atualizado_em = time.time() - 10
+      indice = await catalogo.obter_indice()
+      await catalogo._tarefa_atualizacao
+      return indice
+
+    indice = asyncio.run(consultar_com_catalogo_expirado())
+    self.assertEqual(sorted(indice), [2022, 2023])
+    self.assertEqual(busca.chamadas, 2)
+    self.assertEqual(catalogo.estado()["ultimo_erro"], "ONS fora do ar")
+    self.assertEqual(sorted(catalogo.indice), [2022, 2023])
+
+
+class TestEndpointCatalogo(unittest.TestCase):
+
+  def test_catalogo_mostra_anos_indexados(self):
+    catalogo = CatalogoONS(BuscaFalsa(RECURSOS))
+    asyncio.run(catalogo.atualizar())
+    with patch("main.catalogo_ons", catalogo):
+      response = TestClient(main.app).get("/catalogo")
+
+    self.assertEqual(response.status_code, 200)
+    data = response.json()
+    self.assertTrue(data["carregado"])
+    self.assertEqual(data["anos"]["2022"]["formato"], "PARQUET")
@@ -0,0 +1,95 @@
+import asyncio
+import tempfile
+import unittest
+from datetime import date
+
+import httpx
+
+from cliente_ons import ClienteONS
+from downloads import CacheArquivosONS
+
+URL = "https://dados.ons.org.br/dataset/pacote/resource/abc/download"
+
+
+class ServidorInstavel:
+  """Falha com as respostas (ou exceções) informadas antes de responder normalmente."""
+
+  def __init__(self, falhas=(), atraso=0.0):
+    self.falhas = list(falhas)
+    self.atraso = atraso
+    self.requisicoes = 0
+    self.em_andamento = 0
+    self.maximo_em_andamento = 0
+
+  async def __call__(self, request):
+    self.requisicoes += 1
+    self.em_andamento += 1
+    self.maximo_em_andamento = max(self.maximo_em_andamento, self.em_andamento)
+    try:
+      await asyncio.sleep(self.atraso)
+      if self.falhas:
+        falha = self.falhas.pop(0)
+        if isinstance(falha, Exception):
+          raise falha
+        return httpx.Response(falha)
+      if request.url.path.endswith("/download"):
+        return httpx.Response(200, content=b"a;b\n1;2\n")
+      return httpx.Response(200, json={"result": {"resources": [{"id": "abc"}]}})
+    finally:
+      self.em_andamento -= 1
+
+
+class TestClienteONS(unittest.TestCase):
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+    self.cache = CacheArquivosONS(self.diretorio.name)
+
+  def tearDown(self):
+    self.diretorio.cleanup()
+
+  def _cliente(self, servidor, **opcoes):
+    return ClienteONS(transporte=httpx.MockTransport(servidor), espera_inicial=0.001, **opcoes)
+
+  def _recurso(self, id_recurso="abc"):
+    return {"id": id_recurso, "name": f"ear_{id_recurso}", "format": "CSV", "ano": date.today().year}
+
+  def test_repete_falhas_transitorias(self):
+    servidor = ServidorInstavel([503, httpx.ConnectError("recusada")])
+    cliente = self._cliente(servidor)
+
+    async def cenario():
+      try:
+        return await cliente.baixar(self._recurso(), URL, self.cache)
+      finally:
+        await cliente.fechar()
+
+    caminho = asyncio.run(cenario())
+    self.assertEqual(servidor.requisicoes, 3)
+    with open(caminho, "rb") as arquivo:
+      self.assertEqual(arquivo.read(), b"a;b\n1;2\n")
+
+  def test_nao_repete_erros_definitivos(self):
+    servidor = ServidorInstavel([404])
+    cliente = self._cliente(servidor)
+    with self.assertRaises(httpx.HTTPStatusError):
+      asyncio.run(cliente.obter_json("https://dados.ons.org.br/api/3/action/package_show"))
+    self.assertEqual(servidor.requisicoes, 1)
+
+  def test_limita_downloads_simultaneos(self):
+    servidor = ServidorInstavel(atraso=0.02)
+    cliente = self._cliente(servidor, downloads_simultaneos=2)
+
+    async def cenario():
+      recursos = [self._recurso(str(i)) for i in range(6)]
+      await asyncio.gather(*(cliente.baixar(recurso, URL, self.cache) for recurso in recursos))
+      await cliente.fechar()
+
+    asyncio.run(cenario())
+    self.assertEqual(servidor.requisicoes, 6)
+    self.assertEqual(servidor.maximo_em_andamento, 2)
+
+  def test_prazo_por_recurso(self):
+    cliente = self._cliente(ServidorInstavel(atraso=1.0), timeout_recurso=0.05)
+    with self.assertRaises(asyncio.TimeoutError):
+      asyncio.run(cliente.baixar(self._recurso(), URL, self.cache))
@@ -0,0 +1,87 @@
+import asyncio
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import pyarrow as pa
+
+import service
+from consultas import BackendParquet, gravar_dataset_parquet
+from normalizacao import normalizar_tabela
+
+
+def _tabela_silver(inicio, fim):
+  linhas = []
+  dia = inicio
+  while dia <= fim:
+    for cod, subsistema in ((1, "SE"), (2, "SE"), (3, "S")):
+      linhas.append({"ear_data": dia, "cod_resplanejamento": cod, "nom_subsistema": subsistema})
+    dia += timedelta(days=1)
+  return normalizar_tabela(pa.Table.from_pylist(linhas), "ear.parquet")[0]
+
+
+class TestBackendParquet(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.diretorio = tempfile.TemporaryDirectory()
+    gravar_dataset_parquet(_tabela_silver(date(2022, 11, 1), date(2023, 3, 31)), cls.diretorio.name)
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.diretorio.cleanup()
+
+  def setUp(self):
+    self.backend = BackendParquet(self.diretorio.name)
+
+  def test_intervalo_ordenado_com_a_coluna_da_api(self):
+    registros = self.backend.consultar_intervalo(date(2022, 12, 31), date(2023, 1, 1))
+    chaves = [(r["ena_data"], r["cod_resplanejamento"]) for r in registros]
+    self.assertEqual(chaves, sorted(chaves, reverse=True))
+    self.assertEqual(len(registros), 6)
+    self.assertNotIn("year", registros[0])
+    self.assertNotIn("ear_data", registros[0])
+
+  def test_filtros_e_contagem(self):
+    filtros = {"nom_subsistema": "S"}
+    self.assertEqual(self.backend.contar(date(2023, 1, 1), date(2023, 1, 31), filtros), 31)
+    registros = self.backend.consultar_intervalo(date(2023, 1, 1), date(2023, 1, 2), {"cod_resplanejamento": 2})
+    self.assertEqual([r["cod_resplanejamento"] for r in registros], [2, 2])
+    tabela = self.backend.consultar_tabela(date(2023, 1, 1), date(2023, 1, 2), {"cod_resplanejamento": 2})
+    self.assertEqual(tabela.column("cod_resplanejamento").to_pylist(), [2, 2])
+
+  def test_pagina_por_deslocamento_e_por_keyset(self):
+    por_deslocamento = self.backend.consultar_pagina(date(2023, 1, 1), date(2023, 3, 31), 4, 3)
+    posicao = {"ena_data": date(2023, 3, 31), "cod_resplanejamento": 1, "pagina": 2}
+    por_keyset = self.backend.consultar_pagina(date(2023, 1, 1), date(2023, 3, 31), 4, 0, posicao)
+    self.assertEqual(por_deslocamento, por_keyset)
+    self.assertEqual(por_keyset[0]["ena_data"], date(2023, 3, 30))
+
+  def test_lotes_atravessam_particoes_em_ordem(self):
+    lotes = list(self.backend.iterar_lotes(date(2022, 12, 30), date(2023, 1, 2), 5))
+    registros = [r for lote in lotes for r in lote]
+    self.assertEqual(len(registros), 12)
+    self.assertEqual(registros[0]["ena_data"], date(2023, 1, 2))
+    self.assertEqual(registros[-1]["ena_data"], date(2022, 12, 30))
+    self.assertTrue(all(len(lote) <= 5 for lote in lotes))
+
+  def test_regravar_substitui_a_particao(self):
+    with tempfile.TemporaryDirectory() as diretorio:
+      gravar_dataset_parquet(_tabela_silver(date(2023, 1, 1), date(2023, 1, 31)), diretorio)
+      gravar_dataset_parquet(_tabela_silver(date(2023, 1, 1), date(2023, 1, 31)), diretorio)
+      self.assertEqual(BackendParquet(diretorio).contar(date(2023, 1, 1), date(2023, 1, 31)), 93)
+
+  def test_servico_com_backend_parquet(self):
+    original = service.backend_consulta
+    service.definir_backend_consulta(self.backend)
+    try:
+      dados, cursor, total = asyncio.run(service.consultar_pagina_com_total(
+        date(2022, 11, 1), date(2023, 3, 31), 10, filtros={"nom_subsistema": "SE"}
+      ))
+    finally:
+      service.definir_backend_consulta(original)
+
+    self.assertEqual(total, 2 * 151)
+    self.assertEqual(len(dados), 10)
+    self.assertIsNotNone(cursor)
+    self.assertTrue(all(r["nom_subsistema"] == "SE" for r in dados))
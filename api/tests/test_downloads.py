@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import httpx
+
+from downloads import CacheArquivosONS
+
+URL = "https://dados.ons.org.br/dataset/pacote/resource/abc/download"
+
+
+class ServidorFalso:
+  """Responde com ETag e devolve 304 quando o cliente já tem a versão atual."""
+
+  def __init__(self, conteudo=b"a;b\n1;2\n", etag='"v1"'):
+    self.conteudo = conteudo
+    self.etag = etag
+    self.requisicoes = []
+
+  def __call__(self, request):
+    self.requisicoes.append(request)
+    if request.headers.get("if-none-match") == self.etag:
+      return httpx.Response(304)
+    return httpx.Response(200, content=self.conteudo, headers={"ETag": self.etag})
+
+
+class TestCacheArquivosONS(unittest.TestCase):
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+    self.servidor = ServidorFalso()
+    self.client = httpx.AsyncClient(transport=httpx.MockTransport(self.servidor))
+
+  def tearDown(self):
+    asyncio.run(self.client.aclose())
+    self.diretorio.cleanup()
+
+  def _obter(self, cache, recurso):
+    return asyncio.run(cache.obter_arquivo(recurso, URL, self.client))
+
+  def _recurso(self, id_recurso="abc", ano=None):
+    return {"id": id_recurso, "name": f"ear_{id_recurso}", "format": "CSV", "ano": ano or date.today().year}
+
+  def test_revalida_com_etag_e_reaproveita_304(self):
+    cache = CacheArquivosONS(self.diretorio.name)
+    primeiro = self._obter(cache, self._recurso())
+    segundo = self._obter(cache, self._recurso())
+
+    self.assertEqual(primeiro, segundo)
+    with open(primeiro, "rb") as arquivo:
+      self.assertEqual(arquivo.read(), self.servidor.conteudo)
+    self.assertEqual(len(self.servidor.requisicoes), 2)
+    self.assertEqual(self.servidor.requisicoes[1].headers["if-none-match"], '"v1"')
+
+  def test_ano_encerrado_nao_acessa_a_rede(self):
+    cache = CacheArquivosONS(self.diretorio.name)
+    self._obter(cache, self._recurso(ano=2005))
+    self._obter(cache, self._recurso(ano=2005))
+    self.assertEqual(len(self.servidor.requisicoes), 1)
+
+  def test_indice_persistido_entre_instancias(self):
+    self._obter(CacheArquivosONS(self.diretorio.name), self._recurso(ano=2005))
+    self._obter(CacheArquivosONS(self.diretorio.name), self._recurso(ano=2005))
+    self.assertEqual(len(self.servidor.requisicoes), 1)
+
+  def test_remove_arquivos_menos_usados_ao_exceder_limite(self):
+    self.servidor.conteudo = b"x" * 100
+    cache = CacheArquivosONS(self.diretorio.name, tamanho_maximo_bytes=250)
+    caminhos = [self._obter(cache, self._recurso(str(i))) for i in range(3)]
+
+    self.assertLessEqual(cache.tamanho_total(), 250)
+    self.assertFalse(os.path.exists(caminhos[0]))
+    self.assertTrue(os.path.exists(caminhos[2]))
+
+  def test_acessos_gravados_em_lote(self):
+    cache = CacheArquivosONS(self.diretorio.name)
+    self._obter(cache, self._recurso(ano=2005))
+
+    with patch("downloads.CacheArquivosONS._salvar_indice", wraps=cache._salvar_indice) as salvar:
+      for _ in range(3):
+        self._obter(cache, self._recurso(ano=2005))
+      self.assertEqual(salvar.call_count, 0)
+      cache.persistir()
+      cache.persistir()
+      self.assertEqual(salvar.call_count, 1)
+
+      with patch("downloads.INTERVALO_GRAVACAO_ACESSOS", 0):
+        self._obter(cache, self._recurso(ano=2005))
+      self.assertEqual(salvar.call_count, 2)
+
+    with open(os.path.join(self.diretorio.name, "indice.json"), encoding="utf-8") as arquivo:
+      self.assertEqual(json.load(arquivo)["abc"]["ultimo_acesso"], cache._indice["abc"]["ultimo_acesso"])
+
+  def test_entrada_removida_durante_revalidacao_baixa_de_novo(self):
+    cache = CacheArquivosONS(self.diretorio.name)
+    caminho = self._obter(cache, self._recurso())
+
+    def remover_e_responder(request):
+      # Simula a remoção pelo limite de tamanho feita por um download concorrente.
+      if "abc" in cache._indice:
+        with cache._trava:
+          os.remove(cache._indice.pop("abc")["arquivo"])
+      return self.servidor(request)
+
+    self.client._transport = httpx.MockTransport(remover_e_responder)
+    segundo = self._obter(cache, self._recurso())
+
+    self.assertEqual(segundo, caminho)
+    with open(segundo, "rb") as arquivo:
+      self.assertEqual(arquivo.read(), self.servidor.conteudo)
+    self.assertEqual(len(self.servidor.requisicoes), 3)
+    self.assertNotIn("if-none-match", self.servidor.requisicoes[2].headers)
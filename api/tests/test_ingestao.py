@@ -0,0 +1,244 @@
+import asyncio
+import os
+import re
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import service
+from consultas import BackendBigQuery
+from esquema import ESQUEMA_ENA_CONSOLIDADO
+from ingestao import (
+  IngestorIncremental, MarcasIngestao, STATUS_CARREGADO, STATUS_ERRO, STATUS_SEM_ALTERACOES,
+  STATUS_SEM_NOVOS_DIAS,
+)
+from normalizacao import ESQUEMA_ARROW_ENA, normalizar_tabela
+
+RECURSO_2024 = {"id": "rec-2024", "ano": 2024, "name": "ear_2024", "format": "PARQUET", "last_modified": "v1"}
+
+
+def _tabela_tipada(data_inicio, data_fim):
+  dias = [data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1)]
+  medidas = {campo.name: 1.0 for campo in ESQUEMA_ARROW_ENA if pa.types.is_floating(campo.type)}
+  linhas = [
+    {"ear_data": dia, "cod_resplanejamento": cod, "nom_reservatorio": "R", "nom_bacia": "B",
+     "nom_subsistema": "SE", "tip_reservatorio": "T", **medidas}
+    for dia in dias for cod in (1, 2)
+  ]
+  return normalizar_tabela(pa.Table.from_pylist(linhas), "ear_2024.parquet")[0]
+
+
+class ArquivoONSFalso:
+  """Substitui ler_recurso_normalizado com um arquivo que vai até `ultimo_dia`."""
+
+  def __init__(self, ultimo_dia):
+    self.ultimo_dia = ultimo_dia
+    self.chamadas = []
+
+  async def __call__(self, recurso, data_inicio, data_fim):
+    self.chamadas.append((data_inicio, data_fim))
+    return _tabela_tipada(data_inicio, min(data_fim, self.ultimo_dia))
+
+
+class JobCargaFalso:
+
+  def __init__(self, erro=None):
+    self.erro = erro
+
+  def result(self):
+    if self.erro:
+      raise self.erro
+
+
+class BigQueryCargaFalso:
+  """Registra as cargas por partição como o BigQuery faria com WRITE_TRUNCATE."""
+
+  def __init__(self, erro=None):
+    self.particoes = {}
+    self.cargas = []
+    self.esquemas = []
+    self.erro = erro
+
+  def load_table_from_file(self, arquivo, destino, job_config=None):
+    self.cargas.append((destino, job_config.write_disposition))
+    if not self.erro:
+      tabela = pq.read_table(arquivo)
+      self.esquemas.append(tabela.schema)
+      self.particoes[destino.split("$")[1]] = tabela.num_rows
+    return JobCargaFalso(self.erro)
+
+
+def _valor_sqlite(valor):
+  return valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+
+
+class ConsultaSQLite:
+
+  def __init__(self, linhas):
+    self.linhas = linhas
+
+  def result(self, **opcoes):
+    return self.linhas
+
+
+class BigQuerySQLite:
+  """
+  Guarda as partições carregadas em um SQLite com as colunas de `ena_consolidado` e executa nele
+  o SQL do BackendBigQuery: uma coluna que não existe na tabela falha como no BigQuery.
+  """
+
+  def __init__(self):
+    self.colunas = [nome for nome, _, _ in ESQUEMA_ENA_CONSOLIDADO]
+    self.banco = sqlite3.connect(":memory:", check_same_thread=False)
+    self.banco.execute(f"CREATE TABLE ena_consolidado ({', '.join(self.colunas)})")
+
+  def load_table_from_file(self, arquivo, destino, job_config=None):
+    dia = date.fromisoformat(re.sub(r"(\d{4})(\d{2})(\d{2})", r"\1-\2-\3", destino.split("$")[1]))
+    self.banco.execute("DELETE FROM ena_consolidado WHERE ear_data = ?", (dia.isoformat(),))
+    linhas = [
+      tuple(_valor_sqlite(registro.get(coluna)) for coluna in self.colunas)
+      for registro in pq.read_table(arquivo).to_pylist()
+    ]
+    self.banco.executemany(f"INSERT INTO ena_consolidado VALUES ({', '.join('?' * len(self.colunas))})", linhas)
+    return JobCargaFalso()
+
+  def query(self, query, job_config=None):
+    parametros = {p.name: _valor_sqlite(p.value) for p in job_config.query_parameters}
+    cursor = self.banco.execute(re.sub(r"`[^`]+`", "ena_consolidado", query).replace("@", ":"), parametros)
+    nomes = [coluna[0] for coluna in cursor.description]
+    linhas = [dict(zip(nomes, linha)) for linha in cursor.fetchall()]
+    for linha in linhas:
+      if "ena_data" in linha:
+        linha["ena_data"] = date.fromisoformat(linha["ena_data"])
+    return ConsultaSQLite(linhas)
+
+
+class TestIngestaoIncremental(unittest.TestCase):
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+    self.uri_marcas = os.path.join(self.diretorio.name, "marcas.json")
+    self.bigquery = BigQueryCargaFalso()
+    self.cliente_original = service.bq_client
+    service.definir_cliente_bigquery(self.bigquery)
+
+  def tearDown(self):
+    service.definir_cliente_bigquery(self.cliente_original)
+    self.diretorio.cleanup()
+
+  def _executar(self, arquivo, recurso=RECURSO_2024, ingestor=None):
+    ingestor = ingestor or IngestorIncremental(MarcasIngestao(self.uri_marcas))
+    with patch("ingestao.catalogo_ons.obter_indice", AsyncMock(return_value={recurso["ano"]: recurso})), \
+        patch("service.ler_recurso_normalizado", arquivo):
+      return asyncio.run(ingestor.executar([recurso["ano"]]))
+
+  def _marca(self, id_recurso):
+    return asyncio.run(MarcasIngestao(self.uri_marcas).obter(id_recurso))
+
+  def test_marcas_sem_destino_configurado(self):
+    with self.assertRaises(RuntimeError):
+      self._executar(ArquivoONSFalso(date(2024, 1, 3)), ingestor=IngestorIncremental(MarcasIngestao(None)))
+    self.assertEqual(self.bigquery.cargas, [])
+
+  def test_primeira_carga_por_particao(self):
+    arquivo = ArquivoONSFalso(date(2024, 1, 3))
+    resultado = self._executar(arquivo)
+
+    recurso = resultado["recursos"][0]
+    self.assertEqual(recurso["status"], STATUS_CARREGADO)
+    self.assertEqual(recurso["registros"], 6)
+    self.assertEqual(recurso["particoes"], ["2024-01-01", "2024-01-02", "2024-01-03"])
+    self.assertEqual(self.bigquery.particoes, {"20240101": 2, "20240102": 2, "20240103": 2})
+    self.assertTrue(all(disposicao == "WRITE_TRUNCATE" for _, disposicao in self.bigquery.cargas))
+
+    marca = self._marca("rec-2024")
+    self.assertEqual(marca["ultima_data"], "2024-01-03")
+    self.assertEqual(marca["versao"], "v1")
+
+  def test_parquet_carregado_mantem_colunas_obrigatorias(self):
+    self._executar(ArquivoONSFalso(date(2024, 1, 2)))
+
+    obrigatorias = {nome for nome, _, modo in ESQUEMA_ENA_CONSOLIDADO if modo == "REQUIRED"}
+    self.assertEqual(len(self.bigquery.esquemas), 2)
+    for esquema in self.bigquery.esquemas:
+      self.assertEqual(esquema.names, [nome for nome, _, _ in ESQUEMA_ENA_CONSOLIDADO])
+      self.assertEqual({campo.name for campo in esquema if not campo.nullable}, obrigatorias)
+
+  def test_recurso_sem_alteracoes_nao_e_baixado(self):
+    self._executar(ArquivoONSFalso(date(2024, 1, 3)))
+    arquivo = ArquivoONSFalso(date(2024, 1, 3))
+
+    resultado = self._executar(arquivo)
+
+    self.assertEqual(resultado["recursos"][0]["status"], STATUS_SEM_ALTERACOES)
+    self.assertEqual(arquivo.chamadas, [])
+
+  def test_nova_versao_carrega_apenas_os_dias_novos(self):
+    self._executar(ArquivoONSFalso(date(2024, 1, 3)))
+    arquivo = ArquivoONSFalso(date(2024, 1, 5))
+
+    resultado = self._executar(arquivo, {**RECURSO_2024, "last_modified": "v2"})
+
+    self.assertEqual(arquivo.chamadas, [(date(2024, 1, 4), date(2024, 12, 31))])
+    self.assertEqual(resultado["recursos"][0]["particoes"], ["2024-01-04", "2024-01-05"])
+    self.assertEqual(self._marca("rec-2024")["registros"], 10)
+
+  def test_nova_versao_sem_dias_novos(self):
+    self._executar(ArquivoONSFalso(date(2024, 1, 3)))
+    resultado = self._executar(ArquivoONSFalso(date(2024, 1, 3)), {**RECURSO_2024, "last_modified": "v2"})
+
+    self.assertEqual(resultado["recursos"][0]["status"], STATUS_SEM_NOVOS_DIAS)
+    self.assertEqual(self._marca("rec-2024")["versao"], "v2")
+
+  def test_falha_na_carga_nao_avanca_a_marca(self):
+    service.definir_cliente_bigquery(BigQueryCargaFalso(erro=RuntimeError("quota")))
+    resultado = self._executar(ArquivoONSFalso(date(2024, 1, 3)))
+    self.assertEqual(resultado["recursos"][0]["status"], STATUS_ERRO)
+    self.assertIsNone(self._marca("rec-2024"))
+
+    # A nova tentativa carrega os mesmos dias de novo, substituindo as partições.
+    service.definir_cliente_bigquery(self.bigquery)
+    resultado = self._executar(ArquivoONSFalso(date(2024, 1, 3)))
+    self.assertEqual(resultado["recursos"][0]["status"], STATUS_CARREGADO)
+    self.assertEqual(self.bigquery.particoes["20240101"], 2)
+
+
+class TestIngestaoConsultadaNoBigQuery(unittest.TestCase):
+  """O que a ingestão grava em `ena_consolidado` precisa ser lido pelas consultas do /consultar."""
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+    self.bigquery = BigQuerySQLite()
+    self.cliente_original = service.bq_client
+    service.definir_cliente_bigquery(self.bigquery)
+    with patch("ingestao.catalogo_ons.obter_indice", AsyncMock(return_value={2024: RECURSO_2024})), \
+        patch("service.ler_recurso_normalizado", ArquivoONSFalso(date(2024, 1, 5))):
+      ingestor = IngestorIncremental(MarcasIngestao(os.path.join(self.diretorio.name, "marcas.json")))
+      asyncio.run(ingestor.executar([2024]))
+    self.backend = BackendBigQuery(lambda: self.bigquery, lambda: "projeto.dataset.ena_consolidado")
+
+  def tearDown(self):
+    service.definir_cliente_bigquery(self.cliente_original)
+    self.diretorio.cleanup()
+
+  def _chaves(self, registros):
+    return [(r["ena_data"], r["cod_resplanejamento"]) for r in registros]
+
+  def test_paginas_contagem_e_cursor(self):
+    inicio, fim = date(2024, 1, 2), date(2024, 1, 5)
+    primeira = self.backend.consultar_pagina(inicio, fim, 3, 0)
+    self.assertEqual(self._chaves(primeira), [(date(2024, 1, 5), 2), (date(2024, 1, 5), 1), (date(2024, 1, 4), 2)])
+    self.assertNotIn("ear_data", primeira[0])
+
+    posicao = {"ena_data": date(2024, 1, 4), "cod_resplanejamento": 2}
+    seguinte = self.backend.consultar_pagina(inicio, fim, 2, 0, posicao)
+    self.assertEqual(self._chaves(seguinte), [(date(2024, 1, 4), 1), (date(2024, 1, 3), 2)])
+
+    self.assertEqual(self.backend.contar(inicio, fim), 8)
+    filtrados = self.backend.consultar_intervalo(inicio, fim, {"cod_resplanejamento": 1})
+    self.assertEqual(len(filtrados), 4)
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+import service
+from inicio import AplicacaoAdiada
+
+
+class AplicacaoFalsa:
+  """Aplicação ASGI mínima que registra as mensagens de lifespan recebidas."""
+
+  def __init__(self):
+    self.lifespan = []
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] == "lifespan":
+      while True:
+        mensagem = await receive()
+        self.lifespan.append(mensagem["type"])
+        await send({"type": mensagem["type"] + ".complete"})
+        if mensagem["type"] == "lifespan.shutdown":
+          return
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": scope["path"].encode()})
+
+
+class TestAplicacaoAdiada(unittest.TestCase):
+
+  def test_health_responde_antes_da_carga(self):
+    liberar = threading.Event()
+    falsa = AplicacaoFalsa()
+
+    def carregar():
+      liberar.wait(5)
+      return falsa
+
+    aplicacao = AplicacaoAdiada(carregar)
+
+    async def cenario():
+      entrada, saida = asyncio.Queue(), asyncio.Queue()
+      ciclo = asyncio.create_task(aplicacao({"type": "lifespan"}, entrada.get, saida.put))
+      await entrada.put({"type": "lifespan.startup"})
+      self.assertEqual((await saida.get())["type"], "lifespan.startup.complete")
+
+      async with httpx.AsyncClient(transport=httpx.ASGITransport(app=aplicacao), base_url="http://api") as cliente:
+        saude = await cliente.get("/health")
+        self.assertEqual(saude.json(), {"status": "ok"})
+        self.assertFalse(aplicacao.carregada)
+
+        consulta = asyncio.create_task(cliente.get("/consultar"))
+        await asyncio.sleep(0.05)
+        self.assertFalse(consulta.done())
+        liberar.set()
+        self.assertEqual((await consulta).text, "/consultar")
+        # Depois da carga, o /health também segue para a aplicação.
+        self.assertEqual((await cliente.get("/health")).text, "/health")
+
+      await entrada.put({"type": "lifespan.shutdown"})
+      self.assertEqual((await saida.get())["type"], "lifespan.shutdown.complete")
+      await ciclo
+
+    asyncio.run(cenario())
+    self.assertEqual(falsa.lifespan, ["lifespan.startup", "lifespan.shutdown"])
+
+  def test_falha_na_carga_responde_503(self):
+    def carregar():
+      raise ImportError("sem pyarrow")
+
+    aplicacao = AplicacaoAdiada(carregar)
+
+    async def cenario():
+      async with httpx.AsyncClient(transport=httpx.ASGITransport(app=aplicacao), base_url="http://api") as cliente:
+        await cliente.get("/health")
+        await asyncio.sleep(0.05)
+        return await cliente.get("/health"), await cliente.get("/consultar")
+
+    saude, consulta = asyncio.run(cenario())
+    self.assertEqual(saude.status_code, 503)
+    self.assertEqual(consulta.status_code, 503)
+    self.assertIn("sem pyarrow", consulta.json()["detail"])
+
+  def test_importar_a_api_nao_carrega_bibliotecas_pesadas(self):
+    verificacao = (
+      "import main, sys; "
+      "print([m for m in ('pandas', 'pyarrow.dataset', 'google.cloud.bigquery') if m in sys.modules])"
+    )
+    processo = subprocess.run(
+      [sys.executable, "-c", verificacao], cwd=os.path.dirname(os.path.abspath(service.__file__)),
+      capture_output=True, text=True, check=True,
+    )
+    self.assertEqual(processo.stdout.strip().splitlines()[-1], "[]")
+
+
+class TestClienteBigQueryAdiado(unittest.TestCase):
+
+  def setUp(self):
+    self.cliente_original = service.bq_client
+    service.definir_cliente_bigquery(None)
+
+  def tearDown(self):
+    service.definir_cliente_bigquery(self.cliente_original)
+
+  def test_cliente_criado_no_primeiro_uso(self):
+    with patch.object(service, "ID_PROJETO", "projeto"), patch("google.cloud.bigquery.Client") as cliente:
+      self.assertIsNone(service.bq_client)
+      primeiro = service.obter_cliente_bigquery()
+      self.assertIs(service.obter_cliente_bigquery(), primeiro)
+    cliente.assert_called_once_with(project="projeto", location="us-central1")
+
+  def test_sem_projeto_nao_ha_cliente(self):
+    with patch.object(service, "ID_PROJETO", None):
+      self.assertIsNone(service.obter_cliente_bigquery())
+      self.assertFalse(service.backend_consulta.disponivel())
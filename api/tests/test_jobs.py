@@ -0,0 +1,119 @@
+import asyncio
+import time
+import unittest
+from datetime import date
+from unittest.mock import patch, AsyncMock
+
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+import main
+from jobs import GerenciadorJobs, ArmazenamentoJobsMemoria, STATUS_CONCLUIDO, STATUS_ERRO
+
+REGISTROS_2023 = [
+  {"ear_data": "2023-01-10", "cod_resplanejamento": 1},
+  {"ear_data": "2023-06-10", "cod_resplanejamento": 1},
+  {"ear_data": "2023-12-10", "cod_resplanejamento": 1},
+]
+
+
+class FluxoFalso:
+  """Substitui executar_fluxo, segurando a execução até que o teste a libere."""
+
+  def __init__(self, registros=REGISTROS_2023, erro=None):
+    self.registros = registros
+    self.erro = erro
+    self.chamadas = []
+    self.liberar = None
+
+  async def __call__(self, data_inicio, data_fim, ao_progredir=None):
+    self.chamadas.append((data_inicio, data_fim))
+    recurso = {"ano": data_inicio.year, "name": f"ear_{data_inicio.year}", "format": "PARQUET"}
+    await ao_progredir(recurso, "pendente", 0)
+    await self.liberar.wait()
+    if self.erro:
+      raise self.erro
+    await ao_progredir(recurso, "concluido", len(self.registros))
+    return pa.Table.from_pylist(self.registros)
+
+
+class TestGerenciadorJobs(unittest.TestCase):
+
+  def test_jobs_do_mesmo_ano_compartilham_a_execucao(self):
+    fluxo = FluxoFalso()
+    gerenciador = GerenciadorJobs(ArmazenamentoJobsMemoria())
+
+    async def cenario():
+      fluxo.liberar = asyncio.Event()
+      primeiro = await gerenciador.submeter(date(2023, 1, 1), date(2023, 3, 31))
+      while not (await gerenciador.obter(primeiro["id"]))["progresso"]:
+        await asyncio.sleep(0.01)
+      segundo = await gerenciador.submeter(date(2023, 6, 1), date(2023, 12, 31))
+      em_andamento = await gerenciador.obter(segundo["id"])
+      fluxo.liberar.set()
+      while (await gerenciador.obter(segundo["id"]))["status"] != STATUS_CONCLUIDO:
+        await asyncio.sleep(0.01)
+      return primeiro, segundo, em_andamento
+
+    with patch("jobs.executar_fluxo", fluxo):
+      primeiro, segundo, em_andamento = asyncio.run(cenario())
+
+    self.assertEqual(fluxo.chamadas, [(date(2023, 1, 1), date(2023, 12, 31))])
+    self.assertFalse(primeiro["execucao_compartilhada"])
+    self.assertTrue(segundo["execucao_compartilhada"])
+    self.assertEqual(em_andamento["progresso"]["2023"]["status"], "pendente")
+
+    armazenamento = gerenciador.armazenamento
+    self.assertEqual(armazenamento.obter(primeiro["id"])["total_registros"], 1)
+    self.assertEqual(armazenamento.obter_resultado(segundo["id"], 0, 10), REGISTROS_2023[1:])
+    self.assertEqual(armazenamento.obter(segundo["id"])["progresso"]["2023"]["registros"], 3)
+    self.assertEqual(armazenamento.obter(segundo["id"])["etapas"], [])
+
+  def test_falha_na_execucao_marca_jobs_com_erro(self):
+    fluxo = FluxoFalso(erro=RuntimeError("ONS indisponível"))
+    gerenciador = GerenciadorJobs(ArmazenamentoJobsMemoria())
+
+    async def cenario():
+      fluxo.liberar = asyncio.Event()
+      fluxo.liberar.set()
+      job = await gerenciador.submeter(date(2023, 1, 1), date(2023, 1, 31))
+      while (await gerenciador.obter(job["id"]))["status"] not in (STATUS_ERRO, STATUS_CONCLUIDO):
+        await asyncio.sleep(0.01)
+      return await gerenciador.obter(job["id"])
+
+    with patch("jobs.executar_fluxo", fluxo):
+      job = asyncio.run(cenario())
+
+    self.assertEqual(job["status"], STATUS_ERRO)
+    self.assertEqual(job["mensagem"], "ONS indisponível")
+
+
+class TestEndpointsJobs(unittest.TestCase):
+
+  def test_processar_assincrono_e_resultado_paginado(self):
+    fluxo = FluxoFalso()
+    gerenciador = GerenciadorJobs(ArmazenamentoJobsMemoria())
+
+    async def liberar_imediatamente(*args, **kwargs):
+      fluxo.liberar = asyncio.Event()
+      fluxo.liberar.set()
+      return await FluxoFalso.__call__(fluxo, *args, **kwargs)
+
+    with patch("main.gerenciador_jobs", gerenciador), patch("jobs.executar_fluxo", liberar_imediatamente), \
+        patch("main.catalogo_ons.manter_atualizado", AsyncMock()), TestClient(main.app) as client:
+      response = client.post("/processar?async=true", json={"data_inicio": "2023-01-01", "data_fim": "2023-12-31"})
+      self.assertEqual(response.status_code, 202)
+      id_job = response.json()["id"]
+      self.assertEqual(response.headers["location"], f"/jobs/{id_job}")
+
+      for _ in range(100):
+        if client.get(f"/jobs/{id_job}").json()["status"] == STATUS_CONCLUIDO:
+          break
+        time.sleep(0.01)
+
+      resultado = client.get(f"/jobs/{id_job}/resultado?pagina=2&tamanho=2").json()
+      self.assertEqual(resultado["total_registros"], 3)
+      self.assertEqual(resultado["total_paginas"], 2)
+      self.assertEqual(resultado["dados"], REGISTROS_2023[2:])
+
+      self.assertEqual(client.get("/jobs/inexistente").status_code, 404)
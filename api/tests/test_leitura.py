@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow as pa
+
+from leitura import _abrir_csv_arrow, filtrar_lotes_por_datas, ler_csv_arrow, ler_csv_filtrado, ler_parquet_filtrado
+
+
+def _dataframe_ano(ano=2023):
+  datas = [date(ano, 1, 1) + timedelta(days=i) for i in range(365)]
+  return pd.DataFrame({
+    "ear_data": datas,
+    "cod_resplanejamento": list(range(365)),
+    "ear_total_mwmes": [float(i) for i in range(365)],
+    "coluna_fora_do_schema": ["x"] * 365,
+  })
+
+
+class TestLeituraFiltrada(unittest.TestCase):
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.diretorio.cleanup()
+
+  def _caminho(self, nome):
+    return os.path.join(self.diretorio.name, nome)
+
+  def test_parquet_com_coluna_date(self):
+    caminho = self._caminho("ear_2023.parquet")
+    _dataframe_ano().to_parquet(caminho, index=False, row_group_size=30)
+
+    df = ler_parquet_filtrado(caminho, date(2023, 3, 1), date(2023, 3, 7))
+
+    self.assertEqual(len(df), 7)
+    self.assertNotIn("coluna_fora_do_schema", df.columns)
+    self.assertEqual(df["cod_resplanejamento"].tolist(), list(range(59, 66)))
+
+  def test_parquet_com_coluna_texto(self):
+    caminho = self._caminho("ear_2023.parquet")
+    df_original = _dataframe_ano()
+    df_original["ear_data"] = df_original["ear_data"].astype(str)
+    df_original.to_parquet(caminho, index=False)
+
+    df = ler_parquet_filtrado(caminho, date(2023, 12, 31), date(2024, 1, 5))
+
+    self.assertEqual(df["ear_data"].tolist(), ["2023-12-31"])
+
+  def test_csv_da_ons_em_blocos(self):
+    caminho = self._caminho("ear_2023.csv")
+    with open(caminho, "w", encoding="latin-1") as arquivo:
+      arquivo.write("EAR diário por reservatório\n")
+      _dataframe_ano().to_csv(arquivo, sep=";", index=False)
+
+    with patch("leitura.TAMANHO_BLOCO_CSV", 50):
+      df = ler_csv_filtrado(caminho, date(2023, 6, 1), date(2023, 6, 30))
+
+    self.assertEqual(len(df), 30)
+    self.assertEqual(list(df.columns), ["ear_data", "cod_resplanejamento", "ear_total_mwmes"])
+
+  def test_csv_sem_linhas_no_intervalo(self):
+    caminho = self._caminho("ear_2023.csv")
+    with open(caminho, "w", encoding="latin-1") as arquivo:
+      arquivo.write("EAR diário por reservatório\n")
+      _dataframe_ano().to_csv(arquivo, sep=";", index=False)
+
+    df = ler_csv_filtrado(caminho, date(2024, 1, 1), date(2024, 1, 31))
+
+    self.assertTrue(df.empty)
+    self.assertIn("ear_data", df.columns)
+
+  def test_csv_arrow_descarta_lotes_fora_do_intervalo(self):
+    caminho = self._caminho("ear_2023.csv")
+    with open(caminho, "w", encoding="latin-1") as arquivo:
+      arquivo.write("EAR diário por reservatório\n")
+      _dataframe_ano().to_csv(arquivo, sep=";", index=False)
+
+    with patch("leitura.BYTES_BLOCO_CSV_ARROW", 1024):
+      leitor = _abrir_csv_arrow(caminho)
+      lidos = []
+      mantidos = list(filtrar_lotes_por_datas(
+        (lidos.append(lote) or lote for lote in leitor), leitor.schema, date(2023, 6, 1), date(2023, 6, 30)
+      ))
+      tabela = ler_csv_arrow(caminho, date(2023, 6, 1), date(2023, 6, 30))
+
+    self.assertGreater(len(lidos), 5)
+    self.assertLess(len(mantidos), 4)
+    self.assertEqual(sum(lote.num_rows for lote in mantidos), 30)
+    self.assertEqual(tabela.num_rows, 30)
+    self.assertEqual(tabela.column_names, ["ear_data", "cod_resplanejamento", "ear_total_mwmes"])
+    self.assertEqual(ler_csv_arrow(caminho, date(2024, 1, 1), date(2024, 1, 31)).num_rows, 0)
+
+  def test_csv_arrow_tipos_do_schema_alem_do_primeiro_bloco(self):
+    df = _dataframe_ano()
+    # Só inteiros e textos vazios no primeiro bloco; decimais e textos aparecem depois dele.
+    df["ear_total_mwmes"] = [float(i) if i < 300 else i + 0.5 for i in range(365)]
+    df["nom_ree"] = [None if i < 300 else "PARANA" for i in range(365)]
+    caminho = self._caminho("ear_2023.csv")
+    with open(caminho, "w", encoding="latin-1") as arquivo:
+      arquivo.write("EAR diário por reservatório\n")
+      df.to_csv(arquivo, sep=";", index=False, float_format="%g")
+
+    with patch("leitura.BYTES_BLOCO_CSV_ARROW", 1024):
+      tabela = ler_csv_arrow(caminho, date(2023, 1, 1), date(2023, 12, 31))
+
+    self.assertEqual(tabela.num_rows, 365)
+    self.assertEqual(tabela.schema.field("ear_total_mwmes").type, pa.float64())
+    self.assertEqual(tabela.schema.field("nom_ree").type, pa.string())
+    self.assertEqual(tabela.column("ear_total_mwmes")[300].as_py(), 300.5)
+    self.assertEqual(tabela.column("nom_ree")[364].as_py(), "PARANA")
+
+  def test_csv_arrow_com_virgula_decimal_le_numeros_como_texto(self):
+    caminho = self._caminho("ear_2023.csv")
+    with open(caminho, "w", encoding="latin-1") as arquivo:
+      arquivo.write("EAR diário por reservatório\n")
+      _dataframe_ano().to_csv(arquivo, sep=";", index=False, decimal=",")
+
+    tabela = ler_csv_arrow(caminho, date(2023, 1, 1), date(2023, 1, 2))
+
+    self.assertEqual(tabela.column("ear_total_mwmes").to_pylist(), ["0,0", "1,0"])
@@ -1,6 +1,7 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 
+import pyarrow as pa
 from fastapi.testclient import TestClient
 
 from main import app
@@ -11,30 +12,39 @@ class TestMain(unittest.TestCase):
   def setUp(self):
     self.client = TestClient(app)
 
-  @patch("app.main.processar_por_ano_com_preview")
-  def test_processar_sucesso(self, mock_processar):
-    mock_processar.return_value = {
-      "arquivos_csv": ["test.csv"],
-      "total_registros": 1,
-      "items": [{"col1": "val1"}]
-    }
-    response = self.client.post("/processar", json={"firstDate": "2023-01-01", "lastDate": "2023-01-31"})
+  def test_health(self):
+    response = self.client.get("/health")
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json(), {"status": "ok"})
+
+  @patch("main.executar_fluxo", new_callable=AsyncMock)
+  def test_processar_sucesso(self, mock_executar):
+    mock_executar.return_value = pa.table({"cod_resplanejamento": list(range(1, 6))})
+    response = self.client.post(
+      "/processar?pagina=2&tamanho=2", json={"data_inicio": "2023-01-01", "data_fim": "2023-01-31"}
+    )
     self.assertEqual(response.status_code, 200)
     data = response.json()
-    self.assertEqual(data["mensagem"], "Processamento concluído com sucesso.")
-    self.assertEqual(data["arquivos_csv"], ["test.csv"])
-    self.assertEqual(data["preview"]["total_items"], 1)
+    self.assertEqual(data["mensagem"], "Processados 5 registros com sucesso.")
+    self.assertEqual(data["total_registros"], 5)
+    self.assertEqual(data["total_paginas"], 3)
+    self.assertEqual(data["dados"], [{"cod_resplanejamento": 3}, {"cod_resplanejamento": 4}])
+
+  @patch("main.executar_fluxo", new_callable=AsyncMock)
+  def test_processar_sem_dados(self, mock_executar):
+    mock_executar.return_value = pa.table({})
+    response = self.client.post("/processar", json={"data_inicio": "2023-01-01", "data_fim": "2023-01-31"})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()["mensagem"], "O fluxo de trabalho terminou, mas nenhum dado foi processado.")
+    self.assertEqual(response.json()["total_paginas"], 0)
 
-  @patch("app.main.processar_por_ano_com_preview")
-  def test_processar_value_error(self, mock_processar):
-    mock_processar.side_effect = ValueError("Erro de valor")
-    response = self.client.post("/processar", json={"firstDate": "2023-01-01", "lastDate": "2023-01-31"})
+  @patch("main.executar_fluxo", new_callable=AsyncMock)
+  def test_processar_intervalo_invertido(self, mock_executar):
+    response = self.client.post("/processar", json={"data_inicio": "2023-02-01", "data_fim": "2023-01-31"})
     self.assertEqual(response.status_code, 400)
-    self.assertEqual(response.json()["detail"], "Erro de valor")
+    self.assertEqual(response.json()["detail"], "A data de início não pode ser posterior à data de fim.")
+    mock_executar.assert_not_called()
 
-  @patch("app.main.processar_por_ano_com_preview")
-  def test_processar_exception(self, mock_processar):
-    mock_processar.side_effect = Exception("Erro geral")
+  def test_processar_corpo_invalido(self):
     response = self.client.post("/processar", json={"firstDate": "2023-01-01", "lastDate": "2023-01-31"})
-    self.assertEqual(response.status_code, 500)
-    self.assertEqual(response.json()["detail"], "Falha ao processar: Erro geral")
+    self.assertEqual(response.status_code, 422)
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import main
+from metricas import RegistroMetricas, RotaInstrumentada, anotar, etapa, rastrear
+
+
+class TestMetricas(unittest.TestCase):
+
+  def test_histograma_no_formato_do_prometheus(self):
+    registro = RegistroMetricas()
+    histograma = registro.histograma("teste_duracao_segundos", "Duração.", limites=(0.1, 1.0))
+    for valor in (0.05, 0.5, 5.0):
+      histograma.observar(valor, etapa="leitura")
+
+    texto = registro.exportar()
+    self.assertIn("# TYPE teste_duracao_segundos histogram", texto)
+    self.assertIn('teste_duracao_segundos_bucket{etapa="leitura",le="0.1"} 1.0', texto)
+    self.assertIn('teste_duracao_segundos_bucket{etapa="leitura",le="1.0"} 2.0', texto)
+    self.assertIn('teste_duracao_segundos_bucket{etapa="leitura",le="+Inf"} 3.0', texto)
+    self.assertIn('teste_duracao_segundos_count{etapa="leitura"} 3.0', texto)
+
+  def test_etapas_de_tarefas_e_threads_entram_no_rastreamento(self):
+    def ler():
+      with etapa("leitura", recurso="ear_2023"):
+        anotar(linhas=10)
+
+    async def cenario():
+      with rastrear("job") as rastreamento:
+        with etapa("download_ons"):
+          anotar(bytes=123)
+        await asyncio.gather(asyncio.to_thread(ler), asyncio.to_thread(ler))
+        return rastreamento.resumo()
+
+    etapas = asyncio.run(cenario())
+    self.assertEqual([e["etapa"] for e in etapas], ["download_ons", "leitura", "leitura"])
+    self.assertEqual(etapas[0]["bytes"], 123)
+    self.assertEqual(etapas[1]["linhas"], 10)
+    self.assertIsNotNone(etapas[2]["duracao_ms"])
+
+
+class TestEndpointMetricas(unittest.TestCase):
+
+  def test_latencia_por_rota_e_server_timing(self):
+    client = TestClient(main.app)
+    resposta = client.get("/catalogo")
+
+    self.assertIn("endpoint;dur=", resposta.headers["server-timing"])
+    self.assertIn("serializacao;dur=", resposta.headers["server-timing"])
+    metricas = client.get("/metrics")
+    self.assertTrue(metricas.headers["content-type"].startswith("text/plain; version=0.0.4"))
+    self.assertIn('api_requisicao_duracao_segundos_count{metodo="GET",rota="/catalogo",status="200"}', metricas.text)
+    self.assertIn('api_etapa_duracao_segundos_count{etapa="serializacao"}', metricas.text)
+    self.assertIn("cache_consulta_acertos", metricas.text)
+
+  def test_perfil_por_requisicao(self):
+    client = TestClient(main.app)
+    with tempfile.TemporaryDirectory() as diretorio, patch("metricas.PERFIL_HABILITADO", True), \
+        patch("metricas.DIRETORIO_PERFIS", diretorio):
+      sem_perfil = client.get("/health")
+      com_perfil = client.get("/health?perfil=1")
+      self.assertNotIn("x-perfil-arquivo", sem_perfil.headers)
+      self.assertTrue(os.path.exists(com_perfil.headers["x-perfil-arquivo"]))
+
+  def test_serializacao_nao_inclui_dependencias(self):
+    def dependencia_lenta():
+      time.sleep(0.2)
+
+    app = FastAPI()
+    app.router.route_class = RotaInstrumentada
+
+    @app.get("/lento", dependencies=[Depends(dependencia_lenta)])
+    async def lento():
+      return {"valores": list(range(10))}
+
+    with patch("metricas.registrar_etapa") as registrar:
+      resposta = TestClient(app).get("/lento")
+
+    self.assertEqual(resposta.json(), {"valores": list(range(10))})
+    duracoes = {chamada.args[0]: chamada.args[1] for chamada in registrar.call_args_list}
+    self.assertEqual(set(duracoes), {"endpoint", "serializacao"})
+    self.assertLess(duracoes["serializacao"], 0.1)
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+
+from leitura import concatenar_tabelas, ler_arquivo_em_ipc, tabela_de_ipc
+from motor import MotorProcessamento
+
+
+def _escrever_csv_ons(caminho, ano=2023):
+  datas = [date(ano, 1, 1) + timedelta(days=i) for i in range(365)]
+  df = pd.DataFrame({
+    "ear_data": [d.isoformat() for d in datas],
+    "cod_resplanejamento": list(range(365)),
+    "ear_total_mwmes": [float(i) for i in range(365)],
+  })
+  with open(caminho, "w", encoding="latin-1") as arquivo:
+    arquivo.write("EAR diário por reservatório\n")
+    df.to_csv(arquivo, sep=";", index=False)
+
+
+class TestMotorProcessamento(unittest.TestCase):
+
+  def setUp(self):
+    self.diretorio = tempfile.TemporaryDirectory()
+    self.caminho = os.path.join(self.diretorio.name, "ear_2023.csv")
+    _escrever_csv_ons(self.caminho)
+
+  def tearDown(self):
+    self.diretorio.cleanup()
+
+  def _ler(self, backend):
+    motor = MotorProcessamento(backend, maximo_workers=2)
+    try:
+      return asyncio.run(motor.ler(self.caminho, "CSV", date(2023, 6, 1), date(2023, 6, 30)))
+    finally:
+      motor.encerrar()
+
+  def test_backends_devolvem_as_mesmas_linhas(self):
+    for backend in ("threads", "arrow", "processos"):
+      with self.subTest(backend=backend):
+        tabela = self._ler(backend)
+        self.assertIsInstance(tabela, pa.Table)
+        self.assertEqual(tabela.num_rows, 30)
+        self.assertEqual(tabela.column("cod_resplanejamento").to_pylist(), list(range(151, 181)))
+
+  def test_backend_desconhecido(self):
+    with self.assertRaises(ValueError):
+      MotorProcessamento("gpu")
+
+  def test_ipc_preserva_a_tabela(self):
+    conteudo = ler_arquivo_em_ipc(self.caminho, "CSV", date(2023, 1, 1), date(2023, 1, 10), "arrow")
+    tabela = tabela_de_ipc(conteudo)
+    self.assertEqual(tabela.num_rows, 10)
+
+  def test_concatenar_tabelas_com_tipos_divergentes(self):
+    tabela = concatenar_tabelas([
+      pa.table({"ear_data": ["2023-01-01"], "valor": [1]}),
+      None,
+      pa.table({"ear_data": ["2024-01-01"], "valor": ["n/d"]}),
+    ])
+    self.assertEqual(tabela.num_rows, 2)
+    self.assertEqual(tabela.column("valor").to_pylist(), ["1", "n/d"])
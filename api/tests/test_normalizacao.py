@@ -0,0 +1,58 @@
+import unittest
+from datetime import date, datetime, timezone
+
+import pyarrow as pa
+
+from normalizacao import ESQUEMA_ARROW_ENA, normalizar_tabela, validar_tabela
+
+
+def _tabela_csv():
+  """Tabela como sai do leitor de CSV: tudo em texto e com colunas fora do schema."""
+  return pa.table({
+    "ear_data": ["2023-01-01", "2023-01-02 00:00:00", "31/12/2023"],
+    "cod_resplanejamento": ["10", "0", "-3"],
+    "ear_total_mwmes": ["1,5", "2", ""],
+    "nom_subsistema": ["SE", "SE", "S"],
+    "coluna_fora_do_schema": ["x", "y", "z"],
+  })
+
+
+class TestNormalizacao(unittest.TestCase):
+
+  def setUp(self):
+    self.momento = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    self.tabela, self.relatorio = normalizar_tabela(_tabela_csv(), "ear_2023.csv", self.momento)
+
+  def test_tipos_do_schema(self):
+    self.assertEqual(self.tabela.column_names, ESQUEMA_ARROW_ENA.names)
+    tipos = {campo.name: campo.type for campo in self.tabela.schema}
+    self.assertEqual(tipos["ear_data"], pa.date32())
+    self.assertEqual(tipos["cod_resplanejamento"], pa.int64())
+    self.assertEqual(tipos["ear_total_mwmes"], pa.float64())
+    self.assertTrue(pa.types.is_dictionary(tipos["nom_subsistema"]))
+
+  def test_valores_convertidos(self):
+    linhas = self.tabela.select(["ear_data", "cod_resplanejamento", "ear_total_mwmes", "nom_subsistema"]).to_pylist()
+    self.assertEqual(linhas[0], {
+      "ear_data": date(2023, 1, 1), "cod_resplanejamento": 10, "ear_total_mwmes": 1.5, "nom_subsistema": "SE",
+    })
+    self.assertEqual(linhas[1]["ear_data"], date(2023, 1, 2))
+    self.assertIsNone(linhas[2]["ear_data"])
+    self.assertIsNone(linhas[2]["ear_total_mwmes"])
+
+  def test_metadados_de_ingestao(self):
+    self.assertEqual(set(self.tabela.column("file_source").to_pylist()), {"ear_2023.csv"})
+    self.assertEqual(set(self.tabela.column("ingestion_timestamp").to_pylist()), {self.momento})
+
+  def test_relatorio_de_qualidade(self):
+    self.assertEqual(self.relatorio["total_registros"], 3)
+    self.assertAlmostEqual(self.relatorio["completude"]["ear_data"], 0.6667)
+    self.assertEqual(self.relatorio["completude"]["nom_subsistema"], 1.0)
+    self.assertEqual(self.relatorio["completude"]["nom_reservatorio"], 0.0)
+    self.assertEqual(self.relatorio["violacoes"]["cod_resplanejamento"], {"negativos": 1, "zeros": 1})
+    self.assertNotIn("nom_ree", self.relatorio["violacoes"])
+
+  def test_tabela_vazia(self):
+    relatorio = validar_tabela(normalizar_tabela(pa.table({"ear_data": pa.array([], pa.string())}), "x")[0])
+    self.assertEqual(relatorio["linhas_invalidas"], 0)
+    self.assertEqual(relatorio["completude"]["ear_data"], 1.0)
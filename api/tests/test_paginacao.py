@@ -0,0 +1,121 @@
+import asyncio
+import unittest
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+from fastapi.testclient import TestClient
+
+import service
+from main import app
+
+
+def _job_com_linhas(linhas):
+  job = MagicMock()
+  job.result.return_value = linhas
+  return job
+
+
+class TestCursor(unittest.TestCase):
+
+  def test_cursor_ida_e_volta(self):
+    ultimo = {"ena_data": date(2023, 5, 2), "cod_resplanejamento": 17}
+    cursor = service.codificar_cursor(date(2023, 1, 1), date(2023, 12, 31), ultimo, 3)
+    posicao = service.decodificar_cursor(cursor, date(2023, 1, 1), date(2023, 12, 31))
+    self.assertEqual(posicao, {"ena_data": date(2023, 5, 2), "cod_resplanejamento": 17, "pagina": 3})
+
+  def test_cursor_de_outro_intervalo(self):
+    ultimo = {"ena_data": date(2023, 5, 2), "cod_resplanejamento": 17}
+    cursor = service.codificar_cursor(date(2023, 1, 1), date(2023, 12, 31), ultimo, 2)
+    with self.assertRaises(ValueError):
+      service.decodificar_cursor(cursor, date(2022, 1, 1), date(2023, 12, 31))
+
+  def test_cursor_de_outros_filtros(self):
+    ultimo = {"ena_data": date(2023, 5, 2), "cod_resplanejamento": 17}
+    filtros = {"nom_subsistema": "SE"}
+    cursor = service.codificar_cursor(date(2023, 1, 1), date(2023, 12, 31), ultimo, 2, filtros)
+    posicao = service.decodificar_cursor(cursor, date(2023, 1, 1), date(2023, 12, 31), dict(filtros))
+    self.assertEqual(posicao["pagina"], 2)
+    for outros in (None, {"nom_subsistema": "S"}, {"nom_subsistema": "SE", "cod_resplanejamento": 17}):
+      with self.assertRaises(ValueError):
+        service.decodificar_cursor(cursor, date(2023, 1, 1), date(2023, 12, 31), outros)
+
+  def test_cursor_corrompido(self):
+    with self.assertRaises(ValueError):
+      service.decodificar_cursor("nao-e-um-cursor", date(2023, 1, 1), date(2023, 12, 31))
+
+
+class TestConsultaPaginada(unittest.TestCase):
+
+  def setUp(self):
+    service._cache_contagens.clear()
+
+  def test_pagina_com_keyset(self):
+    cliente = MagicMock()
+    linhas = [{"ena_data": date(2023, 1, 3), "cod_resplanejamento": c} for c in (9, 8, 7)]
+    cliente.query.return_value = _job_com_linhas(linhas)
+    posicao = {"ena_data": date(2023, 1, 4), "cod_resplanejamento": 1, "pagina": 4}
+
+    with patch.object(service, "bq_client", cliente):
+      dados, proximo = asyncio.run(
+        service.consultar_pagina_por_intervalo(date(2023, 1, 1), date(2023, 1, 31), 2, 1, posicao)
+      )
+
+    sql = cliente.query.call_args.args[0]
+    self.assertIn("cod_resplanejamento < @cursor_cod", sql)
+    self.assertIn("LIMIT 3 OFFSET 0", sql)
+    self.assertEqual(len(dados), 2)
+    proxima_posicao = service.decodificar_cursor(proximo, date(2023, 1, 1), date(2023, 1, 31))
+    self.assertEqual(proxima_posicao["cod_resplanejamento"], 8)
+    self.assertEqual(proxima_posicao["pagina"], 5)
+
+  def test_ultima_pagina_sem_cursor(self):
+    cliente = MagicMock()
+    cliente.query.return_value = _job_com_linhas([{"ena_data": date(2023, 1, 3), "cod_resplanejamento": 1}])
+
+    with patch.object(service, "bq_client", cliente):
+      dados, proximo = asyncio.run(
+        service.consultar_pagina_por_intervalo(date(2023, 1, 1), date(2023, 1, 31), 20, 3)
+      )
+
+    self.assertIn("LIMIT 21 OFFSET 40", cliente.query.call_args.args[0])
+    self.assertEqual(len(dados), 1)
+    self.assertIsNone(proximo)
+
+  def test_contagem_reaproveitada(self):
+    cliente = MagicMock()
+    cliente.query.return_value = _job_com_linhas([{"total": 42}])
+
+    with patch.object(service, "bq_client", cliente):
+      primeira = asyncio.run(service.contar_registros_por_intervalo(date(2023, 1, 1), date(2023, 1, 31)))
+      segunda = asyncio.run(service.contar_registros_por_intervalo(date(2023, 1, 1), date(2023, 1, 31)))
+
+    self.assertEqual((primeira, segunda), (42, 42))
+    cliente.query.assert_called_once()
+
+
+class TestEndpointConsultar(unittest.TestCase):
+
+  def setUp(self):
+    self.client = TestClient(app)
+
+  @patch("main.consultar_pagina_com_total")
+  def test_consultar_retorna_cursor(self, mock_pagina):
+    mock_pagina.return_value = ([{"cod_resplanejamento": 1}], "proximo", 45)
+    response = self.client.get("/consultar?data_inicio=2023-01-01&data_fim=2023-01-31&tamanho=20")
+    self.assertEqual(response.status_code, 200)
+    data = response.json()
+    self.assertEqual(data["total_paginas"], 3)
+    self.assertEqual(data["cursor"], "proximo")
+
+  def test_consultar_cursor_invalido(self):
+    response = self.client.get("/consultar?data_inicio=2023-01-01&data_fim=2023-01-31&cursor=xyz")
+    self.assertEqual(response.status_code, 400)
+
+  def test_consultar_cursor_de_outros_filtros(self):
+    ultimo = {"ena_data": date(2023, 1, 20), "cod_resplanejamento": 1}
+    cursor = service.codificar_cursor(date(2023, 1, 1), date(2023, 1, 31), ultimo, 2, {"nom_subsistema": "SE"})
+    response = self.client.get(
+      f"/consultar?data_inicio=2023-01-01&data_fim=2023-01-31&nom_subsistema=S&cursor={cursor}"
+    )
+    self.assertEqual(response.status_code, 400)
+    self.assertIn("filtros", response.json()["detail"])
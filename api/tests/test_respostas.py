@@ -0,0 +1,133 @@
+import json
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch, AsyncMock
+
+import orjson
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+import service
+from benchmarks.nuvem_falsa import BigQueryFalso
+from main import app
+from metricas import DURACAO_ETAPAS
+from respostas import MemoriaETags, escolher_codificacao, etag_corresponde, tabela_para_json
+
+
+class TestCodificacao(unittest.TestCase):
+
+  def test_tabela_igual_a_codificacao_por_registro(self):
+    tabela = pa.table({
+      "ena_data": [date(2023, 1, 1), None, date(2023, 1, 3)],
+      "instante": [datetime(2023, 1, 1, 12, 30), None, datetime(2023, 1, 3)],
+      "cod_resplanejamento": [1, None, -3],
+      "ear_reservatorio_percentual": [100.0, float("nan"), 0.125],
+      "volume": [1e21, float("inf"), -2.5],
+      "nom_reservatorio": ["FURNAS", "SÃO \"SIMÃO\"", None],
+      "nom_subsistema": pa.array(["SE", "SE", "NE"]).dictionary_encode(),
+      "ativo": [True, None, False],
+      "vazio": pa.nulls(3),
+      "medicoes": [[1, 2], None, []],
+    })
+    esperado = json.loads(orjson.dumps(tabela.to_pylist()))
+    self.assertEqual(json.loads(tabela_para_json(tabela)), esperado)
+    self.assertEqual(json.loads(tabela_para_json(tabela.slice(0, 0))), [])
+
+  def test_escolher_codificacao(self):
+    self.assertEqual(escolher_codificacao("gzip, deflate"), "gzip")
+    self.assertIsNone(escolher_codificacao("gzip;q=0, identity"))
+    self.assertIsNone(escolher_codificacao(None))
+    self.assertIn(escolher_codificacao("br, gzip"), ("br", "gzip"))
+
+  def test_etag_corresponde(self):
+    self.assertTrue(etag_corresponde('"a", W/"b"', 'W/"b"'))
+    self.assertTrue(etag_corresponde('"b"', 'W/"b"'))
+    self.assertTrue(etag_corresponde("*", 'W/"b"'))
+    self.assertFalse(etag_corresponde(None, 'W/"b"'))
+
+  def test_memoria_etags_invalidacao_e_limite(self):
+    memoria = MemoriaETags(maximo=2)
+    memoria.guardar("jan", "a", date(2023, 1, 1), date(2023, 1, 31))
+    memoria.guardar("fev", "b", date(2023, 2, 1), date(2023, 2, 28))
+    memoria.invalidar_intervalo(date(2023, 1, 20), date(2023, 1, 25))
+    self.assertIsNone(memoria.obter("jan"))
+    self.assertEqual(memoria.obter("fev"), "b")
+
+    memoria.guardar("mar", "c", date(2023, 3, 1), date(2023, 3, 31))
+    memoria.guardar("abr", "d", date(2023, 4, 1), date(2023, 4, 30))
+    self.assertEqual(len(memoria), 2)
+    self.assertIsNone(memoria.obter("fev"))
+
+
+class TestRespostasHTTP(unittest.TestCase):
+
+  def setUp(self):
+    registros = []
+    dia = date(2023, 1, 1)
+    while dia <= date(2023, 3, 31):
+      registros += [{"ena_data": dia, "cod_resplanejamento": cod, "nom_reservatorio": "FURNAS"} for cod in (1, 2)]
+      dia += timedelta(days=1)
+    self.bigquery = BigQueryFalso(pa.Table.from_pylist(registros))
+    self.cliente_original = service.bq_client
+    service.definir_cliente_bigquery(self.bigquery)
+    self.client = TestClient(app)
+
+  def tearDown(self):
+    service.definir_cliente_bigquery(self.cliente_original)
+
+  def test_intervalo_historico_revalidado_sem_consultar_o_backend(self):
+    url = "/consultar?data_inicio=2023-01-01&data_fim=2023-01-31&tamanho=20"
+    primeira = self.client.get(url)
+    etag = primeira.headers["etag"]
+    self.assertEqual(primeira.status_code, 200)
+    self.assertEqual(primeira.json()["total_registros"], 62)
+    self.assertEqual(len(primeira.json()["dados"]), 20)
+    self.assertEqual(primeira.json()["dados"][0]["ena_data"], "2023-01-31")
+
+    consultas = self.bigquery.consultas
+    segunda = self.client.get(url, headers={"If-None-Match": etag})
+    self.assertEqual(segunda.status_code, 304)
+    self.assertEqual(segunda.headers["etag"], etag)
+    self.assertEqual(segunda.content, b"")
+    self.assertEqual(self.bigquery.consultas, consultas)
+
+    # Depois da invalidação a resposta é montada de novo e o ETag volta para a memória.
+    service.etags_consulta.invalidar_intervalo(date(2023, 1, 15), date(2023, 1, 15))
+    self.assertEqual(len(service.etags_consulta), 0)
+    terceira = self.client.get(url, headers={"If-None-Match": etag})
+    self.assertEqual(terceira.status_code, 304)
+    self.assertEqual(len(service.etags_consulta), 1)
+
+  def test_uma_amostra_de_serializacao_por_requisicao(self):
+    antes = DURACAO_ETAPAS.contagem(etapa="serializacao")
+    resposta = self.client.get("/consultar?data_inicio=2023-01-01&data_fim=2023-01-31&tamanho=20")
+    self.assertEqual(resposta.status_code, 200)
+    self.assertEqual(DURACAO_ETAPAS.contagem(etapa="serializacao"), antes + 1)
+
+  def test_compressao_gzip(self):
+    resposta = self.client.get(
+      "/consultar?data_inicio=2023-01-01&data_fim=2023-03-31&tamanho=100",
+      headers={"Accept-Encoding": "gzip"},
+    )
+    self.assertEqual(resposta.headers["content-encoding"], "gzip")
+    self.assertEqual(resposta.headers["vary"], "Accept-Encoding")
+    self.assertEqual(len(resposta.json()["dados"]), 100)
+
+    sem_compressao = self.client.get(
+      "/consultar?data_inicio=2023-01-01&data_fim=2023-03-31&tamanho=100",
+      headers={"Accept-Encoding": "identity"},
+    )
+    self.assertNotIn("content-encoding", sem_compressao.headers)
+    self.assertEqual(sem_compressao.json(), resposta.json())
+
+  @patch("main.executar_fluxo", new_callable=AsyncMock)
+  def test_post_sem_etag(self, mock_executar):
+    mock_executar.return_value = pa.table({"cod_resplanejamento": list(range(500))})
+    resposta = self.client.post(
+      "/processar?tamanho=500", json={"data_inicio": "2023-01-01", "data_fim": "2023-01-31"},
+      headers={"Accept-Encoding": "gzip"},
+    )
+    self.assertEqual(resposta.status_code, 200)
+    self.assertNotIn("etag", resposta.headers)
+    self.assertEqual(resposta.headers["content-encoding"], "gzip")
+    self.assertEqual(resposta.json()["dados"][499], {"cod_resplanejamento": 499})
@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import numpy as np
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+import main
+from series import IndiceSeries
+
+
+def _tabela(inicio, fim, reservatorios=((1, "SE"), (2, "SE"), (3, "S")), deslocamento=0.0):
+  linhas = []
+  dia = inicio
+  while dia <= fim:
+    for cod, subsistema in reservatorios:
+      linhas.append({
+        "ena_data": dia, "cod_resplanejamento": cod, "nom_subsistema": subsistema,
+        "nom_reservatorio": f"RES {cod}", "ear_total_mwmes": cod * 100 + dia.day + deslocamento,
+      })
+    dia += timedelta(days=1)
+  return pa.Table.from_pylist(linhas)
+
+
+class BackendTabela:
+  """Backend falso que só implementa o que o índice usa."""
+
+  nome = "falso"
+
+  def __init__(self, tabela):
+    self.tabela = tabela
+    self.chamadas = []
+    self.filtros = []
+
+  def disponivel(self):
+    return True
+
+  def consultar_tabela(self, data_inicio, data_fim, filtros=None):
+    self.chamadas.append((data_inicio, data_fim))
+    self.filtros.append(filtros)
+    linhas = self.tabela.to_pylist()
+    return self.tabela.filter(pa.array([
+      data_inicio <= linha["ena_data"] <= data_fim
+      and all(linha[coluna] == valor for coluna, valor in (filtros or {}).items())
+      for linha in linhas
+    ]))
+
+
+class TestIndiceSeries(unittest.TestCase):
+
+  def setUp(self):
+    self.indice = IndiceSeries()
+    self.indice.atualizar(_tabela(date(2023, 1, 1), date(2023, 1, 31)))
+
+  def test_recorte_por_busca_binaria_sem_copia(self):
+    serie = self.indice.serie_reservatorio(2, date(2023, 1, 10), date(2023, 1, 12))
+    self.assertEqual(serie.datas.tolist(), [date(2023, 1, d) for d in (10, 11, 12)])
+    self.assertEqual(serie.colunas["ear_total_mwmes"].tolist(), [210.0, 211.0, 212.0])
+    completa = self.indice.reservatorios[2]
+    self.assertTrue(np.shares_memory(serie.colunas["ear_total_mwmes"], completa.colunas["ear_total_mwmes"]))
+
+  def test_subsistema_ordenado_por_data_e_reservatorio(self):
+    serie = self.indice.serie_subsistema(" se", date(2023, 1, 1), date(2023, 1, 2))
+    self.assertEqual(serie.colunas["cod_resplanejamento"].tolist(), [1, 2, 1, 2])
+    self.assertIsNone(self.indice.serie_subsistema("NORTE", date(2023, 1, 1), date(2023, 1, 2)))
+
+  def test_atualizacao_incremental_substitui_dias(self):
+    self.indice.atualizar(_tabela(date(2023, 1, 31), date(2023, 2, 2), reservatorios=((2, "SE"),), deslocamento=0.5))
+
+    serie = self.indice.serie_reservatorio(2, date(2023, 1, 30), date(2023, 2, 28))
+    self.assertEqual(serie.colunas["ear_total_mwmes"].tolist(), [230.0, 231.5, 201.5, 202.5])
+    subsistema = self.indice.serie_subsistema("SE", date(2023, 1, 31), date(2023, 1, 31))
+    self.assertEqual(subsistema.colunas["ear_total_mwmes"].tolist(), [131.0, 231.5])
+    self.assertEqual(self.indice.ultima_data, date(2023, 2, 2))
+    self.assertEqual(self.indice.metadados[2]["nom_reservatorio"], "RES 2")
+
+  def test_sincronizar_le_apenas_os_dias_novos(self):
+    hoje = date.today()
+    backend = BackendTabela(_tabela(hoje - timedelta(days=10), hoje))
+    indice = IndiceSeries(dias_historico=5)
+    with patch("service.backend_consulta", backend):
+      asyncio.run(indice.sincronizar())
+      asyncio.run(indice.sincronizar())
+
+    self.assertEqual(backend.chamadas[0], (hoje - timedelta(days=5), hoje))
+    self.assertEqual(backend.chamadas[1], (hoje + timedelta(days=1), hoje))
+    self.assertEqual(len(indice.reservatorios[1]), 6)
+    self.assertTrue(indice.cobre(hoje - timedelta(days=5)))
+    self.assertFalse(indice.cobre(hoje - timedelta(days=6)))
+
+
+class TestEndpointsSeries(unittest.TestCase):
+
+  def setUp(self):
+    self.indice = IndiceSeries()
+    self.indice.atualizar(_tabela(date(2023, 1, 1), date(2023, 1, 31)))
+    self.client = TestClient(main.app)
+
+  def test_serie_do_reservatorio(self):
+    with patch("main.indice_series", self.indice):
+      response = self.client.get(
+        "/reservatorios/3/serie?data_inicio=2023-01-30&data_fim=2023-02-10&coluna=ear_total_mwmes"
+      )
+    self.assertEqual(response.status_code, 200)
+    dados = response.json()
+    self.assertEqual(dados["datas"], ["2023-01-30", "2023-01-31"])
+    self.assertEqual(dados["valores"], {"ear_total_mwmes": [330.0, 331.0]})
+    self.assertEqual(dados["metadados"]["nom_reservatorio"], "RES 3")
+
+  def test_serie_do_subsistema_e_chave_inexistente(self):
+    with patch("main.indice_series", self.indice):
+      response = self.client.get("/subsistemas/se/serie?data_inicio=2023-01-01&data_fim=2023-01-01")
+      inexistente = self.client.get("/reservatorios/99/serie?data_inicio=2023-01-01&data_fim=2023-01-01")
+
+    self.assertEqual(response.json()["chave"], "SE")
+    self.assertEqual(response.json()["valores"]["cod_resplanejamento"], [1, 2])
+    self.assertEqual(inexistente.status_code, 404)
+
+  def test_intervalo_anterior_a_cobertura_vem_do_backend(self):
+    backend = BackendTabela(_tabela(date(2022, 12, 1), date(2023, 1, 31)))
+    with patch("main.indice_series", self.indice), patch("service.backend_consulta", backend):
+      dentro = self.client.get("/reservatorios/1/serie?data_inicio=2023-01-30&data_fim=2023-01-31")
+      fora = self.client.get("/reservatorios/1/serie?data_inicio=2022-12-30&data_fim=2023-01-02")
+      subsistema = self.client.get("/subsistemas/S/serie?data_inicio=2022-12-31&data_fim=2023-01-01")
+
+    self.assertEqual(dentro.json()["origem"], "indice")
+    self.assertEqual(dentro.json()["cobertura_inicio"], "2023-01-01")
+    self.assertEqual(fora.json()["origem"], "backend")
+    self.assertEqual(fora.json()["datas"], ["2022-12-30", "2022-12-31", "2023-01-01", "2023-01-02"])
+    self.assertEqual(fora.json()["cobertura_inicio"], "2022-12-30")
+    self.assertEqual(fora.json()["cobertura_fim"], "2023-01-02")
+    self.assertEqual(backend.chamadas, [(date(2022, 12, 30), date(2023, 1, 2)), (date(2022, 12, 31), date(2023, 1, 1))])
+    self.assertEqual(backend.filtros, [{"cod_resplanejamento": 1}, {"nom_subsistema": "S"}])
+    self.assertEqual(subsistema.json()["valores"]["cod_resplanejamento"], [3, 3])
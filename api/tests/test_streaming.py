@@ -0,0 +1,142 @@
+import asyncio
+import json
+import unittest
+from datetime import date
+from unittest.mock import patch, AsyncMock, MagicMock
+
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+import service
+from main import app
+from processing import iterar_fluxo
+from streaming import escolher_formato, gerar_arrow, gerar_ndjson
+
+
+async def _lotes(*lotes):
+  for lote in lotes:
+    yield lote
+
+
+async def _coletar(gerador):
+  return b"".join([parte async for parte in gerador])
+
+
+class TestFormatos(unittest.TestCase):
+
+  def test_parametro_tem_prioridade_sobre_accept(self):
+    self.assertEqual(escolher_formato("ndjson", "application/vnd.apache.arrow.stream"), "ndjson")
+    self.assertEqual(escolher_formato(None, "application/vnd.apache.arrow.stream"), "arrow")
+    self.assertIsNone(escolher_formato("json", "application/x-ndjson"))
+    self.assertIsNone(escolher_formato(None, "application/json"))
+
+  def test_ndjson_uma_linha_por_registro(self):
+    corpo = asyncio.run(_coletar(gerar_ndjson(_lotes(
+      [{"ena_data": date(2023, 1, 1), "valor": 1.5}], [], [{"ena_data": date(2023, 1, 2), "valor": None}]
+    ))))
+    linhas = [json.loads(linha) for linha in corpo.decode().splitlines()]
+    self.assertEqual(linhas, [
+      {"ena_data": "2023-01-01", "valor": 1.5},
+      {"ena_data": "2023-01-02", "valor": None},
+    ])
+
+  def test_arrow_um_batch_por_lote(self):
+    corpo = asyncio.run(_coletar(gerar_arrow(_lotes(
+      [{"cod": 1, "nome": "A"}, {"cod": 2, "nome": "B"}], [{"cod": 3, "nome": None}]
+    ))))
+    leitor = pa.ipc.open_stream(corpo)
+    batches = list(leitor)
+    self.assertEqual(len(batches), 2)
+    self.assertEqual(pa.Table.from_batches(batches).column("cod").to_pylist(), [1, 2, 3])
+
+  def test_arrow_schema_unificado_com_a_tabela(self):
+    corpo = asyncio.run(_coletar(gerar_arrow(_lotes(
+      [{"ena_data": date(2023, 1, 1), "ear_total_mwmes": 10, "nom_ree": None, "extra": None}],
+      [{"ena_data": date(2023, 1, 2), "ear_total_mwmes": 10.5, "nom_ree": "PARANA"}],
+      pa.table({"ear_total_mwmes": [1.0], "nom_ree": ["GRANDE"]}),
+    ))))
+    tabela = pa.ipc.open_stream(corpo).read_all()
+    self.assertEqual(tabela.schema.field("ena_data").type, pa.date32())
+    self.assertEqual(tabela.schema.field("ear_total_mwmes").type, pa.float64())
+    self.assertEqual(tabela.schema.field("extra").type, pa.string())
+    self.assertEqual(tabela.column("ear_total_mwmes").to_pylist(), [10.0, 10.5, 1.0])
+    self.assertEqual(tabela.column("nom_ree").to_pylist(), [None, "PARANA", "GRANDE"])
+    self.assertEqual(tabela.column("ena_data").to_pylist(), [date(2023, 1, 1), date(2023, 1, 2), None])
+
+  def test_arrow_sem_registros(self):
+    corpo = asyncio.run(_coletar(gerar_arrow(_lotes())))
+    self.assertEqual(pa.ipc.open_stream(corpo).read_all().num_rows, 0)
+
+
+class TestEndpointsStreaming(unittest.TestCase):
+
+  def setUp(self):
+    self.client = TestClient(app)
+
+  @patch("main.iterar_lotes_por_intervalo")
+  def test_consultar_ndjson(self, mock_iterar):
+    mock_iterar.return_value = _lotes([{"cod_resplanejamento": 1}], [{"cod_resplanejamento": 2}])
+    response = self.client.get("/consultar?data_inicio=2023-01-01&data_fim=2023-01-31&formato=ndjson")
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+    self.assertEqual(len(response.text.splitlines()), 2)
+
+  @patch("main.iterar_fluxo")
+  def test_processar_arrow_por_accept(self, mock_iterar):
+    mock_iterar.return_value = _lotes([{"cod_resplanejamento": 1}])
+    response = self.client.post(
+      "/processar",
+      json={"data_inicio": "2023-01-01", "data_fim": "2023-01-31"},
+      headers={"Accept": "application/vnd.apache.arrow.stream"},
+    )
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(pa.ipc.open_stream(response.content).read_all().num_rows, 1)
+
+
+class TestLotesBigQuery(unittest.TestCase):
+
+  def test_lotes_seguem_paginas_do_resultado(self):
+    cliente = MagicMock()
+    paginas = [[{"cod_resplanejamento": 1}, {"cod_resplanejamento": 2}], [{"cod_resplanejamento": 3}]]
+    cliente.query.return_value.result.return_value.pages = paginas
+    original = service.bq_client
+    service.definir_cliente_bigquery(cliente)
+    try:
+      async def coletar():
+        return [lote async for lote in service.iterar_lotes_por_intervalo(date(2020, 1, 1), date(2024, 1, 1), 2)]
+      lotes = asyncio.run(coletar())
+    finally:
+      service.definir_cliente_bigquery(original)
+
+    self.assertEqual(lotes, paginas)
+    cliente.query.return_value.result.assert_called_once_with(page_size=2)
+
+
+class TestIterarFluxo(unittest.TestCase):
+
+  def test_recursos_em_andamento_limitados(self):
+    recursos = [{"id": str(ano), "ano": ano} for ano in range(2010, 2020)]
+    em_andamento, maximo = set(), [0]
+
+    async def processar(recurso, data_inicio, data_fim):
+      em_andamento.add(recurso["ano"])
+      maximo[0] = max(maximo[0], len(em_andamento))
+      await asyncio.sleep(0.001 * (recurso["ano"] % 3))
+      em_andamento.discard(recurso["ano"])
+      return pa.table({"ano": [recurso["ano"]]})
+
+    async def consumir():
+      anos = []
+      async for tabela in iterar_fluxo(date(2010, 1, 1), date(2019, 12, 31)):
+        anos += tabela.column("ano").to_pylist()
+        # Um consumidor lento: nada novo começa enquanto ele não pede o próximo lote.
+        await asyncio.sleep(0.002)
+      return anos
+
+    with patch("processing.MAXIMO_RECURSOS_EM_ANDAMENTO", 3), \
+        patch("processing.catalogo_ons.recursos_para_intervalo", AsyncMock(return_value=recursos)), \
+        patch("processing.service.processar_recurso", processar):
+      anos = asyncio.run(consumir())
+
+    self.assertEqual(sorted(anos), list(range(2010, 2020)))
+    self.assertEqual(maximo[0], 3)